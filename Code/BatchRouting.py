@@ -0,0 +1,57 @@
+# This file contains the many-to-many routing API. Queries are grouped by origin and a single
+# Dijkstra per origin settles all the destinations of that origin, instead of running one
+# search for every (origin, destination) pair.
+# _________________________________________________________________________________________
+
+from CompiledMap import CompiledMap
+from SearchEngine import map_neighbours, shortest_path_tree, build_path
+import numpy as np
+import math
+
+
+def route_matrix(origins, destinations, map, type_preference=0, return_routes=False):
+    """
+     Cost of the optimal route between every origin and every destination.
+     Format of the parameter is:
+        Args:
+            origins (list): Starting station ids
+            destinations (list): Final station ids
+            map (object of Map or CompiledMap class): All the map information
+            type_preference: INTEGER Value to indicate the preference selected:
+                            0 - Adjacency
+                            1 - minimum Time
+                            2 - minimum Distance
+                            3 - minimum Transfers
+            return_routes (bool): Also return the routes
+        Returns:
+            costs (numpy array): costs[i][j] is the cost from origins[i] to destinations[j] (inf if unreachable)
+            routes (list): Only with return_routes, routes[i][j] is the Path from origins[i] to
+                           destinations[j] ([] if unreachable)
+    """
+    compiled = isinstance(map, CompiledMap)
+    node = map.index.__getitem__ if compiled else (lambda station_id: station_id)
+    station_ids = map.station_ids.tolist() if compiled else None
+    neighbours = map_neighbours(map, type_preference)
+    targets = [node(destination_id) for destination_id in destinations]
+
+    costs = np.full((len(origins), len(destinations)), np.inf)
+    routes = [[[] for _ in destinations] for _ in origins] if return_routes else None
+    # Repeated origins share the same search
+    rows = {}
+    for i, origin_id in enumerate(origins):
+        rows.setdefault(origin_id, []).append(i)
+
+    for origin_id, origin_rows in rows.items():
+        best_g, parents = shortest_path_tree(node(origin_id), neighbours, targets)
+        for j, target in enumerate(targets):
+            g = best_g.get(target, math.inf)
+            if math.isinf(g):
+                continue
+            costs[origin_rows, j] = g
+            if return_routes:
+                for i in origin_rows:
+                    routes[i][j] = build_path(parents, target, g, station_ids=station_ids)
+
+    if return_routes:
+        return costs, routes
+    return costs
@@ -0,0 +1,175 @@
+# This file contains the scaling benchmark of the search algorithms of SearchAlgorithm.py over
+# synthetic cities of CityGenerator.py. For every city size, algorithm and type preference it
+# reports latency percentiles, expanded stations and peak memory, and the results can be stored
+# in a JSON file and compared with an older run to find regressions.
+#     python Benchmark.py --stations 100 1000 10000 --output results.json --baseline old_results.json
+# _________________________________________________________________________________________
+
+from SearchAlgorithm import depth_first_search, breadth_first_search, uniform_cost_search, Astar, Astar_improved
+from CityGenerator import generate_city
+from SearchStats import SearchStats
+import numpy as np
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+ALGORITHMS = {
+    'depth_first_search': depth_first_search,
+    'breadth_first_search': breadth_first_search,
+    'uniform_cost_search': uniform_cost_search,
+    'Astar': Astar,
+    'Astar_improved': Astar_improved,
+}
+
+# Searches without a cost do not have a type preference
+TYPE_PREFERENCES = {'depth_first_search': (None,), 'breadth_first_search': (None,), 'Astar_improved': (None,)}
+
+
+def random_queries(map, n_queries, seed=0):
+    # (origin, destination) pairs of different stations and (origin, destination) pairs of coordinates
+    rng = random.Random(seed)
+    station_ids = sorted(map.stations)
+    xs = [station['x'] for station in map.stations.values()]
+    ys = [station['y'] for station in map.stations.values()]
+    pairs = [tuple(rng.sample(station_ids, 2)) for _ in range(n_queries)]
+    coordinates = [([rng.uniform(min(xs), max(xs)), rng.uniform(min(ys), max(ys))],
+                    [rng.uniform(min(xs), max(xs)), rng.uniform(min(ys), max(ys))]) for _ in range(n_queries)]
+    return pairs, coordinates
+
+
+def run_query(search_function, origin, destination, map, type_preference, **kwargs):
+    if type_preference is None:
+        return search_function(origin, destination, map, **kwargs)
+    return search_function(origin, destination, map, type_preference, **kwargs)
+
+
+def benchmark_map(map, algorithms=None, n_queries=50, seed=0, memory_queries=5):
+    """
+     Runs the same random queries with every algorithm and type preference.
+     Format of the parameter is:
+        Args:
+            map (object of Map class): All the map information
+            algorithms (list): Names of ALGORITHMS to run (all by default)
+            n_queries (int): Number of queries of each algorithm and type preference
+            seed (int): Seed of the random queries
+            memory_queries (int): Number of queries run again with tracemalloc to measure the memory
+        Returns:
+            results (list of dict): One result for every algorithm and type preference with the keys
+                                    algorithm, type_preference, stations, queries, p50_ms, p90_ms, p99_ms,
+                                    mean_ms, expanded_mean, generated_mean and peak_memory_kb
+    """
+    n_stations = len(map.stations)
+    pairs, coordinates = random_queries(map, n_queries, seed)
+    results = []
+    for name in algorithms or ALGORITHMS:
+        search_function = ALGORITHMS[name]
+        queries = coordinates if name == 'Astar_improved' else pairs
+        for type_preference in TYPE_PREFERENCES.get(name, (0, 1, 2, 3)):
+            latencies = []
+            for origin, destination in queries:
+                start = time.perf_counter()
+                run_query(search_function, origin, destination, map, type_preference)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            stats = SearchStats()
+            for origin, destination in queries:
+                run_query(search_function, origin, destination, map, type_preference, stats=stats)
+
+            tracemalloc.start()
+            peak = 0
+            for origin, destination in queries[:memory_queries]:
+                tracemalloc.reset_peak()
+                run_query(search_function, origin, destination, map, type_preference)
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+            results.append({
+                'algorithm': name,
+                'type_preference': type_preference,
+                'stations': n_stations,
+                'queries': len(queries),
+                'p50_ms': float(np.percentile(latencies, 50)),
+                'p90_ms': float(np.percentile(latencies, 90)),
+                'p99_ms': float(np.percentile(latencies, 99)),
+                'mean_ms': float(np.mean(latencies)),
+                'expanded_mean': stats.expanded / len(queries),
+                'generated_mean': stats.generated / len(queries),
+                'peak_memory_kb': peak / 1024,
+            })
+    return results
+
+
+def run_benchmark(sizes=(100, 1000, 10000), algorithms=None, n_queries=50, seed=0):
+    """
+     benchmark_map on a generated city of each size (the city of each size is always the same for a seed).
+    """
+    results = []
+    for n_stations in sizes:
+        results += benchmark_map(generate_city(n_stations, seed=seed), algorithms, n_queries, seed)
+    return results
+
+
+def save_results(results, filename):
+    with open(filename, 'w', encoding='utf-8') as fp:
+        json.dump(results, fp, indent=1)
+
+
+def load_results(filename):
+    with open(filename, 'r', encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def compare_results(baseline, results, tolerance=0.2, metric='p50_ms'):
+    """
+     Results whose metric is more than tolerance (relative) worse than in the baseline.
+     Format of the parameter is:
+        Args:
+            baseline (list of dict): Results of an older run
+            results (list of dict): Results of the new run
+            tolerance (float): Allowed relative increase
+            metric (str): Key of the results to compare
+        Returns:
+            regressions (list of tuple): (algorithm, type_preference, stations, baseline value, new value)
+    """
+    key = lambda result: (result['algorithm'], result['type_preference'], result['stations'])
+    old = {key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = old.get(key(result))
+        if previous is not None and result[metric] > previous[metric] * (1 + tolerance):
+            regressions.append(key(result) + (previous[metric], result[metric]))
+    return regressions
+
+
+def print_results(results):
+    print('{:<22}{:>5}{:>9}{:>10}{:>10}{:>10}{:>12}{:>12}'.format(
+        'algorithm', 'pref', 'stations', 'p50 ms', 'p90 ms', 'p99 ms', 'expanded', 'peak KB'))
+    for result in results:
+        print('{:<22}{:>5}{:>9}{:>10.3f}{:>10.3f}{:>10.3f}{:>12.1f}{:>12.1f}'.format(
+            result['algorithm'], '-' if result['type_preference'] is None else result['type_preference'],
+            result['stations'], result['p50_ms'], result['p90_ms'], result['p99_ms'], result['expanded_mean'],
+            result['peak_memory_kb']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scaling benchmark of the search algorithms')
+    parser.add_argument('--stations', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--algorithms', nargs='+', choices=list(ALGORITHMS))
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file where the results are stored')
+    parser.add_argument('--baseline', help='JSON file of an older run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.stations, args.algorithms, args.queries, args.seed)
+    print_results(results)
+    if args.output:
+        save_results(results, args.output)
+    if args.baseline:
+        regressions = compare_results(load_results(args.baseline), results, args.tolerance)
+        for algorithm, type_preference, stations, before, after in regressions:
+            print('REGRESSION {} pref {} ({} stations): {:.3f} ms -> {:.3f} ms'.format(
+                algorithm, type_preference, stations, before, after))
@@ -0,0 +1,134 @@
+# This file contains a seeded generator of synthetic metro networks, used to measure how the
+# search algorithms scale beyond the cities of CityInformation/. Lines are random walks with
+# a preferred direction over a square grid of positions. Two lines that pass through the same
+# position share an interchange (one station per line with the same name and coordinates, as
+# in Stations.txt), and every line starts at a position of an older line so the network is
+# connected.
+# _________________________________________________________________________________________
+
+from SubwayMap import Map
+from utils import euclidean_dist, write_edge_list
+import numpy as np
+import math
+import os
+import random
+
+# Cities with more stations are written with a Connections.txt edge list instead of a dense Time.txt
+DENSE_LIMIT = 1000
+
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1), (1, 1), (-1, -1), (1, -1), (-1, 1))
+
+
+def generate_city(n_stations, n_lines=None, seed=0, spacing=20, transfer_time=(5, 20), velocities=(5, 45)):
+    """
+     Generates a metro network. The same arguments always give the same network.
+     The time between two stations of a line is the distance divided by the velocity of the line
+     times a random factor >= 1, so the heuristics of SearchAlgorithm.py stay admissible.
+     Format of the parameter is:
+        Args:
+            n_stations (int): Number of stations (ids 1 to n_stations)
+            n_lines (int): Number of lines (by default about sqrt(n_stations) / 2)
+            seed (int): Seed of the random choices
+            spacing (int): Distance between two neighbouring positions of the grid
+            transfer_time (tuple): Minimum and maximum time of a transfer between lines
+            velocities (tuple): Minimum and maximum velocity of a line
+        Returns:
+            subway_map (object of Map class): The generated map
+    """
+    rng = random.Random(seed)
+    n_lines = n_lines or max(2, round(math.sqrt(n_stations) / 2))
+    n_lines = min(n_lines, n_stations)
+    side = max(4, int(math.sqrt(n_stations) * 3))
+    lengths = [n_stations // n_lines + (1 if line < n_stations % n_lines else 0) for line in range(n_lines)]
+
+    subway_map = Map()
+    connections = {}
+    velocity = []
+    positions = {}  # {(column, row): list of station ids}
+    used = []  # Keys of positions in the order they were first used
+    station_id = 0
+    for line, length in enumerate(lengths, start=1):
+        if used:
+            position = rng.choice(used)
+        else:
+            position = (rng.randrange(side), rng.randrange(side))
+        direction = rng.choice(DIRECTIONS)
+        velocity.append(rng.randint(*velocities))
+        visited = set()
+        for ix in range(length):
+            station_id += 1
+            visited.add(position)
+            subway_map.add_station(station_id, 'S{}_{}'.format(*position), line, position[0] * spacing,
+                                   position[1] * spacing)
+            connections[station_id] = {}
+            for other_id in positions.get(position, ()):
+                connections[station_id][other_id] = connections[other_id][station_id] = \
+                    float(rng.randint(*transfer_time))
+            if position not in positions:
+                positions[position] = []
+                used.append(position)
+            positions[position].append(station_id)
+            if ix > 0:
+                distance = euclidean_dist(position_of(subway_map, station_id - 1), position_of(subway_map, station_id))
+                # Rounded up, so the time is never lower than the distance over the velocity
+                time = math.ceil(distance / velocity[-1] * rng.uniform(1, 1.3) * 1e5) / 1e5
+                connections[station_id - 1][station_id] = connections[station_id][station_id - 1] = time
+            position, direction = next_position(rng, position, direction, visited, side)
+            while position in visited:
+                # The walk is stuck, the line jumps to a random position
+                position = (rng.randrange(side), rng.randrange(side))
+
+    subway_map.add_connection(connections)
+    subway_map.add_velocity(velocity)
+    return subway_map
+
+
+def position_of(subway_map, station_id):
+    station = subway_map.stations[station_id]
+    return station['x'], station['y']
+
+
+def next_position(rng, position, direction, visited, side):
+    # Keeps the direction most of the time, turns 45 degrees sometimes and never goes back to a position of the line
+    turns = [direction] * 6 + [DIRECTIONS[(DIRECTIONS.index(direction) + k) % len(DIRECTIONS)] for k in (4, 6)]
+    rng.shuffle(turns)
+    for candidate in turns + list(DIRECTIONS):
+        new_position = (position[0] + candidate[0], position[1] + candidate[1])
+        if 0 <= new_position[0] < side and 0 <= new_position[1] < side and new_position not in visited:
+            return new_position, candidate
+    return position, direction
+
+
+def write_city(subway_map, root_folder, dense=None):
+    """
+     Writes a map in the files of a city folder: Stations.txt, InfoVelocity.txt and the cost table,
+     Time.txt (dense matrix) up to DENSE_LIMIT stations and Connections.txt (edge list) for bigger cities.
+     Format of the parameter is:
+        Args:
+            subway_map (object of Map class): The map, with station ids 1 to n
+            root_folder (str): Folder of the city, it is created if it does not exist
+            dense (bool): Force the format of the cost table
+    """
+    os.makedirs(root_folder, exist_ok=True)
+    with open(os.path.join(root_folder, 'Stations.txt'), 'w', encoding='utf-8') as fp:
+        for station_id, station in subway_map.stations.items():
+            fp.write('{}\t{}\t{}\t{}\t{}\n'.format(station_id, station['name'], station['line'], station['x'],
+                                                   station['y']))
+    with open(os.path.join(root_folder, 'InfoVelocity.txt'), 'w', encoding='utf-8') as fp:
+        fp.write('\n'.join(' Vel. line {} : {}'.format(line, velocity) for line, velocity in
+                           subway_map.velocity.items()))
+
+    n = len(subway_map.stations)
+    if dense is None:
+        dense = n <= DENSE_LIMIT
+    for filename in ('Time.txt', 'Connections.txt'):
+        if os.path.exists(os.path.join(root_folder, filename)):
+            os.remove(os.path.join(root_folder, filename))
+    if dense:
+        table = np.zeros((n, n))
+        for station_id, next_stations in subway_map.connections.items():
+            for next_id, cost in next_stations.items():
+                table[station_id - 1, next_id - 1] = cost
+        np.savetxt(os.path.join(root_folder, 'Time.txt'), table, fmt='%.5f')
+    else:
+        write_edge_list(subway_map.connections, os.path.join(root_folder, 'Connections.txt'))
@@ -0,0 +1,211 @@
+# This file contains a compact and immutable compiled form of the Map class.
+# Stations get contiguous integer indexes and the connections are stored in CSR form:
+# the neighbours of the station with index i are neighbours[offsets[i]:offsets[i + 1]]
+# and the times of those connections are weights[offsets[i]:offsets[i + 1]].
+# After a MapUpdate of the Map, compiled.updated(map) applies the changes of the journal to a new
+# CompiledMap instead of compiling the whole Map again.
+# _________________________________________________________________________________________
+
+from MapUpdates import changes_since
+import numpy as np
+
+
+class CompiledMap:
+    """
+    Array based, read only version of a Map. It is built once from a loaded Map:
+        # >>> compiled = CompiledMap(subway_map)
+        # >>> Astar(9, 3, compiled, 1)
+
+    self.station_ids: station id of every index
+    self.index: dictionary {station_id: index}
+    self.offsets, self.neighbours, self.weights: CSR arrays of the connections (weights are times)
+    self.x, self.y, self.line, self.line_velocity: parallel arrays with the information of each station
+    self.velocity: dictionary {line: velocity}, as in Map
+    self.version: version of the Map it was compiled from (None if it is unknown)
+    """
+
+    def __init__(self, map):
+        station_ids = sorted(map.stations)
+        index = {station_id: ix for ix, station_id in enumerate(station_ids)}
+
+        offsets = [0]
+        neighbours = []
+        weights = []
+        for station_id in station_ids:
+            for next_id, time in map.connections.get(station_id, {}).items():
+                neighbours.append(index[next_id])
+                weights.append(time)
+            offsets.append(len(neighbours))
+
+        stations = [map.stations[station_id] for station_id in station_ids]
+        line = np.array([s['line'] for s in stations], dtype=np.int32)
+
+        self._set('station_ids', np.array(station_ids, dtype=np.int64))
+        self._set('index', index)
+        self._set('offsets', np.array(offsets, dtype=np.int32))
+        self._set('neighbours', np.array(neighbours, dtype=np.int32))
+        self._set('weights', np.array(weights, dtype=np.float64))
+        self._set('x', np.array([s['x'] for s in stations], dtype=np.float64))
+        self._set('y', np.array([s['y'] for s in stations], dtype=np.float64))
+        self._set('line', line)
+        self._set('line_velocity', np.array([map.velocity.get(l, 0) for l in line.tolist()], dtype=np.float64))
+        self._set('velocity', dict(map.velocity))
+        self._set('version', getattr(map, 'version', None))
+        self._set('_lists', {})
+
+    @classmethod
+    def from_arrays(cls, station_ids, offsets, neighbours, weights, x, y, line, line_velocity, velocity,
+                    version=None):
+        """
+         CompiledMap that uses the given arrays without copying them (for example arrays in shared memory).
+         Format of the parameter is:
+            Args:
+                station_ids, offsets, neighbours, weights, x, y, line, line_velocity (numpy arrays): As the
+                                                                                      attributes of the class
+                velocity (dict): {line: velocity}
+                version (int): Version of the Map the arrays were compiled from
+            Returns:
+                compiled (CompiledMap): The compiled map
+        """
+        compiled = object.__new__(cls)
+        compiled._set('station_ids', station_ids)
+        compiled._set('index', {station_id: ix for ix, station_id in enumerate(station_ids.tolist())})
+        for name, value in (('offsets', offsets), ('neighbours', neighbours), ('weights', weights), ('x', x),
+                            ('y', y), ('line', line), ('line_velocity', line_velocity)):
+            compiled._set(name, value)
+        compiled._set('velocity', dict(velocity))
+        compiled._set('version', version)
+        compiled._set('_lists', {})
+        return compiled
+
+    def updated(self, map):
+        """
+         CompiledMap of map after the MapUpdates applied since this one was compiled from it. Only the
+         changed connections and velocities are written: the arrays that do not change are shared with this
+         CompiledMap, and the CSR rows are only sorted again if connections were added or removed.
+         Format of the parameter is:
+            Args:
+                map (object of Map class): The Map this CompiledMap was compiled from
+            Returns:
+                compiled (CompiledMap): The compiled map of the current version of map (self if it did
+                                        not change, and CompiledMap(map) if the changes are not in the journal)
+        """
+        changes = None if self.version is None else changes_since(map, self.version)
+        if changes is None:
+            return CompiledMap(map)
+        if not changes:
+            return self
+
+        # Last time of every changed connection (None if it was removed) and last velocity of every line
+        connections = {}
+        velocity = dict(self.velocity)
+        for change in changes:
+            if change[0] == 'connection':
+                connections[(self.index[change[1]], self.index[change[2]])] = change[4]
+            elif change[0] == 'velocity':
+                velocity[change[1]] = change[3]
+
+        offsets, neighbours, weights = self.offsets, self.neighbours, self.weights.copy()
+        removed = []
+        added = []
+        for (source, target), time in connections.items():
+            row = neighbours[offsets[source]:offsets[source + 1]]
+            position = np.flatnonzero(row == target)
+            if len(position):
+                if time is None:
+                    removed.append(offsets[source] + position[0])
+                else:
+                    weights[offsets[source] + position[0]] = time
+            elif time is not None:
+                added.append((source, target, time))
+        if removed or added:
+            keep = np.ones(len(neighbours), dtype=bool)
+            keep[removed] = False
+            sources = np.concatenate((self.edge_sources()[keep], np.array([a[0] for a in added], dtype=np.int32)))
+            neighbours = np.concatenate((neighbours[keep], np.array([a[1] for a in added], dtype=np.int32)))
+            weights = np.concatenate((weights[keep], np.array([a[2] for a in added], dtype=np.float64)))
+            # Stable, so the connections of a row keep their order and the added ones go at the end
+            order = np.argsort(sources, kind='stable')
+            neighbours, weights = neighbours[order], weights[order]
+            offsets = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=len(self))))).astype(np.int32)
+
+        line_velocity = self.line_velocity
+        if velocity != self.velocity:
+            line_velocity = line_velocity.copy()
+            for line, line_vel in velocity.items():
+                if line_vel != self.velocity.get(line):
+                    line_velocity[self.line == line] = line_vel
+
+        compiled = object.__new__(CompiledMap)
+        for name, value in (('station_ids', self.station_ids), ('index', self.index), ('offsets', offsets),
+                            ('neighbours', neighbours), ('weights', weights), ('x', self.x), ('y', self.y),
+                            ('line', self.line), ('line_velocity', line_velocity), ('velocity', velocity),
+                            ('version', map.version), ('_lists', {})):
+            compiled._set(name, value)
+        return compiled
+
+    def _set(self, name, value):
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledMap is immutable, compile the Map again after changing it")
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    def edge_sources(self):
+        """
+         Index of the station each connection starts from (the CSR rows expanded).
+        """
+        return np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.offsets))
+
+    def edge_costs(self, type_preference=0):
+        """
+         Cost of every connection according to type preference, using the same cost model
+         as calculate_cost in SearchAlgorithm.py.
+         Format of the parameter is:
+            Args:
+                type_preference: INTEGER Value to indicate the preference selected:
+                                0 - Adjacency
+                                1 - minimum Time
+                                2 - minimum Distance
+                                3 - minimum Transfers
+            Returns:
+                costs (numpy array): One cost per connection, parallel to self.neighbours
+        """
+        sources = self.edge_sources()
+        same_line = self.line[sources] == self.line[self.neighbours]
+        if type_preference == 0:
+            return (self.weights > 0).astype(np.float64)
+        elif type_preference == 1:
+            return self.weights.copy()
+        elif type_preference == 2:
+            return np.where(same_line, self.weights * self.line_velocity[self.neighbours], 0.0)
+        elif type_preference == 3:
+            return (~same_line).astype(np.float64)
+        return np.zeros(len(self.weights))
+
+    def csr_lists(self, type_preference=0):
+        """
+         Plain python lists (offsets, neighbours, costs) for the search loops, where indexing
+         lists is faster than indexing numpy arrays. They are built once per type preference.
+        """
+        if type_preference not in self._lists:
+            self._lists[type_preference] = (self.offsets.tolist(), self.neighbours.tolist(),
+                                            self.edge_costs(type_preference).tolist())
+        return self._lists[type_preference]
+
+    def reverse_csr_lists(self, type_preference=0):
+        """
+         Same as csr_lists for the reversed connections: the entries of row i are the stations with
+         a connection towards i, and the cost of that connection.
+        """
+        key = ('reverse', type_preference)
+        if key not in self._lists:
+            order = np.argsort(self.neighbours, kind='stable')
+            offsets = np.concatenate(([0], np.cumsum(np.bincount(self.neighbours, minlength=len(self)))))
+            self._lists[key] = (offsets.tolist(), self.edge_sources()[order].tolist(),
+                                self.edge_costs(type_preference)[order].tolist())
+        return self._lists[key]
@@ -0,0 +1,225 @@
+# This file contains a Contraction Hierarchy for minimum time routes (type_preference 1).
+# The stations are contracted one by one in order of importance, adding shortcut connections
+# that keep the shortest times between the remaining stations. A query is then a bidirectional
+# search that only goes up in the hierarchy, and the shortcuts are unpacked into the original
+# stations at the end.
+# _________________________________________________________________________________________
+
+from SubwayMap import Path
+import numpy as np
+import heapq
+import math
+
+
+class ContractionHierarchy:
+    """
+    Contraction Hierarchy of the time connections of a map.
+    Usage:
+        # >>> hierarchy = ContractionHierarchy.build(subway_map)
+        # >>> hierarchy.save('Lyon.npz')
+        # >>> hierarchy = ContractionHierarchy.load('Lyon.npz')
+        # >>> hierarchy.route(9, 3)
+
+    self.rank: {station_id: position in the contraction order}
+    self.edges: {(station_id, next_id): (time, middle station id or None for an original connection)}
+    """
+
+    # Maximum number of stations settled by a witness search before adding the shortcut anyway
+    WITNESS_LIMIT = 50
+
+    def __init__(self, rank, edges):
+        self.rank = rank
+        self.edges = edges
+        self.up = {station_id: [] for station_id in rank}
+        self.down = {station_id: [] for station_id in rank}
+        for (station_id, next_id), (time, _) in edges.items():
+            if rank[next_id] > rank[station_id]:
+                self.up[station_id].append((next_id, time))
+            else:
+                # Backward search from next_id goes up to station_id
+                self.down[next_id].append((station_id, time))
+
+    @classmethod
+    def build(cls, map):
+        """
+         Contracts every station of the map, in order of edge difference (shortcuts added minus
+         connections removed) plus the number of contracted neighbours.
+         Format of the parameter is:
+            Args:
+                map (object of Map class): All the map information
+            Returns:
+                hierarchy (ContractionHierarchy): The hierarchy of the map
+        """
+        out_edges = {station_id: {} for station_id in map.stations}
+        in_edges = {station_id: {} for station_id in map.stations}
+        edges = {}
+        for station_id, connections in map.connections.items():
+            for next_id, time in connections.items():
+                if station_id != next_id and time < edges.get((station_id, next_id), (math.inf,))[0]:
+                    edges[(station_id, next_id)] = (time, None)
+                    out_edges[station_id][next_id] = time
+                    in_edges[next_id][station_id] = time
+
+        contracted = set()
+        contracted_neighbours = {station_id: 0 for station_id in map.stations}
+
+        def priority(station_id):
+            shortcuts = cls._shortcuts(station_id, out_edges, in_edges, contracted)
+            removed = len(out_edges[station_id]) + len(in_edges[station_id])
+            return len(shortcuts) - removed + contracted_neighbours[station_id]
+
+        queue = [(priority(station_id), station_id) for station_id in map.stations]
+        heapq.heapify(queue)
+        rank = {}
+        while queue:
+            _, station_id = heapq.heappop(queue)
+            # Lazy update: the priority may have changed since it was pushed
+            current = priority(station_id)
+            if queue and current > queue[0][0]:
+                heapq.heappush(queue, (current, station_id))
+                continue
+
+            for (from_id, to_id), time in cls._shortcuts(station_id, out_edges, in_edges, contracted).items():
+                edges[(from_id, to_id)] = (time, station_id)
+                out_edges[from_id][to_id] = time
+                in_edges[to_id][from_id] = time
+            rank[station_id] = len(rank)
+            contracted.add(station_id)
+            for neighbour_id in set(out_edges[station_id]) | set(in_edges[station_id]):
+                contracted_neighbours[neighbour_id] += 1
+                out_edges[neighbour_id].pop(station_id, None)
+                in_edges[neighbour_id].pop(station_id, None)
+
+        return cls(rank, edges)
+
+    @classmethod
+    def _shortcuts(cls, station_id, out_edges, in_edges, contracted):
+        # Shortcuts needed to contract station_id: {(from_id, to_id): time}
+        shortcuts = {}
+        for from_id, time_in in in_edges[station_id].items():
+            if from_id in contracted:
+                continue
+            targets = {to_id: time_in + time_out for to_id, time_out in out_edges[station_id].items()
+                       if to_id != from_id and to_id not in contracted}
+            if not targets:
+                continue
+            witness = cls._witness_search(from_id, station_id, max(targets.values()), out_edges, contracted)
+            for to_id, time in targets.items():
+                if witness.get(to_id, math.inf) > time and time < out_edges[from_id].get(to_id, math.inf):
+                    shortcuts[(from_id, to_id)] = time
+        return shortcuts
+
+    @classmethod
+    def _witness_search(cls, origin_id, avoid_id, max_time, out_edges, contracted):
+        # Bounded Dijkstra from origin_id that does not use avoid_id nor the contracted stations
+        best = {origin_id: 0}
+        frontier = [(0, origin_id)]
+        settled = 0
+        while frontier and settled < cls.WITNESS_LIMIT:
+            time, station_id = heapq.heappop(frontier)
+            if time > best[station_id]:
+                continue
+            if time > max_time:
+                break
+            settled += 1
+            for next_id, cost in out_edges[station_id].items():
+                if next_id == avoid_id or next_id in contracted:
+                    continue
+                if time + cost < best.get(next_id, math.inf):
+                    best[next_id] = time + cost
+                    heapq.heappush(frontier, (time + cost, next_id))
+        return best
+
+    def unpack(self, station_id, next_id):
+        """
+         Original stations between station_id and next_id, without station_id.
+        """
+        middle = self.edges[(station_id, next_id)][1]
+        if middle is None:
+            return [next_id]
+        return self.unpack(station_id, middle) + self.unpack(middle, next_id)
+
+    def route(self, origin_id, destination_id):
+        """
+         Minimum time route with a bidirectional upward search.
+         Format of the parameter is:
+            Args:
+                origin_id (int): Starting station id
+                destination_id (int): Final station id
+            Returns:
+                path (Path Class): The route that goes from origin_id to destination_id ([] if there is none)
+        """
+        best = ({origin_id: 0}, {destination_id: 0})
+        parents = ({origin_id: None}, {destination_id: None})
+        frontier = ([(0, origin_id)], [(0, destination_id)])
+        graphs = (self.up, self.down)
+        closed = (set(), set())
+        mu, meeting = (0, origin_id) if origin_id == destination_id else (math.inf, None)
+        while True:
+            # A side stops when its lowest time can not improve the best meeting
+            sides = [side for side in (0, 1) if frontier[side] and frontier[side][0][0] < mu]
+            if not sides:
+                break
+            side = min(sides, key=lambda side: frontier[side][0][0])
+            other = 1 - side
+            time, station_id = heapq.heappop(frontier[side])
+            if station_id in closed[side] or time > best[side][station_id]:
+                continue
+            closed[side].add(station_id)
+            for next_id, cost in graphs[side][station_id]:
+                if time + cost < best[side].get(next_id, math.inf):
+                    best[side][next_id] = time + cost
+                    parents[side][next_id] = station_id
+                    heapq.heappush(frontier[side], (time + cost, next_id))
+                    if next_id in best[other] and time + cost + best[other][next_id] < mu:
+                        mu, meeting = time + cost + best[other][next_id], next_id
+            if station_id in best[other] and time + best[other][station_id] < mu:
+                mu, meeting = time + best[other][station_id], station_id
+        if meeting is None:
+            return []
+
+        up_route = []
+        station_id = meeting
+        while station_id is not None:
+            up_route.append(station_id)
+            station_id = parents[0][station_id]
+        up_route.reverse()
+        station_id = parents[1][meeting]
+        while station_id is not None:
+            up_route.append(station_id)
+            station_id = parents[1][station_id]
+
+        route = [origin_id]
+        for station_id, next_id in zip(up_route, up_route[1:]):
+            route += self.unpack(station_id, next_id)
+        path = Path(route)
+        for station_id, next_id in zip(route, route[1:]):
+            path.update_g(self.edges[(station_id, next_id)][0])
+        path.update_f()
+        return path
+
+    def save(self, filename):
+        """
+         Stores the hierarchy in a numpy .npz file.
+        """
+        stations = list(self.rank)
+        edges = list(self.edges.items())
+        np.savez(filename,
+                 station_ids=np.array(stations, dtype=np.int64),
+                 rank=np.array([self.rank[s] for s in stations], dtype=np.int64),
+                 edge_from=np.array([e[0][0] for e in edges], dtype=np.int64),
+                 edge_to=np.array([e[0][1] for e in edges], dtype=np.int64),
+                 edge_time=np.array([e[1][0] for e in edges], dtype=np.float64),
+                 edge_middle=np.array([-1 if e[1][1] is None else e[1][1] for e in edges], dtype=np.int64))
+
+    @classmethod
+    def load(cls, filename):
+        """
+         Reads a hierarchy stored with save.
+        """
+        with np.load(filename) as data:
+            rank = dict(zip(data['station_ids'].tolist(), data['rank'].tolist()))
+            edges = {(from_id, to_id): (time, None if middle == -1 else middle)
+                     for from_id, to_id, time, middle in zip(data['edge_from'].tolist(), data['edge_to'].tolist(),
+                                                             data['edge_time'].tolist(), data['edge_middle'].tolist())}
+        return cls(rank, edges)
@@ -0,0 +1,170 @@
+# This file contains the precomputed all-pairs cost tables of a city. They are computed offline
+# with one shortest path tree per origin station and type preference, stored in binary files and
+# opened with numpy.memmap, so a station to station query is a table lookup instead of a search.
+# The tables keep a signature of the map they were computed with (stations, connections and
+# velocities), and they are only used with a map that has the same signature, so they are never
+# read after a MapUpdate (a closure, a delay, ...) of the map. They are not patched with the changes
+# of the journal: compute_cost_tables has to compute them again in full for the modified map.
+# _________________________________________________________________________________________
+
+from SubwayMap import Path
+from CompiledMap import CompiledMap
+from SearchEngine import map_neighbours, shortest_path_tree
+from utils import load_city, city_hash
+import numpy as np
+import hashlib
+import os
+import threading
+import weakref
+
+TYPE_PREFERENCES = (0, 1, 2, 3)
+
+
+def map_hash(map):
+    """
+     sha256 of the stations, connections and velocities of a map as they are now (unlike city_hash, which
+     reads the files of the city).
+     Format of the parameter is:
+        Args:
+            map (object of Map class): All the map information
+        Returns:
+            (str): Hexadecimal digest
+    """
+    digest = hashlib.sha256()
+    for station_id in sorted(map.stations):
+        station = map.stations[station_id]
+        digest.update(repr((station_id, station['line'], station['x'], station['y'])).encode())
+    for station_id in sorted(map.connections):
+        digest.update(repr((station_id, sorted(map.connections[station_id].items()))).encode())
+    digest.update(repr(sorted(map.velocity.items())).encode())
+    return digest.hexdigest()
+
+
+class CostTables:
+    """
+    All-pairs costs of a map for every type preference.
+
+    self.station_ids: station id of every row/column of the tables
+    self.distances: array [type_preference, origin, destination] with the optimal cost (inf if unreachable)
+    self.predecessors: array [type_preference, origin, destination] with the row/column of the station
+                       before destination in the optimal route from origin (-1 for the origin or unreachable)
+    self.signature: map_hash of the map the tables were computed with
+    """
+
+    def __init__(self, station_ids, distances, predecessors, signature=None):
+        self.station_ids = station_ids
+        self.distances = distances
+        self.predecessors = predecessors
+        self.signature = signature
+        self.index = {int(station_id): ix for ix, station_id in enumerate(station_ids)}
+        # {map: (version, the map has the signature of the tables)}, the map is only hashed when its version changes
+        self._checked = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def matches(self, map):
+        """
+         True if the tables were computed with the current stations, connections and velocities of map.
+        """
+        with self._lock:
+            checked = self._checked.get(map)
+        if checked is None or checked[0] != map.version:
+            checked = (map.version, self.signature is not None and map_hash(map) == self.signature)
+            with self._lock:
+                self._checked[map] = checked
+        return checked[1]
+
+    def cost(self, origin_id, destination_id, type_preference=0):
+        return float(self.distances[type_preference, self.index[origin_id], self.index[destination_id]])
+
+    def route(self, origin_id, destination_id, type_preference=0):
+        """
+         Optimal route rebuilt from the predecessor table.
+         Format of the parameter is:
+            Args:
+                origin_id (int): Starting station id
+                destination_id (int): Final station id
+                type_preference: INTEGER Value to indicate the preference selected
+            Returns:
+                path (Path Class): The route that goes from origin_id to destination_id ([] if there is none)
+        """
+        origin, destination = self.index[origin_id], self.index[destination_id]
+        cost = float(self.distances[type_preference, origin, destination])
+        if np.isinf(cost):
+            return []
+        predecessors = self.predecessors[type_preference, origin]
+        route = [destination]
+        while route[-1] != origin:
+            route.append(int(predecessors[route[-1]]))
+        path = Path([int(self.station_ids[ix]) for ix in reversed(route)])
+        path.g = cost
+        path.update_f()
+        return path
+
+
+def compute_cost_tables(map):
+    """
+     Runs one shortest path tree per origin station and type preference.
+     Format of the parameter is:
+        Args:
+            map (object of Map class): All the map information
+        Returns:
+            tables (CostTables): Tables held in memory
+    """
+    compiled = CompiledMap(map)
+    n = len(compiled)
+    distances = np.full((len(TYPE_PREFERENCES), n, n), np.inf)
+    predecessors = np.full((len(TYPE_PREFERENCES), n, n), -1, dtype=np.int32)
+    for type_preference in TYPE_PREFERENCES:
+        neighbours = map_neighbours(compiled, type_preference)
+        for origin in range(n):
+            best_g, parents = shortest_path_tree(origin, neighbours)
+            nodes = list(best_g)
+            distances[type_preference, origin, nodes] = list(best_g.values())
+            predecessors[type_preference, origin, nodes] = [-1 if parents[node] is None else parents[node]
+                                                            for node in nodes]
+    return CostTables(compiled.station_ids.copy(), distances, predecessors, map_hash(map))
+
+
+def save_cost_tables(tables, folder):
+    # Every file is written with a temporary name first, so readers never open half written tables
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, 'signature.txt.tmp'), 'w') as fp:
+        fp.write(tables.signature)
+    os.replace(os.path.join(folder, 'signature.txt.tmp'), os.path.join(folder, 'signature.txt'))
+    # predecessors is written last, the tables are complete when it exists
+    for name in ('station_ids', 'distances', 'predecessors'):
+        filename = os.path.join(folder, name + '.npy')
+        with open(filename + '.tmp', 'wb') as fp:
+            np.save(fp, getattr(tables, name))
+        os.replace(filename + '.tmp', filename)
+
+
+def open_cost_tables(folder):
+    # The tables are memory-mapped, so they are shared by all the processes that open them
+    with open(os.path.join(folder, 'signature.txt')) as fp:
+        signature = fp.read()
+    return CostTables(np.load(os.path.join(folder, 'station_ids.npy')),
+                      np.load(os.path.join(folder, 'distances.npy'), mmap_mode='r'),
+                      np.load(os.path.join(folder, 'predecessors.npy'), mmap_mode='r'), signature)
+
+
+def load_cost_tables(root_folder, map=None, cache_folder=None):
+    """
+     Opens the cost tables of a city, computing and storing them first if the city files changed. If map is
+     given, the tables are the ones of map as it is now (computed again if it was modified).
+     Format of the parameter is:
+        Args:
+            root_folder (str): Folder with the Stations.txt, Time.txt (or Connections.txt) and InfoVelocity.txt files
+            map (object of Map class): Map of the city, loaded from root_folder if it is not given
+            cache_folder (str): Folder for the tables (root_folder/.cache by default)
+        Returns:
+            tables (CostTables): Memory-mapped tables of the city
+    """
+    if cache_folder is None:
+        cache_folder = os.path.join(root_folder, '.cache')
+    # A given map may be different from the files, so it is identified by its content
+    folder = os.path.join(cache_folder, 'cost_tables_' + (city_hash(root_folder) if map is None else map_hash(map)))
+    if not os.path.exists(os.path.join(folder, 'predecessors.npy')) or \
+            not os.path.exists(os.path.join(folder, 'signature.txt')):
+        save_cost_tables(compute_cost_tables(map if map is not None else load_city(root_folder)), folder)
+    return open_cost_tables(folder)
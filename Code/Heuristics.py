@@ -0,0 +1,144 @@
+# This file contains the heuristic tables used by A*. The heuristic of every station towards a
+# destination is computed in one vectorized pass and kept in a cache, so inside the search loop
+# the heuristic of a station is a single lookup.
+# _________________________________________________________________________________________
+
+from CompiledMap import CompiledMap
+from LineGraph import line_graph
+from MapUpdates import changes_since
+from collections import OrderedDict
+import numpy as np
+import threading
+import weakref
+
+# Maximum number of (destination, type_preference) tables kept for each map
+MAX_TABLES = 256
+
+_station_arrays = weakref.WeakKeyDictionary()
+_tables = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def map_signature(map, cached_signature=None):
+    # Changes when the map is modified, so cached values are not reused. Values cached with cached_signature
+    # are still valid if the map was only modified by MapUpdates that do not change the heuristics (delays
+    # and closures, see MapUpdates.py)
+    if cached_signature is not None and cached_signature != map.version and \
+            getattr(map, 'layout_version', map.version) <= cached_signature and \
+            changes_since(map, cached_signature) is not None:
+        return cached_signature
+    return map.version
+
+
+def station_arrays(map):
+    """
+     Parallel arrays with the ids, coordinates and lines of the stations of a Map, built once per map.
+     Format of the parameter is:
+        Args:
+            map (object of Map class): All the map information
+        Returns:
+            station_ids (list), x (numpy array), y (numpy array), line (numpy array)
+    """
+    cached = _station_arrays.get(map)
+    signature = map_signature(map, cached and cached[0])
+    if cached is None or cached[0] != signature:
+        station_ids = list(map.stations)
+        stations = [map.stations[station_id] for station_id in station_ids]
+        cached = (signature, (station_ids,
+                              np.array([s['x'] for s in stations], dtype=np.float64),
+                              np.array([s['y'] for s in stations], dtype=np.float64),
+                              np.array([s['line'] for s in stations], dtype=np.int64)))
+        _station_arrays[map] = cached
+    elif signature != map.version:
+        # Still valid, it is kept with the new version
+        _station_arrays[map] = (map.version, cached[1])
+    return cached[1]
+
+
+def compute_heuristics(x, y, line, destination, max_vel, type_preference=0):
+    """
+     Heuristic of every station towards the station in position destination of the arrays:
+        0 - Adjacency: 0 for the destination, 1 for the rest of stations
+        1 - minimum Time: euclidean distance divided by the fastest velocity
+        2 - minimum Distance: euclidean distance
+        3 - minimum Transfers: 1 if the line is not the one of the destination, 0 otherwise
+     The euclidean distance is computed as euclidean_dist in utils.py, so both give the same values.
+     Format of the parameter is:
+        Args:
+            x, y, line (numpy arrays): Coordinates and line of every station
+            destination (int): Position of the final station in the arrays
+            max_vel (float): Fastest velocity of the map
+            type_preference: INTEGER Value to indicate the preference selected
+        Returns:
+            h (numpy array): Heuristic value of every station
+    """
+    if type_preference == 0:
+        h = np.ones(len(x))
+        h[destination] = 0
+        return h
+    elif type_preference in (1, 2):
+        dx = x - x[destination]
+        dy = y - y[destination]
+        h = np.sqrt(dx ** 2 + dy ** 2)
+        if type_preference == 1:
+            h /= max_vel
+        return h
+    elif type_preference == 3:
+        return (line != line[destination]).astype(np.float64)
+    return np.zeros(len(x))
+
+
+def heuristic_table(map, destination_id, type_preference=0, reverse=False):
+    """
+     Heuristic of every station towards destination_id (as compute_heuristics, except for the minimum
+     transfers preference, which uses the transfers between lines of LineGraph.py). Tables are cached per
+     (map, destination_id, type_preference) and the least recently used ones are dropped
+     when there are more than MAX_TABLES for a map.
+     Format of the parameter is:
+        Args:
+            map (object of Map or CompiledMap class): All the map information
+            destination_id (int): Final station id
+            type_preference: INTEGER Value to indicate the preference selected:
+                            0 - Adjacency
+                            1 - minimum Time
+                            2 - minimum Distance
+                            3 - minimum Transfers
+            reverse (bool): Estimate of the cost from destination_id to every station instead (the same
+                            values except for the minimum transfers preference, where connections can be one way)
+        Returns:
+            table: For a Map, dictionary {station_id: h}. For a CompiledMap, list of h indexed
+                   by station index
+    """
+    reverse = reverse and type_preference == 3
+    key = (destination_id, type_preference, reverse)
+    with _lock:
+        cached = _tables.get(map)
+        signature = None if isinstance(map, CompiledMap) else map_signature(map, cached and cached[0])
+        if cached is None or cached[0] != signature:
+            cached = (signature, OrderedDict())
+            _tables[map] = cached
+        elif signature is not None and signature != map.version:
+            cached = (map.version, cached[1])
+            _tables[map] = cached
+        tables = cached[1]
+        if key in tables:
+            tables.move_to_end(key)
+            return tables[key]
+
+    if isinstance(map, CompiledMap):
+        station_ids, x, y, line, destination = None, map.x, map.y, map.line, map.index[destination_id]
+    else:
+        station_ids, x, y, line = station_arrays(map)
+        destination = station_ids.index(destination_id)
+    if type_preference == 3:
+        # Minimum number of transfers between the lines, instead of only 1 for a different line
+        h = line_graph(map).transfer_bounds(line, line[destination], reverse)
+    else:
+        h = compute_heuristics(x, y, line, destination, max(map.velocity.values()), type_preference)
+    table = h.tolist() if station_ids is None else dict(zip(station_ids, h.tolist()))
+
+    with _lock:
+        tables[key] = table
+        if len(tables) > MAX_TABLES:
+            tables.popitem(last=False)
+    return table
@@ -0,0 +1,212 @@
+# This file contains an incremental planner (Lifelong Planning A*) for one query. It keeps the
+# costs of its search between calls, so when some connections change or a station is closed
+# only the stations whose best cost depends on them are searched again, instead of running
+# Astar from scratch.
+#     planner = IncrementalPlanner(subway_map, 9, 3, 1)
+#     planner.plan()                                # first search, as Astar
+#     subway_map.connections[5][6] *= 2              # a delay
+#     subway_map.connections[6][5] *= 2
+#     planner.update_connections([(5, 6), (6, 5)])
+#     planner.close_station(7)
+#     planner.plan()                                # repaired search
+# or, with the changes applied by a MapUpdate (MapUpdates.py) to the map shared by many planners:
+#     planner.sync()
+#     planner.plan()
+# _________________________________________________________________________________________
+
+from SubwayMap import Path
+from SearchEngine import edge_cost, reverse_connections
+from Heuristics import heuristic_table
+from SearchStats import SearchStats
+from MapUpdates import changes_since
+import heapq
+import itertools
+import math
+import time
+
+INFINITE = (math.inf, math.inf)
+
+
+class IncrementalPlanner:
+    """
+    Optimal route of one (origin, destination, type preference) query of a Map that is repaired when
+    the map changes.
+
+    self.g: {station: (cost, connections) of the origin to the station found by the last expansion of
+            the station}
+    self.rhs: {station: lowest g of a predecessor plus the connection}. A station with g != rhs is
+              inconsistent and it is in the frontier
+    self.closed: stations that can not be used
+    self.predecessors: {station: set of stations with a connection towards it}
+
+    Costs are (cost, number of connections) compared in that order, so every connection has a positive
+    cost and the optimal cost is the same. The number of connections breaks the ties of the cycles of
+    cost 0 (the transfers of type preferences 2 and 3), so the repair is also correct with them.
+
+    The heuristics are computed once, with the map given to the constructor. They stay admissible
+    after delays and closures (costs only go up), and after any change that keeps the costs above
+    the distance (or time at the fastest velocity) between the stations.
+    """
+
+    def __init__(self, map, origin_id, destination_id, type_preference=0, stats=None):
+        self.map = map
+        self.origin_id = origin_id
+        self.destination_id = destination_id
+        self.type_preference = type_preference
+        self.stats = stats if stats is not None else SearchStats()
+        self.closed = set()
+        self.reset()
+
+    def reset(self):
+        # Search state of a new search with the current map
+        self.version = self.map.version
+        self.heuristic = heuristic_table(self.map, self.destination_id, self.type_preference)
+        self.predecessors = {station_id: set(previous) for station_id, previous in
+                             reverse_connections(self.map).items()}
+        self.g = {}
+        self.rhs = {self.origin_id: (0, 0)}
+        self.keys = {}
+        self.frontier = []
+        self.counter = itertools.count()
+        self.path = None
+        self.insert(self.origin_id)
+
+    def cost(self, station_id, next_id, g):
+        # g plus the connection from station_id to next_id
+        if station_id in self.closed or next_id in self.closed:
+            return INFINITE
+        return g[0] + edge_cost(self.map, station_id, next_id, self.type_preference), g[1] + 1
+
+    def key(self, station_id):
+        value = min(self.g.get(station_id, INFINITE), self.rhs.get(station_id, INFINITE))
+        return (value[0] + self.heuristic.get(station_id, 0),) + value
+
+    def insert(self, station_id):
+        key = self.key(station_id)
+        self.keys[station_id] = key
+        heapq.heappush(self.frontier, (key, next(self.counter), station_id))
+        self.stats.frontier(len(self.keys))
+
+    def top_key(self):
+        # Key of the first station of the frontier, entries of stations that left it are dropped
+        while self.frontier:
+            key, _, station_id = self.frontier[0]
+            if self.keys.get(station_id) == key:
+                return key
+            heapq.heappop(self.frontier)
+        return (math.inf,) + INFINITE
+
+    def update_station(self, station_id):
+        # Recomputes rhs of a station and puts it in the frontier if it is inconsistent
+        if station_id != self.origin_id:
+            rhs = INFINITE
+            if station_id not in self.closed:
+                for previous_id in self.predecessors.get(station_id, ()):
+                    g = self.g.get(previous_id, INFINITE)
+                    if g < rhs:
+                        rhs = min(rhs, self.cost(previous_id, station_id, g))
+            self.rhs[station_id] = rhs
+        self.keys.pop(station_id, None)
+        if self.g.get(station_id, INFINITE) != self.rhs.get(station_id, INFINITE):
+            self.insert(station_id)
+        self.stats.generated += 1
+        self.path = None
+
+    def update_connections(self, connections):
+        """
+         Tells the planner that the connections were modified in map.connections (new time, new
+         connection or removed connection).
+         Format of the parameter is:
+            Args:
+                connections (iterable of tuple): (station_id, next_id) of every modified connection
+        """
+        changed = set()
+        for station_id, next_id in connections:
+            if next_id in self.map.connections.get(station_id, ()):
+                self.predecessors.setdefault(next_id, set()).add(station_id)
+            else:
+                self.predecessors.get(next_id, set()).discard(station_id)
+            changed.add(next_id)
+        for station_id in changed:
+            self.update_station(station_id)
+
+    def sync(self):
+        """
+         Updates the planner with the MapUpdates applied to the map since the last call (see MapUpdates.py),
+         so the map can be modified only with them instead of calling update_connections. The search starts
+         again if the velocity of a line changed or if the changes are not in the journal of the map.
+        """
+        changes = changes_since(self.map, self.version)
+        if changes is None or any(change[0] == 'velocity' for change in changes):
+            self.reset()
+        else:
+            self.update_connections([(change[1], change[2]) for change in changes if change[0] == 'connection'])
+        self.version = self.map.version
+
+    def close_station(self, station_id):
+        # The station can not be used (all its connections are treated as removed)
+        if station_id not in self.closed:
+            self.closed.add(station_id)
+            self.update_neighbourhood(station_id)
+
+    def reopen_station(self, station_id):
+        if station_id in self.closed:
+            self.closed.discard(station_id)
+            self.update_neighbourhood(station_id)
+
+    def update_neighbourhood(self, station_id):
+        self.update_station(station_id)
+        for next_id in self.map.connections.get(station_id, ()):
+            self.update_station(next_id)
+
+    def compute(self):
+        # Expands the inconsistent stations until the cost of the destination is the optimal one
+        destination_id = self.destination_id
+        while self.top_key() < self.key(destination_id) or \
+                self.rhs.get(destination_id, INFINITE) != self.g.get(destination_id, INFINITE):
+            _, _, station_id = heapq.heappop(self.frontier)
+            del self.keys[station_id]
+            self.stats.expanded += 1
+            g, rhs = self.g.get(station_id, INFINITE), self.rhs.get(station_id, INFINITE)
+            if g > rhs:
+                self.g[station_id] = rhs
+            else:
+                self.g[station_id] = INFINITE
+                self.update_station(station_id)
+            for next_id in self.map.connections.get(station_id, ()):
+                self.update_station(next_id)
+
+    def plan(self):
+        """
+         Optimal route with the current state of the map. Only the stations affected by the changes
+         since the last call are searched again.
+         Format of the parameter is:
+            Returns:
+                path (Path Class): The route that goes from the origin to the destination ([] if there is none)
+        """
+        if self.path is not None:
+            return self.path
+        start = time.perf_counter()
+        if self.origin_id in self.closed:
+            self.path = []
+        else:
+            self.compute()
+            self.path = self.build_route()
+        self.stats.total_time += time.perf_counter() - start
+        return self.path
+
+    def build_route(self):
+        # Goes back from the destination through the connections that give the cost of each station
+        g = self.g.get(self.destination_id, INFINITE)
+        if g == INFINITE:
+            return []
+        route = [self.destination_id]
+        while route[-1] != self.origin_id:
+            station_id = route[-1]
+            route.append(next(previous_id for previous_id in self.predecessors[station_id]
+                              if self.cost(previous_id, station_id, self.g.get(previous_id, INFINITE)) ==
+                              self.g[station_id]))
+        route.reverse()
+        path = Path(route)
+        path.g = g[0]
+        return path
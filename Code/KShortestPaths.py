@@ -0,0 +1,155 @@
+# This file contains the k shortest loopless routes of a query (Yen's algorithm), to offer route
+# alternatives. A single backward Dijkstra from the destination gives the cost of every station to
+# the destination and its next station in the best route. Those costs are exact (or lower bounds
+# once some connections are removed), so every spur search is an Astar with a perfect heuristic
+# that stops as soon as it reaches a station whose best route is still allowed, and most of them
+# do not expand more than a few stations. Each new route is only deviated from the station where
+# it left the route it came from (Lawler's improvement), the earlier spurs were already searched.
+#     k_shortest_paths(9, 3, subway_map, 5, 1)                      # 5 best routes by time
+#     k_shortest_paths(9, 3, subway_map, 5, 1, max_cost_ratio=1.5)  # only up to 1.5 times the best
+# _________________________________________________________________________________________
+
+from SubwayMap import Path
+from SearchEngine import edge_cost, reverse_map_neighbours, shortest_path_tree, build_path
+from SearchStats import SearchStats
+import heapq
+import itertools
+import math
+import time
+
+
+def tree_route(next_station, station_id, blocked):
+    """
+     Best route of station_id to the destination in the shortest path tree.
+     Format of the parameter is:
+        Args:
+            next_station (dict): {station: next station in its best route} (None for the destination)
+            station_id (int): First station of the route
+            blocked (set): Stations the route can not go through
+        Returns:
+            route (list): Stations of the route, None if it goes through a blocked station
+    """
+    route = [station_id]
+    node = next_station[station_id]
+    while node is not None:
+        if node in blocked:
+            return None
+        route.append(node)
+        node = next_station[node]
+    return route
+
+
+def spur_search(spur_id, map, type_preference, to_destination, next_station, blocked, removed, stats):
+    """
+     Best route of spur_id to the destination that does not go through the blocked stations nor
+     the removed connections of spur_id. Astar with the costs to the destination as heuristic: a
+     station whose tree route is allowed has its exact cost, so the search ends when it is expanded.
+     Format of the parameter is:
+        Args:
+            spur_id (int): First station of the route
+            map (object of Map class): All the map information
+            type_preference: INTEGER Value to indicate the preference selected
+            to_destination (dict): {station: cost of its best route to the destination}
+            next_station (dict): {station: next station in its best route}
+            blocked (set): Stations the route can not go through (spur_id is never visited again)
+            removed (set): Next stations of spur_id that can not be used
+            stats (SearchStats): Filled with the statistics of the search
+        Returns:
+            cost (float): Cost of the route (None if there is none)
+            route (list): Stations of the route, from spur_id
+    """
+    blocked = blocked | {spur_id}
+    order = itertools.count()
+    best_g = {spur_id: 0}
+    parents = {spur_id: None}
+    closed = set()
+    frontier = [(to_destination[spur_id], next(order), 0, spur_id)]
+    while frontier:
+        _, _, g, station_id = heapq.heappop(frontier)
+        if station_id in closed or g > best_g[station_id]:
+            stats.pruned_redundant += 1
+            continue
+        stats.expanded += 1
+        route = tree_route(next_station, station_id, blocked)
+        if route is not None and (station_id != spur_id or route[1] not in removed):
+            return g + to_destination[station_id], build_path(parents, station_id, g).route + route[1:]
+        closed.add(station_id)
+        for next_id in map.connections.get(station_id, ()):
+            if next_id in blocked or next_id not in to_destination or \
+                    (station_id == spur_id and next_id in removed):
+                continue
+            new_g = g + edge_cost(map, station_id, next_id, type_preference)
+            stats.generated += 1
+            if new_g < best_g.get(next_id, math.inf):
+                best_g[next_id] = new_g
+                parents[next_id] = station_id
+                closed.discard(next_id)
+                heapq.heappush(frontier, (new_g + to_destination[next_id], next(order), new_g, next_id))
+                stats.frontier(len(frontier))
+    return None, []
+
+
+def k_shortest_paths(origin_id, destination_id, map, k, type_preference=0, max_cost_ratio=None, stats=None):
+    """
+     The k routes from origin_id to destination_id with the lowest cost that do not visit a station twice.
+     Format of the parameter is:
+        Args:
+            origin_id (int): Starting station id
+            destination_id (int): Final station id
+            map (object of Map class): All the map information
+            k (int): Maximum number of routes
+            type_preference: INTEGER Value to indicate the preference selected:
+                            0 - Adjacency
+                            1 - minimum Time
+                            2 - minimum Distance
+                            3 - minimum Transfers
+            max_cost_ratio (float): If given, the routes with a cost above max_cost_ratio times the cost of
+                                    the best route are not returned (the search stops at the first one)
+            stats (SearchStats): Filled with the statistics of the searches (see SearchStats.py)
+        Returns:
+            paths (list of Path Class): The routes by increasing cost, with their cost in g ([] if
+                                        destination_id can not be reached)
+    """
+    stats = stats if stats is not None else SearchStats()
+    start = time.perf_counter()
+    try:
+        # Shortest path tree of the reversed connections: the parent of a station is its next station
+        to_destination, next_station = shortest_path_tree(destination_id, reverse_map_neighbours(map, type_preference))
+        if k < 1 or origin_id not in to_destination:
+            return []
+        best_cost = to_destination[origin_id]
+        limit = math.inf if max_cost_ratio is None else best_cost * max_cost_ratio
+
+        paths = []
+        # Candidates (cost, order, route, index of the station where they leave the route they come from)
+        order = itertools.count()
+        best_route = tree_route(next_station, origin_id, set())
+        candidates = [(best_cost, next(order), best_route, 0)]
+        seen = {tuple(best_route)}
+        while candidates and len(paths) < k:
+            cost, _, route, deviation = heapq.heappop(candidates)
+            if cost > limit:
+                break
+            path = Path(route)
+            path.g = cost
+            paths.append(path)
+            if len(paths) == k:
+                break
+
+            root_cost = 0
+            for i in range(len(route) - 1):
+                if i >= deviation:
+                    root = route[:i + 1]
+                    # Next station of every route found with the same root, the new route leaves all of them
+                    removed = {other.route[i + 1] for other in paths if other.route[:i + 1] == root}
+                    spur_cost, spur_route = spur_search(route[i], map, type_preference, to_destination,
+                                                        next_station, set(root[:-1]), removed, stats)
+                    if spur_route:
+                        new_route = root[:-1] + spur_route
+                        if tuple(new_route) not in seen and root_cost + spur_cost <= limit:
+                            seen.add(tuple(new_route))
+                            heapq.heappush(candidates, (root_cost + spur_cost, next(order), new_route, i))
+                root_cost += edge_cost(map, route[i], route[i + 1], type_preference)
+        return paths
+    finally:
+        stats.total_time += time.perf_counter() - start
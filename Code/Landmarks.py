@@ -0,0 +1,186 @@
+# This file contains the ALT (A*, Landmarks and Triangle inequality) heuristic. The optimal costs
+# from and to a few landmark stations are precomputed, and for any station v and destination t
+# the triangle inequality gives the lower bounds
+#     cost(v, t) >= cost(L, t) - cost(L, v)    and    cost(v, t) >= cost(v, L) - cost(t, L)
+# which are usually much tighter than the euclidean heuristics of Heuristics.py.
+# _________________________________________________________________________________________
+
+from CompiledMap import CompiledMap
+from SearchEngine import map_neighbours, reverse_map_neighbours, shortest_path_tree
+from Heuristics import heuristic_table, MAX_TABLES
+from collections import OrderedDict
+import numpy as np
+import math
+import random
+import threading
+
+TYPE_PREFERENCES = (0, 1, 2, 3)
+
+
+def costs_array(best_g, n):
+    # Dictionary {index: cost} of a shortest path tree to an array (inf for the unreachable stations)
+    costs = np.full(n, np.inf)
+    costs[list(best_g)] = list(best_g.values())
+    return costs
+
+
+def select_landmarks(compiled, k, strategy='farthest', seed=0):
+    """
+     Chooses k landmark stations.
+        random: k random stations
+        farthest: each landmark is the station farthest (in number of connections) from the ones
+                  already chosen, starting from a random one
+        planar: the map is divided in k angular sectors around its center and the station farthest
+                from the center is chosen in each sector
+     Format of the parameter is:
+        Args:
+            compiled (CompiledMap): Compiled map
+            k (int): Number of landmarks
+            strategy (str): random, farthest or planar
+            seed (int): Seed of the random choices
+        Returns:
+            landmarks (list): Station indexes of the landmarks
+    """
+    n = len(compiled)
+    k = min(k, n)
+    rng = random.Random(seed)
+    if strategy == 'random':
+        return rng.sample(range(n), k)
+    elif strategy == 'farthest':
+        neighbours = map_neighbours(compiled, 0)
+        landmarks = [rng.randrange(n)]
+        closest = costs_array(shortest_path_tree(landmarks[0], neighbours)[0], n)
+        while len(landmarks) < k:
+            # Unreachable stations are the farthest ones
+            candidate = int(np.argmax(np.where(np.isinf(closest), np.finfo(float).max, closest)))
+            if candidate in landmarks:
+                break
+            landmarks.append(candidate)
+            closest = np.minimum(closest, costs_array(shortest_path_tree(candidate, neighbours)[0], n))
+        return landmarks
+    elif strategy == 'planar':
+        dx, dy = compiled.x - compiled.x.mean(), compiled.y - compiled.y.mean()
+        sector = ((np.arctan2(dy, dx) + math.pi) / (2 * math.pi) * k).astype(int) % k
+        radius = np.hypot(dx, dy)
+        landmarks = []
+        for s in range(k):
+            members = np.nonzero(sector == s)[0]
+            if len(members):
+                landmarks.append(int(members[np.argmax(radius[members])]))
+        return landmarks
+    raise ValueError("Unknown landmark strategy: {}".format(strategy))
+
+
+class LandmarkTables:
+    """
+    Optimal costs from and to the landmarks for every type preference.
+    Usage:
+        # >>> landmarks = LandmarkTables.build(subway_map, k=8, strategy='farthest')
+        # >>> Astar(9, 3, subway_map, 1, landmarks=landmarks)
+
+    self.station_ids: station id of every column of the tables
+    self.landmarks: station ids of the landmarks
+    self.from_landmarks: array [type_preference, landmark, station] with cost(landmark, station)
+    self.to_landmarks: array [type_preference, landmark, station] with cost(station, landmark)
+    """
+
+    def __init__(self, station_ids, landmarks, from_landmarks, to_landmarks):
+        self.station_ids = [int(station_id) for station_id in station_ids]
+        self.index = {station_id: ix for ix, station_id in enumerate(self.station_ids)}
+        self.landmarks = [int(landmark) for landmark in landmarks]
+        self.from_landmarks = from_landmarks
+        self.to_landmarks = to_landmarks
+        self.tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, map, k=8, strategy='farthest', seed=0):
+        """
+         Selects k landmarks and runs a forward and a backward shortest path tree from each of them
+         for every type preference.
+         Format of the parameter is:
+            Args:
+                map (object of Map or CompiledMap class): All the map information
+                k (int): Number of landmarks
+                strategy (str): Landmark selection strategy (see select_landmarks)
+                seed (int): Seed of the random choices
+            Returns:
+                tables (LandmarkTables): The landmark tables of the map
+        """
+        compiled = map if isinstance(map, CompiledMap) else CompiledMap(map)
+        n = len(compiled)
+        landmarks = select_landmarks(compiled, k, strategy, seed)
+        from_landmarks = np.full((len(TYPE_PREFERENCES), len(landmarks), n), np.inf)
+        to_landmarks = np.full((len(TYPE_PREFERENCES), len(landmarks), n), np.inf)
+        for type_preference in TYPE_PREFERENCES:
+            neighbours = map_neighbours(compiled, type_preference)
+            reverse_neighbours = reverse_map_neighbours(compiled, type_preference)
+            for ix, landmark in enumerate(landmarks):
+                from_landmarks[type_preference, ix] = costs_array(shortest_path_tree(landmark, neighbours)[0], n)
+                to_landmarks[type_preference, ix] = costs_array(shortest_path_tree(landmark, reverse_neighbours)[0], n)
+        return cls(compiled.station_ids.tolist(), compiled.station_ids[landmarks].tolist(), from_landmarks,
+                   to_landmarks)
+
+    def save(self, filename):
+        np.savez(filename, station_ids=np.array(self.station_ids), landmarks=np.array(self.landmarks),
+                 from_landmarks=self.from_landmarks, to_landmarks=self.to_landmarks)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            return cls(data['station_ids'].tolist(), data['landmarks'].tolist(), data['from_landmarks'],
+                       data['to_landmarks'])
+
+    def bounds(self, destination_id, type_preference=0):
+        """
+         Triangle inequality lower bound of the cost from every station to destination_id.
+         Format of the parameter is:
+            Args:
+                destination_id (int): Final station id
+                type_preference: INTEGER Value to indicate the preference selected
+            Returns:
+                h (numpy array): Lower bound of every station, in the order of self.station_ids
+        """
+        destination = self.index[destination_id]
+        from_landmarks = self.from_landmarks[type_preference]
+        to_landmarks = self.to_landmarks[type_preference]
+        with np.errstate(invalid='ignore'):
+            forward = from_landmarks[:, [destination]] - from_landmarks
+            backward = to_landmarks - to_landmarks[:, [destination]]
+        # Differences with unreachable stations do not give a valid bound
+        forward[~np.isfinite(forward)] = 0
+        backward[~np.isfinite(backward)] = 0
+        return np.maximum(np.maximum(forward, backward).max(axis=0, initial=0), 0)
+
+    def heuristic_table(self, map, destination_id, type_preference=0):
+        """
+         Heuristic table (as Heuristics.heuristic_table) with the maximum of the landmark bounds and
+         the usual heuristic, which is still admissible. Tables are cached per destination.
+         Format of the parameter is:
+            Args:
+                map (object of Map or CompiledMap class): The map the tables were built from
+                destination_id (int): Final station id
+                type_preference: INTEGER Value to indicate the preference selected
+            Returns:
+                table: For a Map, dictionary {station_id: h}. For a CompiledMap, list of h indexed
+                       by station index
+        """
+        key = (isinstance(map, CompiledMap), destination_id, type_preference)
+        with self._lock:
+            if key in self.tables:
+                self.tables.move_to_end(key)
+                return self.tables[key]
+
+        bounds = self.bounds(destination_id, type_preference).tolist()
+        base = heuristic_table(map, destination_id, type_preference)
+        if isinstance(map, CompiledMap):
+            table = [max(bounds[self.index[station_id]], base[ix])
+                     for ix, station_id in enumerate(map.station_ids.tolist())]
+        else:
+            table = {station_id: max(bounds[self.index[station_id]], h) for station_id, h in base.items()}
+
+        with self._lock:
+            self.tables[key] = table
+            if len(self.tables) > MAX_TABLES:
+                self.tables.popitem(last=False)
+        return table
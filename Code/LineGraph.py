@@ -0,0 +1,198 @@
+# This file contains the line graph of a map: which lines can be changed at which interchange
+# stations, and the minimum number of transfers between every pair of lines. It gives exact
+# lower bounds for the minimum transfers preference (type_preference 3).
+# In Stations.txt every station id belongs to a single line (an interchange such as CHARPENNES
+# appears once per line), so a (station, line) state of the transfer search is a station id.
+# After a MapUpdate the line graph of a Map is patched with the added and removed connections of
+# the journal, and the transfers are only computed again if two lines become (or stop being) adjacent.
+# _________________________________________________________________________________________
+
+from SubwayMap import Path
+from CompiledMap import CompiledMap
+from MapUpdates import changes_since
+from collections import Counter, deque
+import numpy as np
+import math
+import weakref
+
+
+class LineGraph:
+    """
+    Graph whose nodes are the lines of a map.
+
+    self.interchanges: {station name: list of station ids}, for the names used in more than one line
+    self.adjacent: {line: set of lines that can be reached with one transfer}
+    self.cross: Counter {(line, other line): number of interchanges and connections from line to other line}
+    self.transfers: {line: {other line: minimum number of transfers}} (missing if it can not be reached)
+    """
+
+    def __init__(self, map):
+        self.interchanges = {}
+        self.adjacent = {}
+        if isinstance(map, CompiledMap):
+            lines = map.line.tolist()
+            sources = map.edge_sources().tolist()
+            cross = [(lines[u], lines[v]) for u, v in zip(sources, map.neighbours.tolist()) if lines[u] != lines[v]]
+        else:
+            lines = [station['line'] for station in map.stations.values()]
+            # Stations with the same name in different lines are interchanges
+            by_name = {}
+            for station_id, station in map.stations.items():
+                by_name.setdefault(station['name'].strip().upper(), []).append(station_id)
+            for name, station_ids in by_name.items():
+                if len({map.stations[station_id]['line'] for station_id in station_ids}) > 1:
+                    self.interchanges[name] = station_ids
+            cross = [(map.stations[station_id]['line'], map.stations[next_id]['line'])
+                     for name, station_ids in self.interchanges.items()
+                     for station_id in station_ids for next_id in station_ids]
+            # Any other connection between lines is also a transfer, so the bounds stay valid
+            cross += [(map.stations[station_id]['line'], map.stations[next_id]['line'])
+                      for station_id, connections in map.connections.items() for next_id in connections]
+        for line in lines:
+            self.adjacent.setdefault(line, set())
+        self.cross = Counter((line, other) for line, other in cross if line != other)
+        for line, other in self.cross:
+            self.adjacent[line].add(other)
+
+        self.transfers = {line: self._breadth_first(line) for line in self.adjacent}
+
+    def update(self, map, changes):
+        """
+         Applies the connections added and removed by MapUpdates (changes as returned by changes_since).
+         Changes of time, velocity and closures (recorded as removed connections) do not change the lines.
+         Format of the parameter is:
+            Args:
+                map (object of Map class): All the map information
+                changes (list of tuple): Changes of the journal of the map
+        """
+        changed = False
+        for change in changes:
+            if change[0] != 'connection' or (change[3] is None) == (change[4] is None):
+                continue
+            pair = (map.stations[change[1]]['line'], map.stations[change[2]]['line'])
+            if pair[0] == pair[1]:
+                continue
+            self.cross[pair] += 1 if change[3] is None else -1
+            if self.cross[pair] == 0:
+                del self.cross[pair]
+                self.adjacent[pair[0]].discard(pair[1])
+                changed = True
+            elif pair[1] not in self.adjacent[pair[0]]:
+                self.adjacent[pair[0]].add(pair[1])
+                changed = True
+        if changed:
+            self.transfers = {line: self._breadth_first(line) for line in self.adjacent}
+
+    def _breadth_first(self, line):
+        transfers = {line: 0}
+        queue = deque([line])
+        while queue:
+            current = queue.popleft()
+            for other in self.adjacent[current]:
+                if other not in transfers:
+                    transfers[other] = transfers[current] + 1
+                    queue.append(other)
+        return transfers
+
+    def min_transfers(self, line, other):
+        """
+         Minimum number of transfers to go from a station of line to a station of other (inf if it
+         can not be done).
+        """
+        return self.transfers.get(line, {}).get(other, math.inf)
+
+    def transfer_bounds(self, lines, destination_line, reverse=False):
+        """
+         Vectorized min_transfers from every line in the array lines to destination_line (from
+         destination_line to every line with reverse).
+        """
+        if reverse:
+            table = {line: self.min_transfers(destination_line, line) for line in self.adjacent}
+        else:
+            table = {line: self.min_transfers(line, destination_line) for line in self.adjacent}
+        return np.array([table.get(line, math.inf) for line in np.asarray(lines).tolist()], dtype=np.float64)
+
+
+_line_graphs = weakref.WeakKeyDictionary()
+
+
+def line_graph(map):
+    """
+     LineGraph of a map, built once and patched with the changes of the journal when the map is modified
+     by MapUpdates (it is built again after add_station, add_connection or add_velocity).
+     Format of the parameter is:
+        Args:
+            map (object of Map or CompiledMap class): All the map information
+        Returns:
+            graph (LineGraph): Line graph of the map
+    """
+    version = getattr(map, 'version', 0)
+    cached = _line_graphs.get(map)
+    if cached is not None and cached[0] != version:
+        changes = changes_since(map, cached[0])
+        if changes is None:
+            cached = None
+        else:
+            cached[1].update(map, changes)
+            cached = (version, cached[1])
+            _line_graphs[map] = cached
+    if cached is None:
+        cached = (version, LineGraph(map))
+        _line_graphs[map] = cached
+    return cached[1]
+
+
+def transfer_search(origin_id, destination_id, map):
+    """
+     Minimum transfers route (type_preference 3). It is an A* whose heuristic is the minimum number
+     of transfers between the line of a station and the line of the destination. Costs and
+     heuristics are small integers, so the frontier is a list of buckets indexed by f instead of a
+     heap, and stations whose line can not reach the line of the destination are never generated.
+     Format of the parameter is:
+        Args:
+            origin_id (int): Starting station id
+            destination_id (int): Final station id
+            map (object of Map class): All the map information
+        Returns:
+            path (Path Class): The route that goes from origin_id to destination_id ([] if there is none)
+    """
+    graph = line_graph(map)
+    destination_line = map.stations[destination_id]['line']
+    # The connections can be one way, so the bound is from the line of the station to the destination line
+    bounds = {line: graph.min_transfers(line, destination_line) for line in graph.adjacent}
+    heuristic = lambda station_id: bounds.get(map.stations[station_id]['line'], math.inf)
+
+    f = heuristic(origin_id)
+    if math.isinf(f):
+        return []
+    best_g = {origin_id: 0}
+    parents = {origin_id: None}
+    closed = set()
+    buckets = {f: [origin_id]}
+    while buckets:
+        f = min(buckets)
+        bucket = buckets[f]
+        station_id = bucket.pop()
+        if not bucket:
+            del buckets[f]
+        if station_id in closed or best_g[station_id] + heuristic(station_id) != f:
+            continue
+        if station_id == destination_id:
+            route = []
+            while station_id is not None:
+                route.append(station_id)
+                station_id = parents[station_id]
+            path = Path(route[::-1])
+            path.g = best_g[destination_id]
+            path.update_f()
+            return path
+        closed.add(station_id)
+        line = map.stations[station_id]['line']
+        for next_id in map.connections[station_id]:
+            new_g = best_g[station_id] + (1 if map.stations[next_id]['line'] != line else 0)
+            new_f = new_g + heuristic(next_id)
+            if new_g < best_g.get(next_id, math.inf) and not math.isinf(new_f):
+                best_g[next_id] = new_g
+                parents[next_id] = station_id
+                buckets.setdefault(new_f, []).append(next_id)
+    return []
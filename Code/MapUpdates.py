@@ -0,0 +1,293 @@
+# This file contains the update API of a loaded Map. The changes of a MapUpdate are applied
+# together (or not at all, if one of them fails), the version of the map is increased once and
+# they are recorded in map.journal, so the caches and precomputed tables of the map can be
+# updated with only the changed connections instead of being rebuilt:
+#     with MapUpdate(subway_map) as update:
+#         update.scale_cost(5, 6, 2)
+#         update.close_station(7)
+#         update.set_velocity(2, 30)
+#     changes_since(subway_map, old_version)
+# Every change of the journal is one of:
+#     ('connection', station_id, next_id, old_time, new_time)   old or new time is None when the
+#                                                                connection is added or removed
+#     ('close_station', station_id), ('reopen_station', station_id)
+#     ('velocity', line, old_velocity, new_velocity)
+# A closed station (or a station of a closed line) has no connections while it is closed, they are
+# recorded as removed and added again when it is reopened.
+# Updated with the journal: reverse_connections (SearchEngine.py), line_graph (LineGraph.py), spatial_index
+# and line_indexes (SpatialIndex.py), the routes of a RouteCache, CompiledMap.updated and
+# IncrementalPlanner.sync. The heuristic tables (Heuristics.py) are kept after delays and closures and
+# computed again after the other changes. Built again in full after any change: CostTables
+# (compute_cost_tables), LandmarkTables.build and ContractionHierarchy.build.
+# _________________________________________________________________________________________
+
+# Maximum number of updates kept in the journal of a map
+MAX_JOURNAL = 1000
+
+
+def changes_since(map, version):
+    """
+     Changes of the map after version.
+     Format of the parameter is:
+        Args:
+            map (object of Map class): All the map information
+            version (int): Version of the map when it was last read
+        Returns:
+            changes (list of tuple): The changes in the order they were applied, or None if some modification
+                                     after version is not in the journal (add_station, add_connection,
+                                     add_velocity or an update older than MAX_JOURNAL)
+    """
+    journal = getattr(map, 'journal', [])
+    entries = [(entry_version, changes) for entry_version, changes in journal if entry_version > version]
+    if [entry_version for entry_version, _ in entries] != list(range(version + 1, map.version + 1)):
+        return None
+    return [change for _, changes in entries for change in changes]
+
+
+class MapUpdate:
+    """
+    Batch of changes of a Map. The methods only record the changes, they are applied by apply (or at the
+    end of a with block without exceptions).
+    Usage:
+        # >>> update = MapUpdate(subway_map)
+        # >>> update.set_cost(5, 6, 12.5)
+        # >>> update.close_line(3)
+        # >>> update.apply()
+        # [('connection', 5, 6, 10.1, 12.5), ('connection', 6, 5, 10.1, 12.5), ('connection', 10, 11, ...), ...]
+    """
+
+    def __init__(self, map):
+        self.map = map
+        self.operations = []
+        self.changes = None
+        self._undo = None
+        self._reverse = None
+        self._layout_changed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.apply()
+
+    def set_cost(self, station_id, next_id, time, both_ways=True):
+        # New time of a connection (it is added if it does not exist)
+        self.operations.append((self._set_cost, station_id, next_id, time, both_ways))
+
+    def scale_cost(self, station_id, next_id, factor, both_ways=True):
+        # Time of a connection multiplied by factor (a delay if factor > 1)
+        self.operations.append((self._scale_cost, station_id, next_id, factor, both_ways))
+
+    def close_station(self, station_id):
+        self.operations.append((self._close_station, station_id))
+
+    def reopen_station(self, station_id):
+        self.operations.append((self._reopen_station, station_id))
+
+    def close_line(self, line):
+        self.operations.append((self._close_line, line))
+
+    def reopen_line(self, line):
+        self.operations.append((self._reopen_line, line))
+
+    def set_velocity(self, line, velocity):
+        self.operations.append((self._set_velocity, line, velocity))
+
+    def apply(self):
+        """
+         Applies the changes to the map. If one of them is not valid, the ones already applied are undone
+         and the map is left as it was.
+         Format of the parameter is:
+            Returns:
+                changes (list of tuple): The changes recorded in the journal
+            Raises:
+                ValueError: A change of an unknown station, line or connection, or a negative time or velocity
+        """
+        if self.changes is not None:
+            raise ValueError("the update was already applied")
+        self.changes = []
+        self._undo = []
+        self._layout_changed = False
+        try:
+            for operation, *args in self.operations:
+                operation(*args)
+        except Exception:
+            for undo in reversed(self._undo):
+                undo()
+            self.changes = None
+            raise
+        finally:
+            self._reverse = None
+
+        map = self.map
+        if self.changes:
+            map.version += 1
+            if self._layout_changed:
+                map.layout_version = map.version
+            map.journal.append((map.version, self.changes))
+            del map.journal[:-MAX_JOURNAL]
+        return self.changes
+
+    def _check_station(self, station_id):
+        if station_id not in self.map.stations:
+            raise ValueError("unknown station {}".format(station_id))
+
+    def _check_line(self, line):
+        if line not in self.map.velocity:
+            raise ValueError("unknown line {}".format(line))
+
+    def _predecessors(self, station_id):
+        # Stations with a connection towards station_id, the index is built once per update
+        if self._reverse is None:
+            self._reverse = {}
+            for other_id, connections in self.map.connections.items():
+                for next_id in connections:
+                    self._reverse.setdefault(next_id, set()).add(other_id)
+        return self._reverse.get(station_id, set())
+
+    def _write(self, station_id, next_id, time):
+        # Sets (or removes, with time None) a connection of map.connections, recording the change
+        connections = self.map.connections
+        old_time = connections.get(station_id, {}).get(next_id)
+        if time is None:
+            del connections[station_id][next_id]
+            if self._reverse is not None:
+                self._reverse[next_id].discard(station_id)
+        else:
+            connections.setdefault(station_id, {})[next_id] = time
+            if self._reverse is not None:
+                self._reverse.setdefault(next_id, set()).add(station_id)
+            if old_time is None:
+                self._layout_changed = True
+        self.changes.append(('connection', station_id, next_id, old_time, time))
+        self._undo.append(lambda: self._restore(station_id, next_id, old_time))
+
+    def _restore(self, station_id, next_id, time):
+        if time is None:
+            self.map.connections[station_id].pop(next_id, None)
+        else:
+            self.map.connections.setdefault(station_id, {})[next_id] = time
+
+    def _write_closed(self, key, time):
+        # Sets (or removes) a connection of a closed station, it is not a change of the network until it is reopened
+        closed_connections = self.map.closed_connections
+        old_time = closed_connections.get(key)
+        if time is None:
+            del closed_connections[key]
+        else:
+            closed_connections[key] = time
+
+        def undo():
+            closed_connections.pop(key, None)
+            if old_time is not None:
+                closed_connections[key] = old_time
+        self._undo.append(undo)
+
+    def _set_connection(self, station_id, next_id, time):
+        self._check_station(station_id)
+        self._check_station(next_id)
+        if time is None or time < 0:
+            raise ValueError("the time of a connection can not be negative")
+        if self.map.is_closed(station_id) or self.map.is_closed(next_id):
+            self._write_closed((station_id, next_id), time)
+        else:
+            self._write(station_id, next_id, time)
+
+    def _current_time(self, station_id, next_id):
+        time = self.map.connections.get(station_id, {}).get(next_id)
+        if time is None:
+            time = self.map.closed_connections.get((station_id, next_id))
+        if time is None:
+            raise ValueError("there is no connection from {} to {}".format(station_id, next_id))
+        return time
+
+    def _set_cost(self, station_id, next_id, time, both_ways):
+        self._set_connection(station_id, next_id, time)
+        if both_ways:
+            self._set_connection(next_id, station_id, time)
+
+    def _scale_cost(self, station_id, next_id, factor, both_ways):
+        pairs = [(station_id, next_id), (next_id, station_id)] if both_ways else [(station_id, next_id)]
+        times = [self._current_time(*pair) for pair in pairs]
+        for pair, time in zip(pairs, times):
+            self._set_connection(*pair, time * factor)
+
+    def _set_closed(self, closed, key, value):
+        # Adds (value True) or removes key of the set closed, recording it to be undone
+        if value and key not in closed:
+            closed.add(key)
+            self._undo.append(lambda: closed.discard(key))
+        elif not value and key in closed:
+            closed.discard(key)
+            self._undo.append(lambda: closed.add(key))
+
+    def _disconnect(self, station_id):
+        # The connections of a station that was just closed are moved to closed_connections
+        for next_id in list(self.map.connections.get(station_id, ())):
+            self._write_closed((station_id, next_id), self.map.connections[station_id][next_id])
+            self._write(station_id, next_id, None)
+        for previous_id in list(self._predecessors(station_id)):
+            self._write_closed((previous_id, station_id), self.map.connections[previous_id][station_id])
+            self._write(previous_id, station_id, None)
+        self.changes.append(('close_station', station_id))
+
+    def _reconnect(self, station_id):
+        # The connections of a station that was just reopened are added again if the other station is open
+        for (previous_id, next_id), time in list(self.map.closed_connections.items()):
+            if station_id in (previous_id, next_id) and not self.map.is_closed(previous_id) and \
+                    not self.map.is_closed(next_id):
+                self._write_closed((previous_id, next_id), None)
+                self._write(previous_id, next_id, time)
+        self.changes.append(('reopen_station', station_id))
+
+    def _line_stations(self, line):
+        return [station_id for station_id, station in self.map.stations.items() if station['line'] == line]
+
+    def _close_station(self, station_id):
+        self._check_station(station_id)
+        was_closed = self.map.is_closed(station_id)
+        self._set_closed(self.map.closed_stations, station_id, True)
+        if not was_closed:
+            self._disconnect(station_id)
+
+    def _reopen_station(self, station_id):
+        self._check_station(station_id)
+        was_closed = self.map.is_closed(station_id)
+        self._set_closed(self.map.closed_stations, station_id, False)
+        if was_closed and not self.map.is_closed(station_id):
+            self._reconnect(station_id)
+
+    def _close_line(self, line):
+        self._check_line(line)
+        stations = [station_id for station_id in self._line_stations(line) if not self.map.is_closed(station_id)]
+        self._set_closed(self.map.closed_lines, line, True)
+        for station_id in stations:
+            self._disconnect(station_id)
+
+    def _reopen_line(self, line):
+        self._check_line(line)
+        stations = [station_id for station_id in self._line_stations(line) if self.map.is_closed(station_id)]
+        self._set_closed(self.map.closed_lines, line, False)
+        for station_id in stations:
+            if not self.map.is_closed(station_id):
+                self._reconnect(station_id)
+
+    def _set_velocity(self, line, velocity):
+        # Only the stations of the line are modified (add_velocity rebuilds every station)
+        self._check_line(line)
+        if velocity <= 0:
+            raise ValueError("the velocity of a line must be positive")
+        old_velocity = self.map.velocity[line]
+        stations = [self.map.stations[station_id] for station_id in self._line_stations(line)]
+        self.map.velocity[line] = velocity
+        for station in stations:
+            station['velocity'] = velocity
+
+        def undo():
+            self.map.velocity[line] = old_velocity
+            for station in stations:
+                station['velocity'] = old_velocity
+        self._undo.append(undo)
+        self._layout_changed = True
+        self.changes.append(('velocity', line, old_velocity, velocity))
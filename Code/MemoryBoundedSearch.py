@@ -0,0 +1,296 @@
+# This file contains two memory bounded versions of Astar that use the same cost and heuristic
+# models (calculate_cost and calculate_heuristics of SearchAlgorithm.py):
+#   IDA*: depth first searches with an increasing bound of f, it only keeps the current route
+#         and the pending siblings of its stations.
+#   SMA*: Astar that keeps at most max_nodes paths. When the budget is full it forgets the worst
+#         leaf (highest f, shallowest) and its parent remembers the f of the forgotten path, so it
+#         is generated again only if it becomes the most promising one. Routes that reach a station
+#         with a higher cost than another route in memory are not kept (a table with an entry for
+#         the station of every path in memory, so it is also bounded by max_nodes).
+# Both return an optimal route while the optimal route fits in their memory.
+# _________________________________________________________________________________________
+
+from SubwayMap import Path
+from SearchAlgorithm import expand, remove_cycles, calculate_cost, calculate_heuristics, update_f
+from SearchStats import SearchStats
+import heapq
+import itertools
+import math
+import time
+
+
+def successors(path, map, destination_id, type_preference=0):
+    """
+     Expanded paths of path without cycles, with their g, h and f.
+     Format of the parameter is:
+        Args:
+            path (Path or PathNode Class): Path to be expanded
+            map (object of Map class): All the map information
+            destination_id (int): Final station id
+            type_preference: INTEGER Value to indicate the preference selected
+        Returns:
+            expand_paths (LIST of PathNode Class): Expanded paths with updated costs
+    """
+    expand_paths = calculate_cost(remove_cycles(expand(path, map)), map, type_preference)
+    for new_path in expand_paths:
+        # calculate_heuristics leaves h unchanged in some cases, starting from 0 keeps it admissible
+        new_path.h = 0
+    return update_f(calculate_heuristics(expand_paths, map, destination_id, type_preference))
+
+
+def ida_star(origin_id, destination_id, map, type_preference=0, stats=None):
+    """
+     Iterative Deepening A*. Every iteration is a depth first search that does not go through paths
+     with f above the bound, and the next bound is the lowest f that was above it.
+     Format of the parameter is:
+        Args:
+            origin_id (int): Starting station id
+            destination_id (int): Final station id
+            map (object of Map class): All the map information
+            type_preference: INTEGER Value to indicate the preference selected:
+                            0 - Adjacency
+                            1 - minimum Time
+                            2 - minimum Distance
+                            3 - minimum Transfers
+            stats (SearchStats): Filled with the statistics of the search (see SearchStats.py)
+        Returns:
+            path (Path Class): The route that goes from origin_id to destination_id ([] if there is none)
+    """
+    stats = stats if stats is not None else SearchStats()
+    start = time.perf_counter()
+    root = update_f(calculate_heuristics([Path(origin_id)], map, destination_id, type_preference))[0]
+    bound = root.f
+    try:
+        while True:
+            next_bound = math.inf
+            # Pending paths of every depth of the current route, the next one is at the end
+            stack = [[root]]
+            frontier = 1
+            while stack:
+                if not stack[-1]:
+                    stack.pop()
+                    continue
+                path = stack[-1].pop()
+                frontier -= 1
+                if path.f > bound:
+                    next_bound = min(next_bound, path.f)
+                    continue
+                if path.last == destination_id:
+                    return path
+                stats.expanded += 1
+                expand_paths = successors(path, map, destination_id, type_preference)
+                stats.generated += len(expand_paths)
+                expand_paths.reverse()
+                stack.append(expand_paths)
+                frontier += len(expand_paths)
+                stats.frontier(frontier)
+            if math.isinf(next_bound):
+                return []
+            bound = next_bound
+    finally:
+        stats.total_time += time.perf_counter() - start
+
+
+class SMANode:
+    """
+    A path in the memory of sma_star.
+
+    self.path: the PathNode of the route
+    self.f: f of the path, raised to the lowest f of its successors once all of them are known
+    self.children: {station: SMANode} successors in memory
+    self.forgotten: {station: f} successors that were forgotten
+    self.complete: all the successors were generated at least once
+    self.key: hash of the route, the same route generated again has the same key
+    """
+    __slots__ = ('path', 'f', 'depth', 'parent', 'children', 'forgotten', 'complete', 'order', 'key')
+
+    def __init__(self, path, f, parent, order, key):
+        self.path = path
+        self.f = f
+        self.key = key
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.parent = parent
+        self.children = {}
+        self.forgotten = {}
+        self.complete = False
+        self.order = order
+
+
+def sma_star(origin_id, destination_id, map, type_preference=0, max_nodes=1000, stats=None):
+    """
+     Simplified Memory-bounded A*. It works as Astar while there is memory, and then forgets the
+     worst leaves. A path is only forgotten if it is not the most promising one.
+     Format of the parameter is:
+        Args:
+            origin_id (int): Starting station id
+            destination_id (int): Final station id
+            map (object of Map class): All the map information
+            type_preference: INTEGER Value to indicate the preference selected
+            max_nodes (int): Maximum number of paths kept in memory (at least 2). The route is optimal if
+                             it has less than max_nodes stations
+            stats (SearchStats): Filled with the statistics of the search (see SearchStats.py)
+        Returns:
+            path (Path Class): The route that goes from origin_id to destination_id ([] if there is none,
+                               or if no route fits in max_nodes)
+    """
+    if max_nodes < 2:
+        raise ValueError("max_nodes must be at least 2")
+    stats = stats if stats is not None else SearchStats()
+    start = time.perf_counter()
+    order = itertools.count()
+    root_path = update_f(calculate_heuristics([Path(origin_id)], map, destination_id, type_preference))[0]
+    root = SMANode(root_path, root_path.f, None, next(order), hash((origin_id,)))
+
+    # Nodes with successors that are not in memory, by the lowest f of those successors and deepest.
+    # Entries are checked when they are popped, since f and the membership of a node change
+    open_nodes = {root}
+    best_heap = [(root.f, 0, root.order, root)]
+    # Leaves, by highest f, shallowest and oldest, to choose the one to forget
+    leaf_heap = []
+    memory = 1
+    # {station: (g, depth, key)} lowest g of the paths in memory that end at every station, and the depth and
+    # key of that path. An entry is removed when its path is forgotten, so there are at most max_nodes
+    best_g = {origin_id: (0, 0, root.key)}
+
+    def release(node):
+        # Removes the entry of best_g of a path that leaves the memory, if it is its owner
+        if best_g.get(node.path.last, (None, None, None))[2] == node.key:
+            del best_g[node.path.last]
+
+    def missing_f(node):
+        # Lowest f of the successors of node that are not in memory. The ones never generated have at
+        # least the f of node
+        if not node.complete:
+            return node.f
+        return min(node.forgotten.values(), default=math.inf)
+
+    def push(node):
+        heapq.heappush(best_heap, (missing_f(node), -node.depth, node.order, node))
+        if not node.children:
+            heapq.heappush(leaf_heap, (-node.f, node.depth, node.order, node))
+
+    def backup(node):
+        # f of a complete node is the lowest f of its successors, and it goes up to its ancestors
+        while node is not None and node.complete:
+            values = [child.f for child in node.children.values()] + list(node.forgotten.values())
+            new_f = min(values) if values else math.inf
+            if new_f == node.f:
+                break
+            node.f = new_f
+            push(node)
+            node = node.parent
+
+    def worst_leaf(best):
+        # Leaf with the highest f (and shallowest) that is not best, None if there is none
+        skipped = []
+        worst = None
+        while leaf_heap:
+            minus_f, _, _, node = leaf_heap[0]
+            if node.parent is None or node.children or -minus_f != node.f or \
+                    node.parent.children.get(node.path.last) is not node:
+                heapq.heappop(leaf_heap)
+            elif node is best:
+                skipped.append(heapq.heappop(leaf_heap))
+            else:
+                worst = node
+                break
+        for entry in skipped:
+            heapq.heappush(leaf_heap, entry)
+        return worst
+
+    def forget(node):
+        parent = node.parent
+        del parent.children[node.path.last]
+        parent.forgotten[node.path.last] = node.f
+        open_nodes.discard(node)
+        release(node)
+        node.parent = None
+        stats.forgotten += 1
+        open_nodes.add(parent)
+        push(parent)
+
+    try:
+        while open_nodes:
+            best = None
+            while best_heap:
+                f, _, _, node = heapq.heappop(best_heap)
+                if node in open_nodes and f == missing_f(node):
+                    best = node
+                    break
+            if best is None or math.isinf(missing_f(best)):
+                return []
+            if best.path.last == destination_id:
+                return best.path
+            stats.expanded += 1
+
+            candidates = []
+            for path in successors(best.path, map, destination_id, type_preference):
+                if path.last in best.children or best.forgotten.get(path.last) == math.inf:
+                    # In memory, or forgotten for good (dead end or too deep)
+                    continue
+                # A path is not needed if another route in memory reached the same station with a lower cost,
+                # or the same cost and less stations
+                key = hash((best.key, path.last))
+                g, depth, best_key = best_g.get(path.last, (math.inf, math.inf, None))
+                if (path.g, best.depth + 1) > (g, depth) or (path.g == g and best.depth + 1 == depth and
+                                                              key != best_key):
+                    stats.pruned_redundant += 1
+                    best.forgotten.pop(path.last, None)
+                    continue
+                candidates.append(path)
+            if not candidates:
+                best.complete = True
+                open_nodes.discard(best)
+                if best.children:
+                    backup(best)
+                    continue
+                # Dead end, it is forgotten for good
+                if best.parent is None:
+                    return []
+                parent = best.parent
+                del parent.children[best.path.last]
+                parent.forgotten[best.path.last] = math.inf
+                # Another route may still go on from this station
+                release(best)
+                best.parent = None
+                memory -= 1
+                if not parent.children:
+                    push(parent)
+                backup(parent)
+                continue
+            for path in candidates:
+                path.f = max(path.f, best.f, best.forgotten.get(path.last, -math.inf))
+            # Successors are generated in order, and once all of them are known the forgotten one with
+            # the lowest f is generated again
+            new_paths = [path for path in candidates if path.last not in best.forgotten]
+            new_path = new_paths[0] if new_paths else min(candidates, key=lambda path: path.f)
+            best.complete = best.complete or len(new_paths) <= 1
+
+            f = new_path.f
+            if new_path.last != destination_id and best.depth + 2 >= max_nodes:
+                # Its successors would not fit in memory
+                f = math.inf
+            if memory >= max_nodes:
+                worst = worst_leaf(best)
+                if worst is not None:
+                    forget(worst)
+                    memory -= 1
+            child = SMANode(new_path, f, best, next(order), hash((best.key, new_path.last)))
+            if not math.isinf(f):
+                best_g[new_path.last] = (new_path.g, child.depth, child.key)
+            best.children[new_path.last] = child
+            best.forgotten.pop(new_path.last, None)
+            memory += 1
+            stats.generated += 1
+            stats.frontier(memory)
+            open_nodes.add(child)
+            push(child)
+
+            if all(path.last in best.children for path in candidates):
+                open_nodes.discard(best)
+            else:
+                push(best)
+            backup(best)
+        return []
+    finally:
+        stats.total_time += time.perf_counter() - start
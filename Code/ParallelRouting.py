@@ -0,0 +1,128 @@
+# This file contains a routing executor that runs queries in a pool of processes. The compiled
+# arrays of the map are copied once into multiprocessing.shared_memory blocks and every worker
+# builds a CompiledMap over those blocks, so the map is never pickled for the workers.
+# _________________________________________________________________________________________
+
+from CompiledMap import CompiledMap
+from SearchEngine import heap_search, bidirectional_search
+from multiprocessing import Pool, shared_memory
+import numpy as np
+
+ARRAYS = ('station_ids', 'offsets', 'neighbours', 'weights', 'x', 'y', 'line', 'line_velocity')
+
+# CompiledMap of the worker process, set by _attach
+_worker_map = None
+_worker_blocks = []
+
+
+class SharedGraph:
+    """
+    The arrays of a CompiledMap copied into shared memory blocks.
+
+    self.descriptor: small picklable description (block names, shapes and dtypes, velocities) that
+                     other processes use to attach to the blocks
+    """
+
+    def __init__(self, compiled):
+        self.blocks = []
+        arrays = {}
+        for name in ARRAYS:
+            array = getattr(compiled, name)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            self.blocks.append(block)
+            arrays[name] = (block.name, array.shape, array.dtype.str)
+        self.descriptor = {'arrays': arrays, 'velocity': dict(compiled.velocity)}
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def attach(descriptor):
+    """
+     CompiledMap over the shared memory blocks of a SharedGraph descriptor.
+     Format of the parameter is:
+        Args:
+            descriptor (dict): SharedGraph.descriptor
+        Returns:
+            compiled (CompiledMap): Compiled map whose arrays live in shared memory
+            blocks (list): Shared memory blocks, they must be kept open while the map is used
+    """
+    arrays = {}
+    blocks = []
+    for name, (block_name, shape, dtype) in descriptor['arrays'].items():
+        # Pool workers share the resource tracker of the process that created the blocks, which
+        # is the one that unlinks them in SharedGraph.close
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return CompiledMap.from_arrays(velocity=descriptor['velocity'], **arrays), blocks
+
+
+def _attach(descriptor):
+    global _worker_map, _worker_blocks
+    _worker_map, _worker_blocks = attach(descriptor)
+
+
+def run_query(query):
+    """
+     Runs one query in a worker.
+     Format of the parameter is:
+        Args:
+            query (tuple): (origin_id, destination_id, type_preference) and optionally the algorithm:
+                           'Astar' (default), 'uniform_cost_search' or 'bidirectional'
+        Returns:
+            path (Path Class): The route of the query
+    """
+    origin_id, destination_id, type_preference = query[:3]
+    algorithm = query[3] if len(query) > 3 else 'Astar'
+    if algorithm == 'bidirectional':
+        return bidirectional_search(origin_id, destination_id, _worker_map, type_preference)
+    return heap_search(origin_id, destination_id, _worker_map, type_preference,
+                       use_heuristics=algorithm != 'uniform_cost_search')
+
+
+def _run_indexed_query(indexed_query):
+    return indexed_query[0], run_query(indexed_query[1])
+
+
+class RoutingExecutor:
+    """
+    Pool of processes that answer routing queries over one shared map.
+    Usage:
+        # >>> with RoutingExecutor(subway_map, processes=4) as executor:
+        # ...     routes = executor.map([(9, 3, 1), (2, 6, 0), (8, 1, 3, 'uniform_cost_search')])
+        # ...     for ix, route in executor.map_unordered(queries):
+        # ...         print(ix, route.route)
+    """
+
+    def __init__(self, map, processes=None):
+        compiled = map if isinstance(map, CompiledMap) else CompiledMap(map)
+        self.graph = SharedGraph(compiled)
+        self.pool = Pool(processes, initializer=_attach, initargs=(self.graph.descriptor,))
+
+    def map(self, queries, chunksize=16):
+        """
+         Routes of the queries, in the same order as the queries.
+        """
+        return list(self.pool.imap(run_query, queries, chunksize))
+
+    def map_unordered(self, queries, chunksize=16):
+        """
+         Generator of (position of the query, route) tuples, in the order they are completed.
+        """
+        return self.pool.imap_unordered(_run_indexed_query, enumerate(queries), chunksize)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.graph.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,144 @@
+# This file contains a multi-criteria search that finds in a single pass all the Pareto-optimal
+# routes over (time, transfers, distance): the routes such that no other route is at least as good
+# in the three criteria. The costs of each criterion are the ones of calculate_cost for the
+# type preferences 1 (time), 3 (transfers) and 2 (distance). The heuristic tables of the three
+# preferences give a lower bound of every criterion to the destination, so labels are expanded
+# in lexicographic order of their estimated costs and labels that can not beat a route already found
+# are dropped. As the heuristics are consistent, a label expanded before another one of the same station
+# (or before a route to the destination is found) never has a larger time, so the dominance tests only
+# compare transfers and distance, in a staircase of each station (NAMOA* with dimensionality reduction).
+# _________________________________________________________________________________________
+
+from SubwayMap import Path
+from SearchEngine import edge_cost
+from Heuristics import heuristic_table
+import bisect
+import heapq
+import itertools
+import math
+
+# Type preference of each criterion
+CRITERIA = (1, 3, 2)
+
+
+class Label:
+    """
+    A partial route that reaches a station with some costs. Labels are linked to the label they were
+    extended from, as PathNode.
+    """
+    __slots__ = ('costs', 'station', 'parent')
+
+    def __init__(self, costs, station, parent):
+        self.costs = costs
+        self.station = station
+        self.parent = parent
+
+    def route(self):
+        stations = []
+        label = self
+        while label is not None:
+            stations.append(label.station)
+            label = label.parent
+        return stations[::-1]
+
+
+class Staircase:
+    """
+    Non-dominated (transfers, distance) pairs, sorted by transfers (so the distances decrease).
+    """
+    __slots__ = ('transfers', 'distances')
+
+    def __init__(self):
+        self.transfers = []
+        self.distances = []
+
+    def __len__(self):
+        return len(self.transfers)
+
+    def dominates(self, transfers, distance):
+        # A pair is at least as good as (transfers, distance)
+        i = bisect.bisect_right(self.transfers, transfers) - 1
+        return i >= 0 and self.distances[i] <= distance
+
+    def add(self, transfers, distance):
+        # (transfers, distance) must not be dominated, the pairs it dominates are removed
+        i = bisect.bisect_left(self.transfers, transfers)
+        j = i
+        while j < len(self.distances) and self.distances[j] >= distance:
+            j += 1
+        self.transfers[i:j] = [transfers]
+        self.distances[i:j] = [distance]
+
+
+def pareto_search(origin_id, destination_id, map, max_labels=None):
+    """
+     Multi-label search from origin_id. Labels are expanded in lexicographic order of their costs plus the
+     lower bounds to the destination (time, transfers, distance). A label is dropped if it is dominated by a
+     label of the same station expanded before, or if its costs plus the lower bounds are dominated by a
+     route to the destination already found.
+     Format of the parameter is:
+        Args:
+            origin_id (int): Starting station id
+            destination_id (int): Final station id
+            map (object of Map class): All the map information
+            max_labels (int): Maximum number of labels expanded for a station. None (default) for no limit,
+                              with a limit some Pareto-optimal routes may be lost
+        Returns:
+            paths (list of Path Class): Pareto-optimal routes sorted by time. path.g is the time of the
+                                        route and path.costs is the tuple (time, transfers, distance)
+    """
+    time_table, transfers_table, distance_table = [heuristic_table(map, destination_id, type_preference)
+                                                   for type_preference in CRITERIA]
+    closed = {}
+    found = Staircase()
+    routes = []
+
+    def estimate(station_id, costs):
+        # Costs plus the lower bounds to the destination, None if they can not beat a route already found
+        time, transfers, distance = costs
+        bounds = (time + time_table.get(station_id, math.inf),
+                  transfers + transfers_table.get(station_id, math.inf),
+                  distance + distance_table.get(station_id, math.inf))
+        if math.isinf(bounds[0]) or math.isinf(bounds[1]) or math.isinf(bounds[2]) or \
+                found.dominates(bounds[1], bounds[2]):
+            return None
+        return bounds
+
+    order = itertools.count()
+    bounds = estimate(origin_id, (0, 0, 0))
+    frontier = [(bounds, next(order), Label((0, 0, 0), origin_id, None))] if bounds is not None else []
+    while frontier:
+        bounds, _, label = heapq.heappop(frontier)
+        _, transfers, distance = label.costs
+        stairs = closed.get(label.station)
+        if stairs is None:
+            stairs = closed[label.station] = Staircase()
+        elif stairs.dominates(transfers, distance) or (max_labels is not None and len(stairs) >= max_labels):
+            continue
+        if found.dominates(bounds[1], bounds[2]):
+            continue
+        stairs.add(transfers, distance)
+        if label.station == destination_id:
+            found.add(transfers, distance)
+            routes.append(label)
+            continue
+
+        time = label.costs[0]
+        for next_id in map.connections[label.station]:
+            costs = (time + edge_cost(map, label.station, next_id, 1),
+                     transfers + edge_cost(map, label.station, next_id, 3),
+                     distance + edge_cost(map, label.station, next_id, 2))
+            next_stairs = closed.get(next_id)
+            if next_stairs is not None and next_stairs.dominates(costs[1], costs[2]):
+                continue
+            bounds = estimate(next_id, costs)
+            if bounds is not None:
+                heapq.heappush(frontier, (bounds, next(order), Label(costs, next_id, label)))
+
+    paths = []
+    for label in routes:
+        path = Path(label.route())
+        path.g = label.costs[0]
+        path.costs = label.costs
+        paths.append(path)
+    return paths
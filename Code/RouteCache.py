@@ -0,0 +1,168 @@
+# This file contains an optional memoization layer for the search functions of SearchAlgorithm.py.
+# Routes are kept in a bounded LRU cache keyed by the query, with the version of the map they were
+# found in. When the map was modified after that, the changes of its journal tell whether the route is
+# still optimal: only the routes that use a changed connection, or that could be beaten after a change
+# that makes a connection cheaper (or adds one, or changes a velocity) are removed. The cache does not
+# keep the maps alive: the routes of a map are removed when the map is garbage collected.
+# _________________________________________________________________________________________
+
+from SubwayMap import Path
+from MapUpdates import changes_since
+from collections import OrderedDict
+import functools
+import threading
+import weakref
+
+
+def copy_path(path):
+    # Cached paths are never given to the caller, so modifying a returned path does not change the cache
+    if not path:
+        return path
+    new_path = Path(list(path.route))
+    new_path.g, new_path.h, new_path.f = path.g, path.h, path.f
+    return new_path
+
+
+def still_optimal(path, changes):
+    """
+     Whether an optimal route (or the lack of a route) is still optimal after the changes: none of them
+     makes a connection cheaper or adds one, changes a velocity or changes a connection of the route.
+     Format of the parameter is:
+        Args:
+            path (Path Class): Optimal route found before the changes ([] if there was none)
+            changes (list of tuple): Changes of the journal of the map (see MapUpdates.py)
+        Returns:
+            (bool): True if the route can still be served
+    """
+    route_connections = set(zip(path.route, path.route[1:])) if path else set()
+    for change in changes:
+        if change[0] == 'velocity':
+            return False
+        if change[0] == 'connection':
+            _, station_id, next_id, old_time, new_time = change
+            if (station_id, next_id) in route_connections or \
+                    (new_time is not None and (old_time is None or new_time < old_time)):
+                return False
+    return True
+
+
+class RouteCache:
+    """
+    LRU cache of routes.
+    Usage:
+        # >>> cache = RouteCache(max_size=1000)
+        # >>> cached_Astar = cache.wrap(Astar)
+        # >>> cached_Astar(9, 3, subway_map, 1)   # search
+        # >>> cached_Astar(9, 3, subway_map, 1)   # served from the cache
+        # >>> cache.hits, cache.misses, cache.evictions
+        # (1, 1, 0)
+    Routes of searches without type_preference (depth_first_search, breadth_first_search) are not optimal
+    for any cost, so they are removed after any change of the map.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.routes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Routes removed because the map changed
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        # {id(map): weakref.finalize} of the maps with routes in the cache
+        self._maps = {}
+        # Ids of the maps that were garbage collected, their routes are removed at the next search
+        self._dead_maps = []
+
+    def __len__(self):
+        return len(self.routes)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'invalidations': self.invalidations, 'size': len(self.routes)}
+
+    def clear(self):
+        with self._lock:
+            self.routes.clear()
+
+    @staticmethod
+    def _map_collected(cache_reference, map_id):
+        # Called by the garbage collector, possibly while the lock is taken, so it only records the id
+        cache = cache_reference()
+        if cache is not None:
+            cache._dead_maps.append(map_id)
+
+    def _remove_dead_maps(self):
+        # Routes of the collected maps, before their id can be given to a new map (the lock is taken)
+        while self._dead_maps:
+            map_id = self._dead_maps.pop()
+            self._maps.pop(map_id, None)
+            for key in [key for key in self.routes if key[4] == map_id]:
+                del self.routes[key]
+
+    def search(self, search_function, origin_id, destination_id, map, type_preference=None, **kwargs):
+        """
+         Returns the route of search_function, searching only if it is not in the cache.
+         Format of the parameter is:
+            Args:
+                search_function (function): depth_first_search, breadth_first_search, uniform_cost_search or Astar
+                origin_id (int): Starting station id
+                destination_id (int): Final station id
+                map (object of Map class): All the map information
+                type_preference: INTEGER Value to indicate the preference selected (None for DFS and BFS)
+                kwargs: Other arguments of search_function. With stats or on_expand the search is always run
+                        and its route is not cached
+            Returns:
+                path (Path Class): The route that goes from origin_id to destination_id
+        """
+        if kwargs.get('stats') is not None or kwargs.get('on_expand') is not None:
+            if type_preference is None:
+                return search_function(origin_id, destination_id, map, **kwargs)
+            return search_function(origin_id, destination_id, map, type_preference, **kwargs)
+
+        # The id of the map is part of the key, so different maps with the same version do not collide
+        map_id = id(map)
+        version = getattr(map, 'version', 0)
+        key = (search_function, origin_id, destination_id, type_preference, map_id, tuple(sorted(kwargs.items())))
+        with self._lock:
+            self._remove_dead_maps()
+            entry = self.routes.get(key)
+            if entry is not None and entry[0] != version:
+                changes = None if type_preference is None else changes_since(map, entry[0])
+                if changes is not None and still_optimal(entry[1], changes):
+                    entry = self.routes[key] = (version, entry[1])
+                else:
+                    del self.routes[key]
+                    entry = None
+                    self.invalidations += 1
+            if entry is not None:
+                self.routes.move_to_end(key)
+                self.hits += 1
+                return copy_path(entry[1])
+            self.misses += 1
+
+        if type_preference is None:
+            path = search_function(origin_id, destination_id, map, **kwargs)
+        else:
+            path = search_function(origin_id, destination_id, map, type_preference, **kwargs)
+
+        with self._lock:
+            self._remove_dead_maps()
+            if map_id not in self._maps:
+                self._maps[map_id] = weakref.finalize(map, RouteCache._map_collected, weakref.ref(self), map_id)
+            self.routes[key] = (version, copy_path(path))
+            self.routes.move_to_end(key)
+            while len(self.routes) > self.max_size:
+                self.routes.popitem(last=False)
+                self.evictions += 1
+        return path
+
+    def wrap(self, search_function):
+        """
+         Version of search_function that uses this cache, with the same parameters.
+        """
+        @functools.wraps(search_function)
+        def cached_search(origin_id, destination_id, map, type_preference=None, **kwargs):
+            return self.search(search_function, origin_id, destination_id, map, type_preference, **kwargs)
+
+        return cached_search
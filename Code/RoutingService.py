@@ -0,0 +1,200 @@
+# This file contains a local routing service. The maps are loaded once and the queries are
+# received as JSON lines over a Unix socket or a localhost TCP port, so the callers do not
+# import the search code nor read the city files themselves.
+#
+# Request:  {"id": 1, "city": "Lyon", "algorithm": "Astar", "origin": 9, "destination": 3, "type_preference": 1}
+#           Astar_improved takes coordinates: "origin": [x, y], "destination": [x, y]
+# Response: {"id": 1, "route": [9, ..., 3], "cost": 35.5}    or    {"id": 1, "error": "..."}
+#
+# Requests received within batch_window seconds are grouped by (city, algorithm, preference,
+# origin) and every group is solved in a worker pool. A group of uniform_cost_search queries
+# is solved with a single shortest path tree of the origin (BatchRouting.route_matrix).
+# _________________________________________________________________________________________
+
+from SearchAlgorithm import Astar, uniform_cost_search, Astar_improved
+from BatchRouting import route_matrix
+from utils import load_city
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import math
+
+ALGORITHMS = {'Astar': Astar, 'uniform_cost_search': uniform_cost_search, 'Astar_improved': Astar_improved}
+
+
+def solve_batch(map, algorithm, origin, destinations, type_preference=0):
+    """
+     Routes from one origin to several destinations.
+     Format of the parameter is:
+        Args:
+            map (object of Map class): All the map information
+            algorithm (str): Astar, uniform_cost_search or Astar_improved
+            origin: Starting station id (coordinates for Astar_improved)
+            destinations (list): Final station ids (coordinates for Astar_improved)
+            type_preference: INTEGER Value to indicate the preference selected
+        Returns:
+            paths (list of Path Class): The route to every destination ([] if there is none)
+    """
+    if algorithm == 'uniform_cost_search' and len(destinations) > 1:
+        _, routes = route_matrix([origin], destinations, map, type_preference, return_routes=True)
+        return routes[0]
+    if algorithm == 'Astar_improved':
+        return [Astar_improved(origin, destination, map) for destination in destinations]
+    return [ALGORITHMS[algorithm](origin, destination, map, type_preference) for destination in destinations]
+
+
+def path_response(request_id, path):
+    if not path:
+        return {'id': request_id, 'route': [], 'cost': None}
+    cost = path.g if math.isfinite(path.g) else None
+    return {'id': request_id, 'route': list(path.route), 'cost': cost}
+
+
+class RoutingService:
+    """
+    asyncio server that answers routing queries on loaded maps.
+    Usage:
+        # >>> service = RoutingService({'Lyon': '../CityInformation/Lyon_bigCity/'})
+        # >>> asyncio.run(service.serve(port=8765))            # localhost TCP
+        # >>> asyncio.run(service.serve(path='/tmp/routes'))   # Unix socket
+
+    self.maps: {city name: Map}
+    self.batch_window: seconds a query waits for other queries of the same origin
+    self.max_pending: maximum number of queries being solved, a connection stops being read when it
+                      is reached (backpressure)
+    self.timeout: seconds after which a query is answered with a timeout error
+    """
+
+    def __init__(self, maps, batch_window=0.002, max_pending=1024, timeout=10.0, executor=None):
+        # Maps can be given loaded or as the folder of the city files
+        self.maps = {name: load_city(map) if isinstance(map, str) else map for name, map in maps.items()}
+        self.batch_window = batch_window
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.executor = executor or ThreadPoolExecutor()
+        self._pending = {}
+        self._flush_handle = None
+        self._slots = None
+        self._server = None
+
+    async def query(self, request):
+        """
+         Answer of one request (a dictionary as the JSON lines of the protocol).
+        """
+        request_id = request.get('id')
+        try:
+            map = self.maps[request.get('city', next(iter(self.maps)))]
+            algorithm = request.get('algorithm', 'Astar')
+            if algorithm not in ALGORITHMS:
+                raise ValueError("Unknown algorithm: {}".format(algorithm))
+            origin, destination = request['origin'], request['destination']
+            if algorithm == 'Astar_improved':
+                origin, destination = tuple(origin), tuple(destination)
+            elif origin not in map.stations or destination not in map.stations:
+                raise ValueError("Unknown station")
+            type_preference = int(request.get('type_preference', 0))
+        except (KeyError, ValueError, TypeError, StopIteration) as error:
+            return {'id': request_id, 'error': 'bad request: {}'.format(error)}
+
+        future = asyncio.get_running_loop().create_future()
+        key = (id(map), algorithm, type_preference, origin)
+        self._pending.setdefault(key, (map, []))[1].append((destination, future))
+        self._schedule_flush()
+        try:
+            path = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            return {'id': request_id, 'error': 'timeout'}
+        except Exception as error:
+            return {'id': request_id, 'error': str(error)}
+        return path_response(request_id, path)
+
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for (_, algorithm, type_preference, origin), (map, queries) in pending.items():
+            asyncio.ensure_future(self._solve(map, algorithm, type_preference, origin, queries))
+
+    async def _solve(self, map, algorithm, type_preference, origin, queries):
+        # Queries that already timed out are not solved
+        queries = [(destination, future) for destination, future in queries if not future.done()]
+        if not queries:
+            return
+        destinations = [destination for destination, _ in queries]
+        loop = asyncio.get_running_loop()
+        try:
+            paths = await loop.run_in_executor(self.executor, solve_batch, map, algorithm, origin, destinations,
+                                               type_preference)
+        except Exception as error:
+            for _, future in queries:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for (_, future), path in zip(queries, paths):
+            if not future.done():
+                future.set_result(path)
+
+    async def _answer(self, line, writer):
+        try:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("a request must be a JSON object")
+            except ValueError as error:
+                response = {'id': None, 'error': 'bad request: {}'.format(error)}
+            else:
+                response = await self.query(request)
+        finally:
+            self._slots.release()
+        writer.write((json.dumps(response) + '\n').encode())
+        await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        """
+         Reads JSON lines from a connection and writes one response line for each of them. The
+         responses may come in a different order than the requests, they are matched by id.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                # The connection is not read while the service is full
+                await self._slots.acquire()
+                task = asyncio.ensure_future(self._answer(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """
+         Starts listening on a Unix socket if path is given, or on a localhost TCP port otherwise.
+         Returns the asyncio server.
+        """
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self.handle_connection, path=path)
+        else:
+            self._server = await asyncio.start_server(self.handle_connection, host=host, port=port)
+        return self._server
+
+    async def serve(self, host='127.0.0.1', port=0, path=None):
+        server = await self.start(host, port, path)
+        async with server:
+            await server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.executor.shutdown(wait=False)
@@ -9,9 +9,13 @@ __author__ = '1718986'
 
 from SubwayMap import *
 from utils import *
+from SearchEngine import heap_search, bidirectional_search, coordinate_search, traversal_search
+from SpatialIndex import spatial_index, access_stations
+from Heuristics import heuristic_table
+from SearchStats import SearchStats
 import os
 import math
-import copy
+import time
 
 
 def expand(path, map):
@@ -27,9 +31,7 @@ def expand(path, map):
     path_list = []
     expanded_node = path.last
     for key in map.connections[expanded_node]:
-        temp_path = copy.deepcopy(path)
-        temp_path.add_route(key)
-        path_list.append(temp_path)
+        path_list.append(PathNode(path, key))
     
     return path_list
 
@@ -45,11 +47,7 @@ def remove_cycles(path_list):
     """
     new_path_list = []
     for path in path_list:
-        to_add = True
-        for i in range(len(path.route)-1):
-            if path.route[i] == path.last:
-                to_add = False
-        if to_add == True:
+        if not path.has_cycle():
             new_path_list.append(path)
     
     return new_path_list
@@ -69,17 +67,26 @@ def insert_depth_first_search(expand_paths, list_of_path):
     return list_of_path
 
 
-def depth_first_search(origin_id, destination_id, map):
+def depth_first_search(origin_id, destination_id, map, graph_search=True, stats=None, on_expand=None):
     """
      Depth First Search algorithm
      Format of the parameter is:
         Args:
             origin_id (int): Starting station id
             destination_id (int): Final station id
-            map (object of Map class): All the map information
+            map (object of Map class): All the map information (a CompiledMap is accepted with graph_search)
+            graph_search (bool): Visit every station once (SearchEngine.py), in O(stations + connections),
+                                 instead of keeping a list with every path without cycles
+            stats (SearchStats): Filled with the statistics of the search (see SearchStats.py)
+            on_expand (function): Called as on_expand(station_id, g) every time a station is expanded
         Returns:
             list_of_path[0] (Path Class): the route that goes from origin_id to destination_id
     """
+    if graph_search:
+        return traversal_search(origin_id, destination_id, map, True, stats, on_expand)
+    if stats is not None or on_expand is not None:
+        return instrumented_search(origin_id, destination_id, map, insert_depth_first_search, stats=stats,
+                                   on_expand=on_expand)
     path_list = [Path(origin_id)]
     while path_list and path_list[0].last != destination_id:
         curr_path = path_list[0]
@@ -107,17 +114,26 @@ def insert_breadth_first_search(expand_paths, list_of_path):
     return list_of_path
 
 
-def breadth_first_search(origin_id, destination_id, map):
+def breadth_first_search(origin_id, destination_id, map, graph_search=True, stats=None, on_expand=None):
     """
      Breadth First Search algorithm
      Format of the parameter is:
         Args:
             origin_id (int): Starting station id
             destination_id (int): Final station id
-            map (object of Map class): All the map information
+            map (object of Map class): All the map information (a CompiledMap is accepted with graph_search)
+            graph_search (bool): Visit every station once (SearchEngine.py), in O(stations + connections),
+                                 instead of keeping a list with every path without cycles
+            stats (SearchStats): Filled with the statistics of the search (see SearchStats.py)
+            on_expand (function): Called as on_expand(station_id, g) every time a station is expanded
         Returns:
             list_of_path[0] (Path Class): The route that goes from origin_id to destination_id
     """
+    if graph_search:
+        return traversal_search(origin_id, destination_id, map, False, stats, on_expand)
+    if stats is not None or on_expand is not None:
+        return instrumented_search(origin_id, destination_id, map, insert_breadth_first_search, stats=stats,
+                                   on_expand=on_expand)
     path_list = [Path(origin_id)]
     while path_list and path_list[0].last != destination_id:
         curr_path = path_list[0]
@@ -183,22 +199,36 @@ def insert_cost(expand_paths, list_of_path):
     return list_of_path
 
 
-def uniform_cost_search(origin_id, destination_id, map, type_preference=0):
+def uniform_cost_search(origin_id, destination_id, map, type_preference=0, graph_search=True, bidirectional=False,
+                        stats=None, on_expand=None):
     """
      Uniform Cost Search algorithm
      Format of the parameter is:
         Args:
             origin_id (int): Starting station id
             destination_id (int): Final station id
-            map (object of Map class): All the map information
+            map (object of Map class): All the map information (a CompiledMap is accepted with graph_search)
             type_preference: INTEGER Value to indicate the preference selected:
                             0 - Adjacency
                             1 - minimum Time
                             2 - minimum Distance
                             3 - minimum Transfers
+            graph_search (bool): Use the heap based engine of SearchEngine.py instead of the sorted list of paths
+            bidirectional (bool): Search at the same time from origin_id and (backwards) from destination_id
+            stats (SearchStats): Filled with the statistics of the search (see SearchStats.py)
+            on_expand (function): Called as on_expand(station_id, g) every time a station is expanded
         Returns:
             list_of_path[0] (Path Class): The route that goes from origin_id to destination_id
     """
+    if bidirectional:
+        return bidirectional_search(origin_id, destination_id, map, type_preference, use_heuristics=False,
+                                    stats=stats)
+    if graph_search:
+        return heap_search(origin_id, destination_id, map, type_preference, use_heuristics=False, stats=stats,
+                           on_expand=on_expand)
+    if stats is not None or on_expand is not None:
+        return instrumented_search(origin_id, destination_id, map, insert_cost, type_preference, stats=stats,
+                                   on_expand=on_expand)
     path_list = [Path(origin_id)]
     while path_list and path_list[0].last != destination_id:
         curr_path = path_list[0]
@@ -239,23 +269,11 @@ def calculate_heuristics(expand_paths, map, destination_id, type_preference=0):
             elif destination_id == path.last:
                 path.update_h(0)
         
-    elif type_preference == 1:
-        max_vel = 0
-        for vel in map.velocity:
-            if map.velocity[vel] > max_vel:
-                max_vel = map.velocity[vel]
-        for path in expand_paths:
-            elem1 = [map.stations[path.last]['x'],map.stations[path.last]['y']]
-            elem2 = [map.stations[destination_id]['x'],map.stations[destination_id]['y']]
-            dist = euclidean_dist(elem1,elem2)
-            path.update_h(dist/max_vel)
-        
-    elif type_preference == 2:
+    elif type_preference == 1 or type_preference == 2:
+        # Distances (divided by the fastest velocity for time) of every station are precomputed
+        table = heuristic_table(map, destination_id, type_preference)
         for path in expand_paths:
-            elem1 = [map.stations[path.last]['x'],map.stations[path.last]['y']]
-            elem2 = [map.stations[destination_id]['x'],map.stations[destination_id]['y']]
-            dist = euclidean_dist(elem1,elem2)
-            path.update_h(dist)
+            path.update_h(table[path.last])
     
     elif type_preference == 3:
         for path in expand_paths:
@@ -296,24 +314,18 @@ def remove_redundant_paths(expand_paths, list_of_path, visited_stations_cost):
              list_of_path (LIST of Path Class): list_of_path without redundant paths
              visited_stations_cost (dict): Updated visited stations cost
     """
-    t_expand_paths = copy.deepcopy(expand_paths)
+    new_paths = []
     for path in expand_paths:
         if path.last not in visited_stations_cost:
             visited_stations_cost[path.last] = path.g
+            new_paths.append(path)
         
-        else:
-            if visited_stations_cost[path.last] <= path.g:
-                for t_path in t_expand_paths:
-                    if t_path.route == path.route:
-                        t_expand_paths.remove(t_path)
-                        break
-            else:
-                visited_stations_cost[path.last] = path.g
-                for l_path in list_of_path:
-                    if path.last in l_path.route:
-                        list_of_path.remove(l_path)
-
-    expand_paths = t_expand_paths
+        elif visited_stations_cost[path.last] > path.g:
+            visited_stations_cost[path.last] = path.g
+            list_of_path[:] = [l_path for l_path in list_of_path if path.last not in l_path]
+            new_paths.append(path)
+
+    expand_paths = new_paths
     return expand_paths, list_of_path, visited_stations_cost
 
 def insert_cost_f(expand_paths, list_of_path):
@@ -357,22 +369,43 @@ def distance_to_stations(coord, map):
     return sorted_result
 
 
-def Astar(origin_id, destination_id, map, type_preference=0):
+def Astar(origin_id, destination_id, map, type_preference=0, graph_search=True, cost_tables=None,
+          bidirectional=False, landmarks=None, stats=None, on_expand=None):
     """
      A* Search algorithm
      Format of the parameter is:
         Args:
             origin_id (int): Starting station id
             destination_id (int): Final station id
-            map (object of Map class): All the map information
+            map (object of Map class): All the map information (a CompiledMap is accepted with graph_search)
             type_preference: INTEGER Value to indicate the preference selected:
                             0 - Adjacency
                             1 - minimum Time
                             2 - minimum Distance
                             3 - minimum Transfers
+            graph_search (bool): Use the heap based engine of SearchEngine.py instead of the sorted list of paths
+            cost_tables (CostTables): Precomputed tables of the map (see CostTables.py). If given, the route
+                                      is read from them without searching, as long as they were computed with
+                                      the map as it is now (otherwise, after a MapUpdate, it is searched)
+            bidirectional (bool): Search at the same time from origin_id and (backwards) from destination_id
+            landmarks (LandmarkTables): Landmark tables of the map (see Landmarks.py). If given, the graph
+                                        search uses the landmark (ALT) heuristic
+            stats (SearchStats): Filled with the statistics of the search (see SearchStats.py), not used with
+                                 cost_tables
+            on_expand (function): Called as on_expand(station_id, g) every time a station is expanded
         Returns:
             list_of_path[0] (Path Class): The route that goes from origin_id to destination_id
     """
+    if cost_tables is not None and cost_tables.matches(map):
+        return cost_tables.route(origin_id, destination_id, type_preference)
+    if bidirectional:
+        return bidirectional_search(origin_id, destination_id, map, type_preference, use_heuristics=True, stats=stats)
+    if graph_search:
+        return heap_search(origin_id, destination_id, map, type_preference, use_heuristics=True,
+                           landmarks=landmarks, stats=stats, on_expand=on_expand)
+    if stats is not None or on_expand is not None:
+        return instrumented_search(origin_id, destination_id, map, insert_cost_f, type_preference, True, stats,
+                                   on_expand)
     visited_stations = {}
     path_list = [Path(origin_id)]
     while path_list and path_list[0].last != destination_id:
@@ -391,43 +424,103 @@ def Astar(origin_id, destination_id, map, type_preference=0):
         return []
 
 
-def Astar_improved(origin_coord, destination_coord, map):
+def instrumented_search(origin_id, destination_id, map, insert, type_preference=None, use_heuristics=False,
+                        stats=None, on_expand=None):
+    """
+     The list based searches (depth_first_search, breadth_first_search, uniform_cost_search and Astar
+     without graph_search) collecting statistics and calling on_expand.
+     Format of the parameter is:
+        Args:
+            origin_id (int): Starting station id
+            destination_id (int): Final station id
+            map (object of Map class): All the map information
+            insert (function): Insertion of the search (insert_depth_first_search, insert_breadth_first_search,
+                               insert_cost or insert_cost_f)
+            type_preference: INTEGER Value to indicate the preference selected (None for DFS and BFS)
+            use_heuristics (bool): Remove redundant paths and compute the heuristics as Astar
+            stats (SearchStats): Filled with the statistics of the search
+            on_expand (function): Called as on_expand(station_id, g) every time a path is expanded
+        Returns:
+            list_of_path[0] (Path Class): The route that goes from origin_id to destination_id
+    """
+    stats = stats if stats is not None else SearchStats()
+    start = time.perf_counter()
+    visited_stations = {}
+    path_list = [Path(origin_id)]
+    stats.frontier(1)
+    while path_list and path_list[0].last != destination_id:
+        curr_path = path_list[0]
+        stats.expanded += 1
+        if on_expand is not None:
+            on_expand(curr_path.last, curr_path.g)
+        e = stats.timed('expand', expand, curr_path, map)
+        stats.generated += len(e)
+        generated = len(e)
+        e = stats.timed('expand', remove_cycles, e)
+        stats.pruned_cycles += generated - len(e)
+        if type_preference is not None:
+            e = stats.timed('cost', calculate_cost, e, map, type_preference)
+        if use_heuristics:
+            paths = len(e) + len(path_list)
+            e, path_list, visited_stations = stats.timed('cost', remove_redundant_paths, e, path_list,
+                                                         visited_stations)
+            stats.pruned_redundant += paths - len(e) - len(path_list)
+            e = stats.timed('heuristic', calculate_heuristics, e, map, destination_id, type_preference)
+            e = update_f(e)
+        path_list.pop(0)
+        path_list = stats.timed('insert', insert, e, path_list)
+        stats.frontier(len(path_list))
+    stats.total_time += time.perf_counter() - start
+    if path_list:
+        return path_list[0]
+    else:
+        return []
+
+
+def Astar_improved(origin_coord, destination_coord, map, use_spatial_index=True, stats=None, on_expand=None,
+                   bounded_access=False):
     """
      A* Search algorithm
      Format of the parameter is:
         Args:
             origin_coord (list): Two REAL values, which refer to the coordinates of the starting position
             destination_coord (list): Two REAL values, which refer to the coordinates of the final position
-            map (object of Map class): All the map information
+            map (object of Map class): All the map information, it is not modified so the same map
+                                       can be shared by several queries at the same time
+            use_spatial_index (bool): Find the stations closer than the walking distance between the positions
+                                      with the grid of SpatialIndex.py. Only those stations are connected to
+                                      the positions, a farther station can never be part of an optimal route.
+                                      If False, the distance to every station is computed with
+                                      distance_to_stations (same result).
+            stats (SearchStats): Filled with the statistics of the search (see SearchStats.py)
+            on_expand (function): Called as on_expand(station_id, g) every time a station is expanded
+                                  (0 is the origin position and -1 the destination position)
+            bounded_access (bool): Only connect the positions to the closest stations of every line and the
+                                   ones at walking distance (access_stations of SpatialIndex.py), so the number
+                                   of connected stations does not grow with the map. The route is not always
+                                   the optimal one
 
         Returns:
             list_of_path[0] (Path Class): The route that goes from origin_coord to destination_coord
     """
     user_velocity = 5
-    origin_to_stations = distance_to_stations(origin_coord,map)
-    destination_to_stations = distance_to_stations(destination_coord,map)
-    #for time
-    for key in origin_to_stations:
-        origin_to_stations[key] = origin_to_stations[key] / user_velocity
-    
-    for key in destination_to_stations:
-        destination_to_stations[key] = destination_to_stations[key] / user_velocity
-
-    #update map given the user coordinates
-    map.connections[0] = origin_to_stations
-    map.connections[-1] = destination_to_stations
-    map.connections[0][-1] = map.connections[-1][0] = euclidean_dist(origin_coord,destination_coord) / user_velocity
-    map.stations[0] = {'name':"init_pos",'line':0,'x':origin_coord[0],'y':origin_coord[1]}
-    map.stations[-1] = {'name':"dest_pos",'line':-1,'x':destination_coord[0],'y':destination_coord[1]}
-    map.velocity[-1] = user_velocity
-    for station_id in map.connections:
-        if station_id!= 0 and station_id!=-1:
-            map.connections[station_id][0] = origin_to_stations[station_id]
-            map.connections[station_id][-1] = destination_to_stations[station_id]
-    
-    #apply A* given the user coordinates
-    path_A = Astar(0,-1,map,1)
-
-    return path_A
-    
-
+    radius = euclidean_dist(origin_coord, destination_coord)
+    if bounded_access:
+        origin_to_stations = access_stations(map, origin_coord, radius)
+        destination_to_stations = access_stations(map, destination_coord, radius)
+    elif use_spatial_index:
+        index = spatial_index(map)
+        origin_to_stations = index.within(origin_coord, radius)
+        destination_to_stations = index.within(destination_coord, radius)
+    else:
+        origin_to_stations = {station_id: distance for station_id, distance in
+                              distance_to_stations(origin_coord, map).items() if distance <= radius}
+        destination_to_stations = {station_id: distance for station_id, distance in
+                                   distance_to_stations(destination_coord, map).items() if distance <= radius}
+    origin_access = {station_id: distance / user_velocity for station_id, distance in origin_to_stations.items()}
+    destination_access = {station_id: distance / user_velocity
+                          for station_id, distance in destination_to_stations.items()}
+
+    #apply A* given the user coordinates, walking connections are only added for this query
+    return coordinate_search(origin_coord, destination_coord, map, origin_access, destination_access, user_velocity,
+                             stats, on_expand)
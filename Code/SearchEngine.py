@@ -0,0 +1,649 @@
+# This file contains a binary-heap search engine for the cost based searches (UCS and A*).
+# Instead of keeping whole Path objects in a sorted list, the frontier is a heap of stations,
+# the best known cost of each station is kept in a table and the route is rebuilt at the end
+# by following parent pointers.
+# _________________________________________________________________________________________
+
+from SubwayMap import Path
+from CompiledMap import CompiledMap
+from Heuristics import heuristic_table
+from SearchStats import SearchStats
+from MapUpdates import changes_since
+from utils import euclidean_dist
+from collections import deque
+import heapq
+import itertools
+import math
+import time
+import weakref
+
+_reverse_connections = weakref.WeakKeyDictionary()
+
+
+def edge_cost(map, station_id, next_id, type_preference=0):
+    """
+     Cost of going from station_id to next_id according to type preference.
+     It is the same cost model used by calculate_cost in SearchAlgorithm.py.
+     Format of the parameter is:
+        Args:
+            map (object of Map class): All the map information
+            station_id (int): Station we are leaving
+            next_id (int): Station we are arriving to
+            type_preference: INTEGER Value to indicate the preference selected:
+                            0 - Adjacency
+                            1 - minimum Time
+                            2 - minimum Distance
+                            3 - minimum Transfers
+        Returns:
+            cost (float): Cost of the connection
+    """
+    time = map.connections[station_id][next_id]
+    if type_preference == 0:
+        return 1 if time > 0 else 0
+    elif type_preference == 1:
+        return time
+    elif type_preference == 2:
+        line = map.stations[next_id]["line"]
+        if line == map.stations[station_id]["line"]:
+            return time * map.velocity[line]
+        return 0
+    elif type_preference == 3:
+        return 1 if map.stations[next_id]["line"] != map.stations[station_id]["line"] else 0
+    return 0
+
+
+def build_path(parents, destination, g, h=0, station_ids=None):
+    """
+     Rebuilds the Path that reaches destination following the parent pointers.
+     Format of the parameter is:
+        Args:
+            parents (dict): {node: previous node} (None for the origin)
+            destination (int): Last node of the path
+            g (float): Real cost of the path
+            h (float): Heuristic value of the last node
+            station_ids (list): Station id of every node when the nodes are CompiledMap indexes
+        Returns:
+            path (Path Class): The rebuilt path
+    """
+    route = []
+    node = destination
+    while node is not None:
+        route.append(node if station_ids is None else station_ids[node])
+        node = parents[node]
+    route.reverse()
+    path = Path(route)
+    path.g = g
+    path.h = h
+    return path
+
+
+def map_neighbours(map, type_preference=0):
+    """
+     Builds the neighbour function of the engine for a Map or a CompiledMap.
+     For a Map the nodes are station ids, for a CompiledMap they are station indexes.
+     Format of the parameter is:
+        Args:
+            map (object of Map or CompiledMap class): All the map information
+            type_preference: INTEGER Value to indicate the preference selected
+        Returns:
+            neighbours (function): Function node -> iterable of (next node, cost)
+    """
+    if isinstance(map, CompiledMap):
+        offsets, neighbours, costs = map.csr_lists(type_preference)
+        return lambda node: zip(neighbours[offsets[node]:offsets[node + 1]], costs[offsets[node]:offsets[node + 1]])
+    return lambda station_id: ((next_id, edge_cost(map, station_id, next_id, type_preference))
+                               for next_id in map.connections[station_id])
+
+
+def reverse_connections(map):
+    """
+     {station_id: list of stations with a connection towards station_id} of a Map. It is built
+     once, and for the next versions of the map it is modified with the changes of its journal.
+    """
+    cached = _reverse_connections.get(map)
+    if cached is None or cached[0] != map.version:
+        changes = None if cached is None else changes_since(map, cached[0])
+        if changes is None:
+            reverse = {station_id: [] for station_id in map.connections}
+            for station_id, connections in map.connections.items():
+                for next_id in connections:
+                    reverse.setdefault(next_id, []).append(station_id)
+        else:
+            # Only the lists of the stations with added or removed connections are copied and modified
+            reverse = dict(cached[1])
+            for change in changes:
+                if change[0] == 'connection' and (change[3] is None) != (change[4] is None):
+                    _, station_id, next_id, old_time, _ = change
+                    if old_time is None:
+                        reverse[next_id] = reverse.get(next_id, []) + [station_id]
+                    else:
+                        reverse[next_id] = [other_id for other_id in reverse[next_id] if other_id != station_id]
+        cached = (map.version, reverse)
+        _reverse_connections[map] = cached
+    return cached[1]
+
+
+def reverse_map_neighbours(map, type_preference=0):
+    """
+     Same as map_neighbours for the reversed connections: for a node it gives the nodes with a
+     connection towards it, and the cost of that connection.
+    """
+    if isinstance(map, CompiledMap):
+        offsets, neighbours, costs = map.reverse_csr_lists(type_preference)
+        return lambda node: zip(neighbours[offsets[node]:offsets[node + 1]], costs[offsets[node]:offsets[node + 1]])
+    reverse = reverse_connections(map)
+    return lambda station_id: ((previous_id, edge_cost(map, previous_id, station_id, type_preference))
+                               for previous_id in reverse.get(station_id, ()))
+
+
+def best_first_search(origin, destination, neighbours, heuristic=None, stats=None, on_expand=None):
+    """
+     Best first search with a binary heap frontier, a best-g table and parent pointers.
+     With a heuristic it behaves as A*, otherwise as Uniform Cost Search.
+     A node is closed once it is expanded and it is only opened again if a cheaper way
+     to reach it is found, so the result is optimal for any admissible heuristic.
+     Format of the parameter is:
+        Args:
+            origin (int): Starting node
+            destination (int): Final node
+            neighbours (function): Function node -> iterable of (next node, cost)
+            heuristic (function): Function node -> estimated cost to destination (None for UCS)
+            stats (SearchStats): Filled with the statistics of the search
+            on_expand (function): Called as on_expand(node, g) every time a node is expanded
+        Returns:
+            g (float): Cost of the best path to destination (None if it can not be reached)
+            parents (dict): {node: previous node} (None for the origin)
+    """
+    if stats is not None or on_expand is not None:
+        return instrumented_best_first_search(origin, destination, neighbours, heuristic, stats, on_expand)
+    # Ties are broken in insertion order, like the stable sort of the list based versions
+    order = itertools.count()
+
+    best_g = {origin: 0}
+    parents = {origin: None}
+    closed = set()
+    h = heuristic(origin) if heuristic else 0
+    frontier = [(h, next(order), 0, origin)]
+    while frontier:
+        _, _, g, node = heapq.heappop(frontier)
+        if node in closed or g > best_g[node]:
+            continue
+        if node == destination:
+            return g, parents
+        closed.add(node)
+        for next_node, cost in neighbours(node):
+            new_g = g + cost
+            if new_g < best_g.get(next_node, math.inf):
+                best_g[next_node] = new_g
+                parents[next_node] = node
+                closed.discard(next_node)
+                key = new_g + heuristic(next_node) if heuristic else new_g
+                heapq.heappush(frontier, (key, next(order), new_g, next_node))
+    return None, parents
+
+
+def instrumented_best_first_search(origin, destination, neighbours, heuristic=None, stats=None, on_expand=None):
+    """
+     Same search as best_first_search, collecting statistics and calling on_expand.
+    """
+    stats = stats if stats is not None else SearchStats()
+    start = time.perf_counter()
+    order = itertools.count()
+
+    best_g = {origin: 0}
+    parents = {origin: None}
+    closed = set()
+    h = heuristic(origin) if heuristic else 0
+    frontier = [(h, next(order), 0, origin)]
+    stats.frontier(1)
+    try:
+        while frontier:
+            _, _, g, node = heapq.heappop(frontier)
+            if node in closed or g > best_g[node]:
+                stats.pruned_redundant += 1
+                continue
+            stats.expanded += 1
+            if on_expand is not None:
+                on_expand(node, g)
+            if node == destination:
+                return g, parents
+            closed.add(node)
+            edges = stats.timed('expand', list, neighbours(node))
+            stats.generated += len(edges)
+            for next_node, cost in edges:
+                new_g = g + cost
+                if new_g < best_g.get(next_node, math.inf):
+                    best_g[next_node] = new_g
+                    parents[next_node] = node
+                    closed.discard(next_node)
+                    key = new_g + stats.timed('heuristic', heuristic, next_node) if heuristic else new_g
+                    stats.timed('insert', heapq.heappush, frontier, (key, next(order), new_g, next_node))
+                else:
+                    stats.pruned_redundant += 1
+            stats.frontier(len(frontier))
+        return None, parents
+    finally:
+        stats.total_time += time.perf_counter() - start
+
+
+def heap_search(origin_id, destination_id, map, type_preference=0, use_heuristics=True, landmarks=None, stats=None,
+                on_expand=None):
+    """
+     A* (or Uniform Cost Search without heuristics) over a Map or a CompiledMap using
+     best_first_search.
+     Format of the parameter is:
+        Args:
+            origin_id (int): Starting station id
+            destination_id (int): Final station id
+            map (object of Map or CompiledMap class): All the map information
+            type_preference: INTEGER Value to indicate the preference selected:
+                            0 - Adjacency
+                            1 - minimum Time
+                            2 - minimum Distance
+                            3 - minimum Transfers
+            use_heuristics (bool): Order the frontier by f = g + h instead of g
+            landmarks (LandmarkTables): Use the landmark (ALT) heuristic of Landmarks.py
+            stats (SearchStats): Filled with the statistics of the search
+            on_expand (function): Called as on_expand(station_id, g) every time a station is expanded
+        Returns:
+            path (Path Class): The route that goes from origin_id to destination_id ([] if there is none)
+    """
+    if isinstance(map, CompiledMap):
+        if on_expand is not None:
+            station_ids = map.station_ids.tolist()
+            on_station_expand = on_expand
+            on_expand = lambda node, g: on_station_expand(station_ids[node], g)
+        origin, destination = map.index[origin_id], map.index[destination_id]
+    else:
+        origin, destination = origin_id, destination_id
+    heuristic = None
+    if use_heuristics:
+        table = (landmarks.heuristic_table(map, destination_id, type_preference) if landmarks is not None
+                 else heuristic_table(map, destination_id, type_preference))
+        heuristic = table.__getitem__
+
+    g, parents = best_first_search(origin, destination, map_neighbours(map, type_preference), heuristic, stats,
+                                   on_expand)
+    if g is None:
+        return []
+    station_ids = map.station_ids.tolist() if isinstance(map, CompiledMap) else None
+    path = build_path(parents, destination, g, heuristic(destination) if heuristic else 0, station_ids)
+    if heuristic:
+        path.update_f()
+    return path
+
+
+def walking_neighbours(map, origin_access, destination_access, direct_time):
+    """
+     Neighbour function (with time costs) of the map plus two virtual nodes: 0 for the origin
+     position and -1 for the destination position. The walking connections only live inside
+     the returned function, so the map is never modified.
+     Format of the parameter is:
+        Args:
+            map (object of Map class): All the map information
+            origin_access (dict): {station_id: walking time from the origin position}
+            destination_access (dict): {station_id: walking time to the destination position}
+            direct_time (float): Walking time from the origin position to the destination position
+        Returns:
+            neighbours (function): Function node -> list of (next node, time)
+    """
+    def neighbours(node):
+        if node == 0:
+            return list(origin_access.items()) + [(-1, direct_time)]
+        if node == -1:
+            return list(destination_access.items()) + [(0, direct_time)]
+        edges = list(map.connections[node].items())
+        if node in origin_access:
+            edges.append((0, origin_access[node]))
+        if node in destination_access:
+            edges.append((-1, destination_access[node]))
+        return edges
+
+    return neighbours
+
+
+def coordinate_search(origin_coord, destination_coord, map, origin_access, destination_access, user_velocity=5,
+                      stats=None, on_expand=None):
+    """
+     Minimum time A* between two positions of the city. The user walks from origin_coord to the
+     stations of origin_access, and from the stations of destination_access to destination_coord.
+     The origin is node 0 and the destination node -1 of the returned route.
+     Format of the parameter is:
+        Args:
+            origin_coord (list): Two REAL values, which refer to the coordinates of the starting position
+            destination_coord (list): Two REAL values, which refer to the coordinates of the final position
+            map (object of Map class): All the map information
+            origin_access (dict): {station_id: walking time from the origin position}
+            destination_access (dict): {station_id: walking time to the destination position}
+            user_velocity (float): Walking velocity of the user
+            stats (SearchStats): Filled with the statistics of the search
+            on_expand (function): Called as on_expand(node, g) every time a node is expanded
+        Returns:
+            path (Path Class): The route that goes from origin_coord to destination_coord
+    """
+    direct_time = euclidean_dist(origin_coord, destination_coord) / user_velocity
+    max_vel = max(max(map.velocity.values()), user_velocity)
+
+    def heuristic(node):
+        if node == -1:
+            return 0
+        coord = origin_coord if node == 0 else [map.stations[node]['x'], map.stations[node]['y']]
+        return euclidean_dist(coord, destination_coord) / max_vel
+
+    neighbours = walking_neighbours(map, origin_access, destination_access, direct_time)
+    g, parents = best_first_search(0, -1, neighbours, heuristic, stats, on_expand)
+    if g is None:
+        return []
+    path = build_path(parents, -1, g)
+    path.update_f()
+    return path
+
+
+def breadth_first_graph_search(origin, destination, neighbours, stats=None, on_expand=None):
+    """
+     Breadth first search in O(V+E): a deque frontier of nodes, a visited set and parent pointers.
+     A node is visited when it is generated, so its parent is the first node that reaches it, which
+     gives the same route as the path based breadth_first_search of SearchAlgorithm.py.
+     Format of the parameter is:
+        Args:
+            origin (int): Starting node
+            destination (int): Final node
+            neighbours (function): Function node -> iterable of (next node, cost), the costs are not used
+            stats (SearchStats): Filled with the statistics of the search
+            on_expand (function): Called as on_expand(node, g) every time a node is expanded
+        Returns:
+            found (bool): True if destination can be reached
+            parents (dict): {node: previous node} (None for the origin)
+    """
+    if stats is not None or on_expand is not None:
+        return instrumented_traversal(origin, destination, neighbours, False, stats, on_expand)
+    parents = {origin: None}
+    if origin == destination:
+        return True, parents
+    frontier = deque([origin])
+    while frontier:
+        node = frontier.popleft()
+        for next_node, _ in neighbours(node):
+            if next_node not in parents:
+                parents[next_node] = node
+                if next_node == destination:
+                    return True, parents
+                frontier.append(next_node)
+    return False, parents
+
+
+def depth_first_graph_search(origin, destination, neighbours, stats=None, on_expand=None):
+    """
+     Depth first search in O(V+E): a stack of (node, parent), a visited set and parent pointers.
+     A node is visited when it is taken from the stack and its neighbours are pushed in reverse
+     order, so they are explored in the same order as the path based depth_first_search of
+     SearchAlgorithm.py.
+     Format of the parameter is:
+        Args:
+            origin (int): Starting node
+            destination (int): Final node
+            neighbours (function): Function node -> iterable of (next node, cost), the costs are not used
+            stats (SearchStats): Filled with the statistics of the search
+            on_expand (function): Called as on_expand(node, g) every time a node is expanded
+        Returns:
+            found (bool): True if destination can be reached
+            parents (dict): {node: previous node} (None for the origin)
+    """
+    if stats is not None or on_expand is not None:
+        return instrumented_traversal(origin, destination, neighbours, True, stats, on_expand)
+    parents = {}
+    frontier = [(origin, None)]
+    while frontier:
+        node, parent = frontier.pop()
+        if node in parents:
+            continue
+        parents[node] = parent
+        if node == destination:
+            return True, parents
+        frontier.extend(next_item for next_item in reversed([(next_node, node) for next_node, _ in neighbours(node)])
+                        if next_item[0] not in parents)
+    return False, parents
+
+
+def instrumented_traversal(origin, destination, neighbours, depth_first=False, stats=None, on_expand=None):
+    """
+     Same searches as breadth_first_graph_search and depth_first_graph_search, collecting
+     statistics and calling on_expand (g is the number of connections from origin).
+    """
+    stats = stats if stats is not None else SearchStats()
+    start = time.perf_counter()
+    depth = {origin: 0}
+    parents = {} if depth_first else {origin: None}
+    frontier = deque([(origin, None)])
+    stats.frontier(1)
+    try:
+        if not depth_first and origin == destination:
+            return True, parents
+        while frontier:
+            node, parent = frontier.pop() if depth_first else frontier.popleft()
+            if depth_first:
+                if node in parents:
+                    stats.pruned_redundant += 1
+                    continue
+                parents[node] = parent
+                depth[node] = 0 if parent is None else depth[parent] + 1
+            stats.expanded += 1
+            if on_expand is not None:
+                on_expand(node, depth[node])
+            if depth_first and node == destination:
+                return True, parents
+            edges = stats.timed('expand', list, neighbours(node))
+            stats.generated += len(edges)
+            if depth_first:
+                edges.reverse()
+            for next_node, _ in edges:
+                if next_node in parents:
+                    stats.pruned_redundant += 1
+                    continue
+                if not depth_first:
+                    parents[next_node] = node
+                    depth[next_node] = depth[node] + 1
+                    if next_node == destination:
+                        return True, parents
+                stats.timed('insert', frontier.append, (next_node, node))
+            stats.frontier(len(frontier))
+        return False, parents
+    finally:
+        stats.total_time += time.perf_counter() - start
+
+
+def traversal_search(origin_id, destination_id, map, depth_first=False, stats=None, on_expand=None):
+    """
+     Breadth (or depth) first graph search over a Map or a CompiledMap.
+     Format of the parameter is:
+        Args:
+            origin_id (int): Starting station id
+            destination_id (int): Final station id
+            map (object of Map or CompiledMap class): All the map information
+            depth_first (bool): Depth first search instead of breadth first search
+            stats (SearchStats): Filled with the statistics of the search
+            on_expand (function): Called as on_expand(station_id, g) every time a station is expanded
+        Returns:
+            path (Path Class): The route that goes from origin_id to destination_id ([] if there is none)
+    """
+    station_ids = None
+    if isinstance(map, CompiledMap):
+        origin, destination = map.index[origin_id], map.index[destination_id]
+        station_ids = map.station_ids.tolist()
+        if on_expand is not None:
+            on_station_expand = on_expand
+            on_expand = lambda node, g: on_station_expand(station_ids[node], g)
+    else:
+        origin, destination = origin_id, destination_id
+    search = depth_first_graph_search if depth_first else breadth_first_graph_search
+    found, parents = search(origin, destination, map_neighbours(map, 0), stats, on_expand)
+    if not found:
+        return []
+    return build_path(parents, destination, 0, station_ids=station_ids)
+
+
+def shortest_path_tree(origin, neighbours, targets=None):
+    """
+     Dijkstra from origin to every reachable node (Uniform Cost Search without destination).
+     If targets is given, the search stops as soon as all of them are closed.
+     Format of the parameter is:
+        Args:
+            origin (int): Starting node
+            neighbours (function): Function node -> iterable of (next node, cost)
+            targets (iterable): Nodes whose optimal cost is needed (None for every node)
+        Returns:
+            best_g (dict): {node: cost of the best path from origin}. When the search stops early,
+                           only the costs of the targets are guaranteed to be optimal
+            parents (dict): {node: previous node in the best path} (None for the origin)
+    """
+    remaining = set(targets) if targets is not None else None
+    best_g = {origin: 0}
+    parents = {origin: None}
+    closed = set()
+    frontier = [(0, origin)]
+    while frontier:
+        g, node = heapq.heappop(frontier)
+        if node in closed:
+            continue
+        closed.add(node)
+        if remaining is not None:
+            remaining.discard(node)
+            if not remaining:
+                break
+        for next_node, cost in neighbours(node):
+            new_g = g + cost
+            if new_g < best_g.get(next_node, math.inf):
+                best_g[next_node] = new_g
+                parents[next_node] = node
+                heapq.heappush(frontier, (new_g, next_node))
+    return best_g, parents
+
+
+def bidirectional_best_first_search(origin, destination, neighbours, reverse_neighbours,
+                                    heuristic=None, reverse_heuristic=None, stats=None):
+    """
+     Bidirectional version of best_first_search: a forward search from origin and a backward search
+     from destination over the reversed connections, expanding each time the side with the smaller
+     frontier. mu is the cost of the best route found through a node reached by both searches.
+     With heuristics both searches use the average potential p(node) = (heuristic - reverse_heuristic) / 2,
+     the forward frontier is ordered by g + p and the backward frontier by g - p. With consistent
+     heuristics the connections keep a cost >= 0 with the potentials on both sides, so the search stops,
+     as without heuristics, when the sum of the lowest keys of both frontiers reaches mu.
+     Format of the parameter is:
+        Args:
+            origin (int): Starting node
+            destination (int): Final node
+            neighbours (function): Function node -> iterable of (next node, cost)
+            reverse_neighbours (function): Function node -> iterable of (previous node, cost)
+            heuristic (function): Estimated cost from a node to destination (None for UCS)
+            reverse_heuristic (function): Estimated cost from origin to a node (None for UCS)
+            stats (SearchStats): Filled with the statistics of the search (both sides added up)
+        Returns:
+            g (float): Cost of the best path to destination (None if it can not be reached)
+            parents (dict): {node: previous node} of the forward search (None for the origin)
+            children (dict): {node: next node} of the backward search (None for the destination)
+            meeting (int): Node where both searches meet
+    """
+    stats = stats if stats is not None else SearchStats()
+    start_time = time.perf_counter()
+    if heuristic:
+        def potential(node):
+            # None for a node that can not be part of a route (an infinite estimate in one direction)
+            h, reverse_h = heuristic(node), reverse_heuristic(node)
+            if math.isinf(h) or math.isinf(reverse_h):
+                return None
+            return (h - reverse_h) / 2
+    else:
+        potential = lambda node: 0
+
+    sides = []
+    for start, expand_side, sign in ((origin, neighbours, 1), (destination, reverse_neighbours, -1)):
+        p = potential(start)
+        sides.append({'best_g': {start: 0}, 'parents': {start: None}, 'closed': set(), 'neighbours': expand_side,
+                      'sign': sign, 'frontier': [(sign * p, 0, start)] if p is not None else []})
+    forward, backward = sides
+
+    mu = 0 if origin == destination else math.inf
+    meeting = origin if origin == destination else None
+    try:
+        while forward['frontier'] and backward['frontier']:
+            if forward['frontier'][0][0] + backward['frontier'][0][0] >= mu:
+                break
+
+            side, other = (forward, backward) if len(forward['frontier']) <= len(backward['frontier']) else \
+                (backward, forward)
+            _, g, node = heapq.heappop(side['frontier'])
+            if node in side['closed'] or g > side['best_g'][node]:
+                stats.pruned_redundant += 1
+                continue
+            stats.expanded += 1
+            side['closed'].add(node)
+            for next_node, cost in side['neighbours'](node):
+                stats.generated += 1
+                new_g = g + cost
+                if new_g < side['best_g'].get(next_node, math.inf):
+                    p = potential(next_node)
+                    if p is None:
+                        continue
+                    side['best_g'][next_node] = new_g
+                    side['parents'][next_node] = node
+                    side['closed'].discard(next_node)
+                    heapq.heappush(side['frontier'], (new_g + side['sign'] * p, new_g, next_node))
+                    if next_node in other['best_g'] and new_g + other['best_g'][next_node] < mu:
+                        mu = new_g + other['best_g'][next_node]
+                        meeting = next_node
+                else:
+                    stats.pruned_redundant += 1
+            stats.frontier(len(forward['frontier']) + len(backward['frontier']))
+    finally:
+        stats.total_time += time.perf_counter() - start_time
+
+    if meeting is None:
+        return None, forward['parents'], backward['parents'], None
+    return mu, forward['parents'], backward['parents'], meeting
+
+
+def bidirectional_search(origin_id, destination_id, map, type_preference=0, use_heuristics=True, stats=None):
+    """
+     Bidirectional A* (or Uniform Cost Search without heuristics) over a Map or a CompiledMap.
+     Format of the parameter is:
+        Args:
+            origin_id (int): Starting station id
+            destination_id (int): Final station id
+            map (object of Map or CompiledMap class): All the map information
+            type_preference: INTEGER Value to indicate the preference selected:
+                            0 - Adjacency
+                            1 - minimum Time
+                            2 - minimum Distance
+                            3 - minimum Transfers
+            use_heuristics (bool): Order the frontiers with the potentials of the heuristics towards
+                                   destination_id and from origin_id instead of g
+            stats (SearchStats): Filled with the statistics of the search
+        Returns:
+            path (Path Class): The route that goes from origin_id to destination_id ([] if there is none)
+    """
+    if isinstance(map, CompiledMap):
+        origin, destination = map.index[origin_id], map.index[destination_id]
+        station_ids = map.station_ids.tolist()
+    else:
+        origin, destination = origin_id, destination_id
+        station_ids = None
+    heuristic = reverse_heuristic = None
+    if use_heuristics:
+        heuristic = heuristic_table(map, destination_id, type_preference).__getitem__
+        reverse_heuristic = heuristic_table(map, origin_id, type_preference, reverse=True).__getitem__
+
+    g, parents, children, meeting = bidirectional_best_first_search(
+        origin, destination, map_neighbours(map, type_preference), reverse_map_neighbours(map, type_preference),
+        heuristic, reverse_heuristic, stats)
+    if g is None:
+        return []
+    # Forward part up to the meeting node, then the backward part from it to the destination
+    path = build_path(parents, meeting, g, station_ids=station_ids)
+    node = children[meeting]
+    while node is not None:
+        path.add_route(node if station_ids is None else station_ids[node])
+        node = children[node]
+    if use_heuristics:
+        path.update_f()
+    return path
@@ -0,0 +1,60 @@
+# This file contains the optional statistics of a search. The search functions of
+# SearchAlgorithm.py take a stats object (and/or an on_expand callback) and only when one of
+# them is given they run an instrumented version of their loop, so a search without them
+# costs the same as before.
+# _________________________________________________________________________________________
+
+import time
+
+PHASES = ('expand', 'cost', 'heuristic', 'insert')
+
+
+class SearchStats:
+    """
+    Statistics of the searches it is given to (they are added up if it is given to several).
+    Usage:
+        # >>> stats = SearchStats()
+        # >>> Astar(9, 3, subway_map, 1, stats=stats)
+        # >>> stats.expanded, stats.generated, stats.peak_frontier, stats.phase_time['heuristic']
+
+    self.expanded: number of paths (or stations) taken from the frontier and expanded
+    self.generated: number of paths (or stations) generated by the expansions
+    self.pruned_cycles: generated paths removed by remove_cycles
+    self.pruned_redundant: paths removed by remove_redundant_paths, or for the heap based engine,
+                           generated stations that did not improve their best cost and stale
+                           frontier entries
+    self.peak_frontier: maximum size of the frontier
+    self.forgotten: paths dropped by the memory bounded searches to stay within their budget
+    self.phase_time: {phase: seconds} for expand, cost, heuristic and insert. In the heap based engine
+                     the cost of a connection is computed while expanding, so it is part of expand
+    self.total_time: seconds of the whole searches
+    """
+
+    def __init__(self):
+        self.expanded = 0
+        self.generated = 0
+        self.pruned_cycles = 0
+        self.pruned_redundant = 0
+        self.peak_frontier = 0
+        self.forgotten = 0
+        self.phase_time = dict.fromkeys(PHASES, 0.0)
+        self.total_time = 0.0
+
+    def timed(self, phase, function, *args):
+        # Calls function(*args) adding its time to phase
+        start = time.perf_counter()
+        result = function(*args)
+        self.phase_time[phase] += time.perf_counter() - start
+        return result
+
+    def frontier(self, size):
+        if size > self.peak_frontier:
+            self.peak_frontier = size
+
+    def as_dict(self):
+        return {'expanded': self.expanded, 'generated': self.generated, 'pruned_cycles': self.pruned_cycles,
+                'pruned_redundant': self.pruned_redundant, 'peak_frontier': self.peak_frontier,
+                'forgotten': self.forgotten, 'phase_time': dict(self.phase_time), 'total_time': self.total_time}
+
+    def __repr__(self):
+        return 'SearchStats({})'.format(self.as_dict())
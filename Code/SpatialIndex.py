@@ -0,0 +1,168 @@
+# This file contains a uniform grid over the station coordinates to find the stations close
+# to a point without computing the distance to every station of the map.
+# access_stations is the optional bounded set of stations a position is connected to when
+# routing between coordinates (Astar_improved with bounded_access=True): the closest stations of
+# every line and the ones at walking distance, so the cost of a query does not grow with the size
+# of the map, at the price of missing some optimal routes.
+# MapUpdates do not move stations nor change their lines, so the indexes of a map are kept after them
+# and only built again after add_station (or a gap in the journal).
+# _________________________________________________________________________________________
+
+from MapUpdates import changes_since
+from utils import euclidean_dist
+import math
+import weakref
+
+
+class GridIndex:
+    """
+    Uniform grid of square cells over a set of points.
+    Usage:
+        # >>> index = GridIndex({1: (67, 79), 2: (140, 56)})
+        # >>> index.nearest([100, 100], 1)
+        # [(1, 39.11521443121589)]
+        # >>> index.within([100, 100], 50)
+        # {1: 39.11521443121589}
+    """
+
+    def __init__(self, points, cell_size=None):
+        self.points = dict(points)
+        xs = [p[0] for p in self.points.values()] or [0]
+        ys = [p[1] for p in self.points.values()] or [0]
+        self.min_x, self.max_x, self.min_y, self.max_y = min(xs), max(xs), min(ys), max(ys)
+        if cell_size is None:
+            # About one point per cell on average
+            side = max(self.max_x - self.min_x, self.max_y - self.min_y, 1)
+            cell_size = side / max(math.sqrt(len(self.points)), 1)
+        self.cell_size = cell_size
+
+        self.cells = {}
+        for point_id, (x, y) in self.points.items():
+            self.cells.setdefault(self._cell(x, y), []).append((point_id, x, y))
+
+    def _cell(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def within(self, coord, radius):
+        """
+         Points at a distance lower or equal than radius from coord.
+         Format of the parameter is:
+            Args:
+                coord (list): Two REAL values, which refer to the coordinates of a point in the city
+                radius (float): Maximum distance
+            Returns:
+                (dict): {point_id: distance} sorted by distance (and id), like distance_to_stations
+        """
+        x, y = coord
+        min_cx, min_cy = self._cell(max(x - radius, self.min_x), max(y - radius, self.min_y))
+        max_cx, max_cy = self._cell(min(x + radius, self.max_x), min(y + radius, self.max_y))
+        result = []
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                for point_id, px, py in self.cells.get((cx, cy), ()):
+                    distance = euclidean_dist(coord, [px, py])
+                    if distance <= radius:
+                        result.append((point_id, distance))
+        return dict(sorted(result, key=lambda x: (x[1], x[0])))
+
+    def nearest(self, coord, k=1):
+        """
+         The k points closest to coord.
+         Format of the parameter is:
+            Args:
+                coord (list): Two REAL values, which refer to the coordinates of a point in the city
+                k (int): Number of points
+            Returns:
+                (list): k tuples (point_id, distance) sorted by distance (and id)
+        """
+        x, y = coord
+        # Distance from coord to the farthest corner of the grid: with it every point is found
+        max_radius = math.hypot(max(abs(x - self.min_x), abs(x - self.max_x)),
+                                max(abs(y - self.min_y), abs(y - self.max_y)))
+        radius = self.cell_size
+        while True:
+            result = self.within(coord, min(radius, max_radius))
+            if len(result) >= k or radius >= max_radius:
+                return list(result.items())[:k]
+            radius *= 2
+
+
+# Stations of every line a position is connected to, and distance that is always walked
+ACCESS_PER_LINE = 2
+WALKING_DISTANCE = 60
+
+_indexes = weakref.WeakKeyDictionary()
+_line_indexes = weakref.WeakKeyDictionary()
+
+
+def _cached(cache, map):
+    # Index of the cache that is still valid for map (with its version updated), None if it must be built
+    cached = cache.get(map)
+    if cached is None or cached[0] == map.version:
+        return cached
+    if changes_since(map, cached[0]) is None:
+        return None
+    cached = (map.version, cached[1])
+    cache[map] = cached
+    return cached
+
+
+def spatial_index(map):
+    """
+     GridIndex over the stations of a map. It is built once and reused while the stations of the map
+     do not change.
+     Format of the parameter is:
+        Args:
+            map (object of Map class): All the map information
+        Returns:
+            index (GridIndex): Index with the station ids as points
+    """
+    cached = _cached(_indexes, map)
+    if cached is None:
+        index = GridIndex({station_id: (station['x'], station['y']) for station_id, station in map.stations.items()})
+        cached = (map.version, index)
+        _indexes[map] = cached
+    return cached[1]
+
+
+def line_indexes(map):
+    """
+     GridIndex over the stations of every line of a map, built once and reused while the stations of
+     the map do not change.
+     Format of the parameter is:
+        Args:
+            map (object of Map class): All the map information
+        Returns:
+            indexes (dict): {line: GridIndex with the station ids of the line as points}
+    """
+    cached = _cached(_line_indexes, map)
+    if cached is None:
+        points = {}
+        for station_id, station in map.stations.items():
+            points.setdefault(station['line'], {})[station_id] = (station['x'], station['y'])
+        cached = (map.version, {line: GridIndex(line_points) for line, line_points in points.items()})
+        _line_indexes[map] = cached
+    return cached[1]
+
+
+def access_stations(map, coord, radius, per_line=ACCESS_PER_LINE, walking_distance=WALKING_DISTANCE):
+    """
+     Stations a position is connected to: the per_line closest stations of every line and all the stations
+     closer than walking_distance, among the ones closer than radius. The size of the result does not
+     depend on the number of stations, so a route through a farther station can be missed (the exact set
+     is index.within(coord, radius)).
+     Format of the parameter is:
+        Args:
+            map (object of Map class): All the map information
+            coord (list): Two REAL values, which refer to the coordinates of a point in the city
+            radius (float): Maximum distance (the walking distance of the whole query)
+            per_line (int): Closest stations of every line
+            walking_distance (float): Distance below which every station is connected
+        Returns:
+            (dict): {station_id: distance} sorted by distance (and id), like distance_to_stations
+    """
+    result = spatial_index(map).within(coord, min(radius, walking_distance))
+    for index in line_indexes(map).values():
+        result.update(index.nearest(coord, per_line))
+    return dict(sorted(((station_id, distance) for station_id, distance in result.items() if distance <= radius),
+                       key=lambda x: (x[1], x[0])))
@@ -17,18 +17,39 @@ class Map:
                 station_2 : {first_connection_to_station_2: cost_2_1, second_connection_to_station_1: cost_2_2}
                 ....
             }
+
+    self.version: counter increased every time the map is modified with add_station, add_connection,
+            add_velocity or a MapUpdate (MapUpdates.py), so cached results of an older version are not used
+
+    self.layout_version: version of the last modification that can change the heuristics (stations,
+            velocities and new connections), delays and closures of a MapUpdate do not change it
+
+    self.journal: list of (version, changes) of the last MapUpdates, see MapUpdates.py
+
+    self.closed_stations, self.closed_lines: closed with a MapUpdate. The connections of a closed
+            station are kept in self.closed_connections {(station_id, next_id): time} until it is reopened
     """
 
     def __init__(self):
         self.stations = {}
         self.connections = {}
         self.velocity = {}
+        self.version = 0
+        self.layout_version = 0
+        self.journal = []
+        self.closed_stations = set()
+        self.closed_lines = set()
+        self.closed_connections = {}
 
     def add_station(self, id, name, line, x, y):
         self.stations[id] = {'name': name, 'line': int(line), 'x': x, 'y': y}
+        self.version += 1
+        self.layout_version = self.version
 
     def add_connection(self, connections):
         self.connections = connections
+        self.version += 1
+        self.layout_version = self.version
 
     def combine_dicts(self):
         for k, v in self.stations.items():
@@ -37,6 +58,11 @@ class Map:
     def add_velocity(self, velocity):
         self.velocity = {ix + 1: v for ix, v in enumerate(velocity)}
         self.combine_dicts()
+        self.version += 1
+        self.layout_version = self.version
+
+    def is_closed(self, station_id):
+        return station_id in self.closed_stations or self.stations[station_id]['line'] in self.closed_lines
 
 
 class Path:
@@ -74,6 +100,16 @@ class Path:
         if other is not None:
             return self.route == other.route
 
+    def __contains__(self, station):
+        return station in self.route
+
+    def __len__(self):
+        return len(self.route)
+
+    def has_cycle(self):
+        # True if the last station was already visited before in the route
+        return self.last in self.route[:-1]
+
     def update_h(self, h):
         self.h = h
 
@@ -88,3 +124,72 @@ class Path:
         self.route.append(children)
         self.penultimate = self.route[-2]
         self.last = self.route[-1]
+
+
+class PathNode:
+    """
+    A persistent version of Path: it only keeps its last station and a link to the path it was
+    expanded from, so expanding a path does not copy its route. The route list is only built
+    when it is read, and it has the same API as Path (route, last, penultimate, g, h, f).
+    Usage:
+        # >>> path = PathNode(Path(2), 5)
+        # >>> path.route
+        # [2, 5]
+        # >>> path.update_g(10)
+    """
+    __slots__ = ('parent', 'last', 'length', 'g', 'h', 'f')
+
+    def __init__(self, parent, station):
+        self.parent = parent
+        self.last = station
+        self.length = len(parent) + 1
+        # Costs start as the ones of the parent, like a copy of it
+        self.g = parent.g
+        self.h = parent.h
+        self.f = parent.f
+
+    @property
+    def penultimate(self):
+        return self.parent.last
+
+    @property
+    def head(self):
+        return self.parent.head
+
+    @property
+    def route(self):
+        stations = []
+        node = self
+        while isinstance(node, PathNode):
+            stations.append(node.last)
+            node = node.parent
+        stations.reverse()
+        return node.route + stations
+
+    def __eq__(self, other):
+        if other is not None:
+            return self.route == other.route
+
+    def __contains__(self, station):
+        node = self
+        while isinstance(node, PathNode):
+            if node.last == station:
+                return True
+            node = node.parent
+        return station in node
+
+    def __len__(self):
+        return self.length
+
+    def has_cycle(self):
+        # True if the last station was already visited before in the route
+        return self.last in self.parent
+
+    def update_h(self, h):
+        self.h = h
+
+    def update_g(self, g):
+        self.g += g
+
+    def update_f(self):
+        self.f = self.g + self.h
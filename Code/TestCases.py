@@ -2,9 +2,41 @@ import unittest
 from SearchAlgorithm import (
     __author__, expand, calculate_cost, calculate_heuristics, remove_cycles, depth_first_search,
     breadth_first_search, uniform_cost_search, remove_redundant_paths, distance_to_stations, Astar, Astar_improved)
-from SubwayMap import Path
-from utils import print_list_of_path_with_cost, read_station_information, read_cost_table, read_information
+from SubwayMap import Map, Path, PathNode
+import numpy as np
+from SearchEngine import heap_search, edge_cost
+from CompiledMap import CompiledMap
+from SpatialIndex import spatial_index, access_stations
+from Heuristics import heuristic_table
+from CostTables import load_cost_tables, city_hash
+from RouteCache import RouteCache
+from BatchRouting import route_matrix
+from ContractionHierarchy import ContractionHierarchy
+from Landmarks import LandmarkTables
+from LineGraph import LineGraph, line_graph, transfer_search
+from ParetoSearch import pareto_search
+from ParallelRouting import RoutingExecutor, SharedGraph, attach
+from RoutingService import RoutingService
+from CityGenerator import generate_city, write_city
+from Benchmark import benchmark_map, compare_results
+from SearchStats import SearchStats
+from MemoryBoundedSearch import ida_star, sma_star
+from IncrementalSearch import IncrementalPlanner
+from MapUpdates import MapUpdate, changes_since
+from Timetable import Timetable, load_timetable, line_order
+from KShortestPaths import k_shortest_paths
+from utils import (print_list_of_path_with_cost, read_station_information, read_cost_table, read_information,
+                   load_city, read_city, write_edge_list, read_timetable)
 import os
+import math
+import copy
+import gc
+import weakref
+import shutil
+import tempfile
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
 
 
 def create_path_with_cost_g(list_nodes, cost_g):
@@ -237,6 +269,693 @@ class TestCases(unittest.TestCase):
         self.assertEqual(optimal_path, Path([0, -1]))
         self.assertEqual(round(optimal_path.f, 6), 16.124515)
     
+    def test_heap_search(self):
+        # The heap engine must find the same optimal costs as the list based searches
+        for type_preference in range(4):
+            for origin_id in self.map.stations:
+                for destination_id in self.map.stations:
+                    expected = uniform_cost_search(origin_id, destination_id, self.map, type_preference,
+                                                   graph_search=False)
+                    for use_heuristics in (False, True):
+                        route = heap_search(origin_id, destination_id, self.map, type_preference, use_heuristics)
+                        self.assertEqual(route.head, origin_id)
+                        self.assertEqual(route.last, destination_id)
+                        self.assertAlmostEqual(route.g, expected.g)
+                        self.assertAlmostEqual(get_cost(route, self.map, type_preference).g, expected.g)
+
+    def test_compiled_map(self):
+        compiled = CompiledMap(self.map)
+        self.assertEqual(len(compiled), 14)
+        self.assertEqual(compiled.neighbours[compiled.offsets[6]:compiled.offsets[7]].tolist(),
+                         [compiled.index[6], compiled.index[8]])
+        self.assertEqual(compiled.edge_costs(1)[compiled.offsets[6]:compiled.offsets[7]].tolist(), [4.21429, 6.03739])
+        self.assertEqual(compiled.line_velocity[compiled.index[7]], 14)
+        with self.assertRaises(AttributeError):
+            compiled.weights = None
+
+        for type_preference in range(4):
+            for origin_id in self.map.stations:
+                for destination_id in self.map.stations:
+                    expected = Astar(origin_id, destination_id, self.map, type_preference)
+                    route = Astar(origin_id, destination_id, compiled, type_preference)
+                    self.assertEqual(route, expected)
+                    self.assertAlmostEqual(route.g, expected.g)
+                    route = uniform_cost_search(origin_id, destination_id, compiled, type_preference)
+                    self.assertAlmostEqual(route.g, expected.g)
+
+    def test_path_node(self):
+        root = Path([14, 13])
+        path = PathNode(PathNode(root, 8), 12)
+        self.assertEqual(path, Path([14, 13, 8, 12]))
+        self.assertEqual((path.head, path.penultimate, path.last, len(path)), (14, 8, 12, 4))
+        self.assertIn(13, path)
+        self.assertFalse(path.has_cycle())
+        self.assertTrue(PathNode(path, 8).has_cycle())
+
+        # Expanded paths share their stations and costs start from the parent ones
+        path.update_g(3)
+        expanded_paths = expand(path, self.map)
+        self.assertTrue(all(p.parent is path and p.g == 3 for p in expanded_paths))
+        self.assertEqual(root.route, [14, 13])
+
+    def test_Astar_improved_does_not_modify_map(self):
+        stations, connections, velocity = (copy.deepcopy(self.map.stations), copy.deepcopy(self.map.connections),
+                                           copy.deepcopy(self.map.velocity))
+        queries = [([80, 100], [100, 240]), ([80, 180], [180, 50]), ([7, 250], [184, 127]), ([160, 180], [80, 170])]
+        expected = [Astar_improved(origin, destination, self.map) for origin, destination in queries]
+        self.assertEqual((self.map.stations, self.map.connections, self.map.velocity), (stations, connections, velocity))
+
+        # The same map can serve several threads at the same time
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            routes = list(pool.map(lambda query: Astar_improved(query[0], query[1], self.map), queries * 10))
+        self.assertEqual(routes, expected * 10)
+        self.assertEqual([round(route.f, 6) for route in routes[:4]], [18.417006, 20.516129, 35.592522, 16.124515])
+
+    def test_spatial_index(self):
+        index = spatial_index(self.map)
+        self.assertIs(spatial_index(self.map), index)
+        for coord in ([100, 200], [300, 111], [10, 11], [140, 56]):
+            distances = distance_to_stations(coord, self.map)
+            self.assertEqual(index.nearest(coord, 3), list(distances.items())[:3])
+            self.assertEqual(index.nearest(coord, 20), list(distances.items()))
+            self.assertEqual(index.within(coord, 60), {k: v for k, v in distances.items() if v <= 60})
+
+        for origin, destination in (([80, 100], [100, 240]), ([7, 250], [184, 127]), ([160, 180], [80, 170])):
+            self.assertEqual(Astar_improved(origin, destination, self.map),
+                             Astar_improved(origin, destination, self.map, use_spatial_index=False))
+        # The positions are connected to the closest stations of every line and the ones at walking distance
+        lines = {station['line'] for station in self.map.stations.values()}
+        for coord in ([7, 250], [100, 200], [300, 111]):
+            exact = spatial_index(self.map).within(coord, 300)
+            stations = access_stations(self.map, coord, 300, per_line=2, walking_distance=60)
+            self.assertLessEqual(len(stations), 2 * len(lines) + len(index.within(coord, 60)))
+            self.assertLess(len(stations), len(exact))
+            self.assertTrue(all(exact[station_id] == distance for station_id, distance in stations.items()))
+            self.assertTrue(set(index.within(coord, 60)) <= set(stations))
+            for line in lines:
+                closest = [station_id for station_id in exact if self.map.stations[station_id]['line'] == line][:2]
+                self.assertTrue(set(closest) <= set(stations))
+            self.assertEqual(list(stations.values()), sorted(stations.values()))
+        for origin, destination in (([80, 100], [100, 240]), ([80, 180], [180, 50]), ([7, 250], [184, 127]),
+                                    ([160, 180], [80, 170]), ([300, 111], [10, 11])):
+            exact = Astar_improved(origin, destination, self.map, use_spatial_index=False)
+            route = Astar_improved(origin, destination, self.map)
+            self.assertEqual((route, route.f), (exact, exact.f))
+            self.assertGreaterEqual(Astar_improved(origin, destination, self.map, bounded_access=True).f, exact.f)
+
+    def test_heuristic_table(self):
+        compiled = CompiledMap(self.map)
+        for type_preference in (1, 2):
+            table = heuristic_table(self.map, 9, type_preference)
+            self.assertIs(heuristic_table(self.map, 9, type_preference), table)
+            paths = calculate_heuristics([Path([1, station_id]) for station_id in self.map.stations], self.map, 9,
+                                         type_preference)
+            self.assertEqual([table[path.last] for path in paths], [path.h for path in paths])
+            compiled_table = heuristic_table(compiled, 9, type_preference)
+            self.assertEqual([compiled_table[compiled.index[s]] for s in self.map.stations], list(table.values()))
+
+        self.assertEqual(heuristic_table(self.map, 9, 0)[9], 0)
+        self.assertEqual([heuristic_table(self.map, 9, 3)[s] for s in (8, 12, 13)], [0, 1, 1])
+
+        # Tables are computed again when the velocities change
+        time_table = heuristic_table(self.map, 9, 1)
+        self.map.add_velocity([10, 14, 90, 31])
+        self.assertAlmostEqual(heuristic_table(self.map, 9, 1)[12], time_table[12] / 2)
+
+    def test_cost_tables(self):
+        with tempfile.TemporaryDirectory() as folder:
+            tables = load_cost_tables(self.ROOT_FOLDER, self.map, cache_folder=folder)
+            self.assertIsInstance(tables.distances, np.memmap)
+            for type_preference in range(4):
+                for origin_id in self.map.stations:
+                    for destination_id in self.map.stations:
+                        expected = Astar(origin_id, destination_id, self.map, type_preference)
+                        route = Astar(origin_id, destination_id, self.map, type_preference, cost_tables=tables)
+                        self.assertAlmostEqual(route.g, expected.g)
+                        self.assertAlmostEqual(get_cost(route, self.map, type_preference).g, expected.g)
+            self.assertEqual(Astar(2, 6, self.map, 1, cost_tables=tables), Path([2, 5, 6]))
+            # After a MapUpdate the tables do not match the map, and the route is searched
+            self.assertTrue(tables.matches(self.map))
+            with MapUpdate(self.map) as update:
+                update.close_station(5)
+            self.assertFalse(tables.matches(self.map))
+            route = Astar(2, 6, self.map, 1, cost_tables=tables)
+            self.assertNotIn(5, route.route)
+            self.assertEqual(route, Astar(2, 6, self.map, 1))
+            with MapUpdate(self.map) as update:
+                update.reopen_station(5)
+            self.assertTrue(tables.matches(self.map))
+            self.assertEqual(Astar(2, 6, self.map, 1, cost_tables=tables), Path([2, 5, 6]))
+
+            # The tables of a city are computed again when its files change
+            city = os.path.join(folder, 'city')
+            shutil.copytree(self.ROOT_FOLDER, city)
+            self.assertEqual(city_hash(city), city_hash(self.ROOT_FOLDER))
+            with open(os.path.join(city, 'InfoVelocity.txt'), 'a') as fp:
+                fp.write('\n Vel. line 5 : 50')
+            self.assertNotEqual(city_hash(city), city_hash(self.ROOT_FOLDER))
+            load_cost_tables(city, cache_folder=folder)
+            self.assertEqual(len([name for name in os.listdir(folder) if name.startswith('cost_tables_')]), 2)
+
+    def test_route_cache(self):
+        cache = RouteCache(max_size=2)
+        cached_Astar = cache.wrap(Astar)
+        cached_depth_first_search = cache.wrap(depth_first_search)
+
+        self.assertEqual(cached_Astar(9, 3, self.map, 1), Path([9, 8, 12, 11, 10, 2, 3]))
+        route = cached_Astar(9, 3, self.map, 1)
+        self.assertEqual(route, Path([9, 8, 12, 11, 10, 2, 3]))
+        self.assertEqual(route.g, uniform_cost_search(9, 3, self.map, 1).g)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (1, 1, 0))
+
+        # Returned paths can be modified without changing the cache
+        route.update_g(100)
+        self.assertEqual(cached_Astar(9, 3, self.map, 1).g, uniform_cost_search(9, 3, self.map, 1).g)
+
+        self.assertEqual(cached_depth_first_search(2, 7, self.map), Path([2, 5, 6, 7]))
+        cached_Astar(2, 6, self.map, 1)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (2, 3, 1))
+
+        # Modifying the map changes its version, so older routes are not used
+        version = self.map.version
+        self.map.add_velocity([10, 14, 45, 31])
+        self.assertEqual(self.map.version, version + 1)
+        cached_Astar(2, 6, self.map, 1)
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+        # Searches with statistics are always run and not cached
+        cache = RouteCache(max_size=2)
+        stats = SearchStats()
+        cache.search(Astar, 9, 3, self.map, 1, stats=stats)
+        self.assertGreater(stats.expanded, 0)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 0, 0))
+
+        # Functions with the same name do not share their routes
+        def Astar_by_adjacency(origin_id, destination_id, map, type_preference):
+            return Astar(origin_id, destination_id, map, 0)
+        Astar_by_adjacency.__name__ = 'Astar'
+        cache.search(Astar, 9, 3, self.map, 1)
+        route = cache.search(Astar_by_adjacency, 9, 3, self.map, 1)
+        self.assertNotEqual(route.g, uniform_cost_search(9, 3, self.map, 1).g)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+        # The cache does not keep the maps alive, and the routes of a collected map are removed
+        other_map = copy.deepcopy(self.map)
+        map_reference = weakref.ref(other_map)
+        cache = RouteCache()
+        cache.search(Astar, 9, 3, other_map, 1)
+        cache.search(Astar, 9, 3, self.map, 1)
+        del other_map
+        gc.collect()
+        self.assertIsNone(map_reference())
+        cache.search(Astar, 9, 3, self.map, 1)
+        self.assertEqual((len(cache), cache.hits), (1, 1))
+
+    def test_route_matrix(self):
+        origins, destinations = [9, 2, 9, 14], [3, 6, 9, 1]
+        for type_preference in range(4):
+            costs, routes = route_matrix(origins, destinations, self.map, type_preference, return_routes=True)
+            compiled_costs = route_matrix(origins, destinations, CompiledMap(self.map), type_preference)
+            self.assertEqual(costs.shape, (4, 4))
+            for i, origin_id in enumerate(origins):
+                for j, destination_id in enumerate(destinations):
+                    expected = uniform_cost_search(origin_id, destination_id, self.map, type_preference)
+                    self.assertAlmostEqual(costs[i][j], expected.g)
+                    self.assertAlmostEqual(compiled_costs[i][j], expected.g)
+                    self.assertAlmostEqual(get_cost(routes[i][j], self.map, type_preference).g, expected.g)
+                    self.assertEqual((routes[i][j].head, routes[i][j].last), (origin_id, destination_id))
+
+    def test_bidirectional_search(self):
+        compiled = CompiledMap(self.map)
+        for type_preference in range(4):
+            for origin_id in self.map.stations:
+                for destination_id in self.map.stations:
+                    expected = uniform_cost_search(origin_id, destination_id, self.map, type_preference)
+                    for subway_map in (self.map, compiled):
+                        for route in (uniform_cost_search(origin_id, destination_id, subway_map, type_preference,
+                                                          bidirectional=True),
+                                      Astar(origin_id, destination_id, subway_map, type_preference,
+                                            bidirectional=True)):
+                            self.assertEqual((route.head, route.last), (origin_id, destination_id))
+                            self.assertAlmostEqual(route.g, expected.g)
+                            self.assertAlmostEqual(get_cost(route, self.map, type_preference).g, expected.g)
+
+        # With the average potentials the bidirectional A* expands less stations than A*
+        city = generate_city(500, seed=2)
+        station_ids = sorted(city.stations)
+        queries = [(station_ids[ix], station_ids[-1 - 7 * ix]) for ix in range(20)]
+        for type_preference in range(4):
+            stats, bidirectional_stats = SearchStats(), SearchStats()
+            for origin_id, destination_id in queries:
+                route = Astar(origin_id, destination_id, city, type_preference, stats=stats)
+                bidirectional_route = Astar(origin_id, destination_id, city, type_preference, bidirectional=True,
+                                            stats=bidirectional_stats)
+                self.assertAlmostEqual(bidirectional_route.g, route.g)
+            self.assertLessEqual(bidirectional_stats.expanded, stats.expanded)
+
+    def test_contraction_hierarchy(self):
+        hierarchy = ContractionHierarchy.build(self.map)
+        self.assertEqual(sorted(hierarchy.rank.values()), list(range(14)))
+        with tempfile.TemporaryDirectory() as folder:
+            hierarchy.save(os.path.join(folder, 'hierarchy.npz'))
+            loaded = ContractionHierarchy.load(os.path.join(folder, 'hierarchy.npz'))
+        for origin_id in self.map.stations:
+            for destination_id in self.map.stations:
+                expected = uniform_cost_search(origin_id, destination_id, self.map, 1)
+                for ch in (hierarchy, loaded):
+                    route = ch.route(origin_id, destination_id)
+                    self.assertEqual((route.head, route.last), (origin_id, destination_id))
+                    self.assertAlmostEqual(route.g, expected.g)
+                    self.assertAlmostEqual(get_cost(route, self.map, 1).g, expected.g)
+        self.assertEqual(hierarchy.route(9, 3), Path([9, 8, 12, 11, 10, 2, 3]))
+
+    def test_landmarks(self):
+        compiled = CompiledMap(self.map)
+        for strategy in ('random', 'farthest', 'planar'):
+            landmarks = LandmarkTables.build(self.map, k=3, strategy=strategy)
+            self.assertEqual(len(landmarks.landmarks), 3)
+            for type_preference in range(4):
+                for origin_id in self.map.stations:
+                    for destination_id in self.map.stations:
+                        expected = uniform_cost_search(origin_id, destination_id, self.map, type_preference)
+                        self.assertLessEqual(landmarks.heuristic_table(self.map, destination_id,
+                                                                       type_preference)[origin_id],
+                                             expected.g + 1e-9)
+                        for subway_map in (self.map, compiled):
+                            route = Astar(origin_id, destination_id, subway_map, type_preference, landmarks=landmarks)
+                            self.assertAlmostEqual(route.g, expected.g)
+
+        with tempfile.TemporaryDirectory() as folder:
+            landmarks.save(os.path.join(folder, 'landmarks.npz'))
+            loaded = LandmarkTables.load(os.path.join(folder, 'landmarks.npz'))
+        self.assertEqual(loaded.landmarks, landmarks.landmarks)
+        self.assertEqual(loaded.bounds(3, 1).tolist(), landmarks.bounds(3, 1).tolist())
+
+    def test_line_graph(self):
+        graph = line_graph(self.map)
+        self.assertEqual(graph.interchanges, {'CHARPENNES': [2, 5, 10], 'PART-DIEU': [8, 12, 13]})
+        self.assertEqual(graph.adjacent, {1: {2, 3}, 2: {1, 3, 4}, 3: {1, 2, 4}, 4: {2, 3}})
+        self.assertEqual((graph.min_transfers(1, 4), graph.min_transfers(2, 2)), (2, 0))
+        self.assertEqual(heuristic_table(self.map, 14, 3)[3], 2)
+        # One way connections: 1 -> 2 -> 3 -> 4, and line 4 is only reached from line 3
+        directed = Map()
+        for station_id, line in [(1, 1), (2, 2), (3, 3), (4, 3), (5, 4), (6, 1)]:
+            directed.add_station(station_id, 'S{}'.format(station_id), line, station_id, 0)
+        directed.add_connection({1: {2: 1}, 2: {3: 1}, 3: {4: 1}, 4: {5: 1}, 5: {6: 1}, 6: {1: 1}})
+        self.assertEqual(transfer_search(1, 4, directed).route, [1, 2, 3, 4])
+        for origin_id in directed.stations:
+            for destination_id in directed.stations:
+                expected = uniform_cost_search(origin_id, destination_id, directed, 3)
+                route = transfer_search(origin_id, destination_id, directed)
+                self.assertEqual(route.route, expected.route)
+                self.assertEqual(route.g, expected.g)
+
+        for origin_id in self.map.stations:
+            for destination_id in self.map.stations:
+                expected = uniform_cost_search(origin_id, destination_id, self.map, 3)
+                route = transfer_search(origin_id, destination_id, self.map)
+                self.assertEqual((route.head, route.last), (origin_id, destination_id))
+                self.assertEqual(route.g, expected.g)
+                self.assertEqual(get_cost(route, self.map, 3).g, expected.g)
+
+    def test_pareto_search(self):
+        routes = pareto_search(9, 3, self.map)
+        self.assertEqual(routes, [Path([9, 8, 12, 11, 10, 2, 3]), Path([9, 8, 7, 6, 5, 2, 3])])
+        self.assertEqual([route.costs[1] for route in routes], [2, 1])
+
+        for origin_id in self.map.stations:
+            for destination_id in self.map.stations:
+                routes = pareto_search(origin_id, destination_id, self.map)
+                # The best route of every criterion is in the set, and no route dominates another one
+                for criterion, type_preference in ((0, 1), (1, 3), (2, 2)):
+                    self.assertAlmostEqual(min(route.costs[criterion] for route in routes),
+                                           uniform_cost_search(origin_id, destination_id, self.map, type_preference).g)
+                for route in routes:
+                    self.assertEqual(route.g, route.costs[0])
+                    self.assertFalse(any(other is not route and all(c <= o for c, o in zip(other.costs, route.costs))
+                                         for other in routes))
+
+        # The default search is exact: every route found with a limit of labels is matched by the complete set
+        city = generate_city(200, seed=3)
+        station_ids = sorted(city.stations)
+        for origin_id, destination_id in [(station_ids[ix], station_ids[-1 - 9 * ix]) for ix in range(10)]:
+            routes = pareto_search(origin_id, destination_id, city)
+            for criterion, type_preference in ((0, 1), (1, 3), (2, 2)):
+                self.assertAlmostEqual(min(route.costs[criterion] for route in routes),
+                                       uniform_cost_search(origin_id, destination_id, city, type_preference).g)
+                for route in routes:
+                    self.assertAlmostEqual(get_cost(route, city, type_preference).g, route.costs[criterion])
+            for route in pareto_search(origin_id, destination_id, city, max_labels=1):
+                self.assertTrue(any(all(c <= o + 1e-9 for c, o in zip(other.costs, route.costs)) for other in routes))
+
+    def test_load_city(self):
+        with tempfile.TemporaryDirectory() as folder:
+            city = os.path.join(folder, 'city')
+            shutil.copytree(self.ROOT_FOLDER, city)
+            for _ in range(2):
+                subway_map = load_city(city)
+                self.assertEqual((subway_map.stations, subway_map.connections, subway_map.velocity),
+                                 (self.map.stations, self.map.connections, self.map.velocity))
+            self.assertEqual(len(os.listdir(os.path.join(city, '.cache'))), 1)
+
+            # A sparse edge list is used instead of Time.txt when it exists, and the cache is written again
+            connections = {k: {n: c * 2 for n, c in v.items()} for k, v in self.map.connections.items()}
+            write_edge_list(connections, os.path.join(city, 'Connections.txt'))
+            self.assertEqual(read_city(city).connections, connections)
+            self.assertEqual(load_city(city).connections, connections)
+            self.assertEqual(len(os.listdir(os.path.join(city, '.cache'))), 2)
+
+    def test_parallel_routing(self):
+        compiled = CompiledMap(self.map)
+        graph = SharedGraph(compiled)
+        try:
+            shared, blocks = attach(graph.descriptor)
+            np.testing.assert_array_equal(shared.weights, compiled.weights)
+            self.assertEqual(shared.index, compiled.index)
+            for block in blocks:
+                block.close()
+        finally:
+            graph.close()
+
+        queries = [(9, 3, 1), (2, 6, 0), (14, 1, 2), (8, 1, 3), (9, 3, 1, 'uniform_cost_search'), (5, 12, 0, 'bidirectional')]
+        with RoutingExecutor(self.map, processes=2) as executor:
+            routes = executor.map(queries)
+            unordered = dict(executor.map_unordered(queries))
+        for ix, query in enumerate(queries):
+            expected = Astar(query[0], query[1], self.map, query[2])
+            self.assertAlmostEqual(routes[ix].g, expected.g)
+            self.assertAlmostEqual(unordered[ix].g, expected.g)
+            self.assertEqual((routes[ix].head, routes[ix].last), query[:2])
+
+    def test_routing_service(self):
+        requests = [{'id': 0, 'algorithm': 'Astar', 'origin': 9, 'destination': 3, 'type_preference': 1},
+                    {'id': 1, 'algorithm': 'uniform_cost_search', 'origin': 9, 'destination': 1, 'type_preference': 1},
+                    {'id': 2, 'algorithm': 'uniform_cost_search', 'origin': 9, 'destination': 14, 'type_preference': 1},
+                    {'id': 3, 'algorithm': 'Astar_improved', 'origin': [80, 100], 'destination': [198, 160]},
+                    {'id': 4, 'algorithm': 'Astar', 'origin': 9, 'destination': 999},
+                    {'id': 5, 'city': 'Unknown', 'origin': 9, 'destination': 3}]
+
+        async def run():
+            service = RoutingService({'Lyon': self.map}, max_pending=2)
+            server = await service.start()
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(''.join(json.dumps(request) + '\n' for request in requests).encode())
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in requests]
+            writer.close()
+            await service.close()
+            return {response['id']: response for response in responses}
+
+        responses = asyncio.run(run())
+        for request in requests[:3]:
+            expected = Astar(request['origin'], request['destination'], self.map, request['type_preference'])
+            self.assertAlmostEqual(responses[request['id']]['cost'], expected.g)
+            self.assertEqual(responses[request['id']]['route'][::len(expected.route) - 1],
+                             [request['origin'], request['destination']])
+        self.assertEqual(responses[3]['route'], Astar_improved([80, 100], [198, 160], self.map).route)
+        self.assertIn('error', responses[4])
+        self.assertIn('error', responses[5])
+
+    def test_city_generator(self):
+        city = generate_city(150, seed=3)
+        self.assertEqual(sorted(city.stations), list(range(1, 151)))
+        self.assertEqual(city.connections, generate_city(150, seed=3).connections)
+        self.assertNotEqual(city.connections, generate_city(150, seed=4).connections)
+        for origin_id in (1, 75, 150):
+            for destination_id in (2, 90, 149):
+                expected = uniform_cost_search(origin_id, destination_id, city, 1)
+                self.assertTrue(expected)
+                self.assertAlmostEqual(Astar(origin_id, destination_id, city, 1).g, expected.g)
+        with tempfile.TemporaryDirectory() as folder:
+            for dense in (True, False):
+                write_city(city, folder, dense=dense)
+                subway_map = read_city(folder)
+                self.assertEqual((subway_map.stations, subway_map.connections, subway_map.velocity),
+                                 (city.stations, city.connections, city.velocity))
+
+    def test_benchmark(self):
+        results = benchmark_map(self.map, ['Astar', 'breadth_first_search'], n_queries=3)
+        self.assertEqual([(result['algorithm'], result['type_preference']) for result in results],
+                         [('Astar', 0), ('Astar', 1), ('Astar', 2), ('Astar', 3), ('breadth_first_search', None)])
+        slower = [dict(result, p50_ms=result['p50_ms'] * 2 + 1) for result in results]
+        self.assertEqual(len(compare_results(results, slower)), len(results))
+        self.assertEqual(compare_results(slower, results), [])
+
+    def test_search_stats(self):
+        searches = [(depth_first_search, ()), (breadth_first_search, ()), (depth_first_search, (False,)),
+                    (breadth_first_search, (False,)), (uniform_cost_search, (1, False)),
+                    (Astar, (1, False)), (uniform_cost_search, (1,)), (Astar, (1,))]
+        for search_function, args in searches:
+            stats = SearchStats()
+            expanded = []
+            path = search_function(9, 3, self.map, *args, stats=stats,
+                                   on_expand=lambda station_id, g: expanded.append(station_id))
+            expected = search_function(9, 3, self.map, *args)
+            self.assertEqual((path.route, path.g), (expected.route, expected.g))
+            self.assertEqual(stats.expanded, len(expanded))
+            self.assertEqual(expanded[0], 9)
+            self.assertGreaterEqual(stats.generated, stats.expanded)
+            self.assertGreater(stats.peak_frontier, 0)
+            self.assertGreater(stats.total_time, 0)
+            self.assertGreaterEqual(stats.total_time, stats.phase_time['expand'])
+        stats = SearchStats()
+        Astar(9, 3, self.map, 1, graph_search=False, stats=stats)
+        self.assertGreater(stats.phase_time['heuristic'], 0)
+        self.assertEqual(set(stats.as_dict()['phase_time']), {'expand', 'cost', 'heuristic', 'insert'})
+        path = Astar(9, 3, CompiledMap(self.map), 1, on_expand=lambda station_id, g: expanded.append(station_id))
+        self.assertEqual(expanded[-1], 3)
+        self.assertEqual(path.route, Astar(9, 3, self.map, 1).route)
+
+    def test_graph_search_traversals(self):
+        compiled = CompiledMap(self.map)
+        for search_function in (depth_first_search, breadth_first_search):
+            for origin_id in self.map.stations:
+                for destination_id in self.map.stations:
+                    expected = search_function(origin_id, destination_id, self.map, graph_search=False)
+                    self.assertEqual(search_function(origin_id, destination_id, self.map).route, expected.route)
+                    self.assertEqual(search_function(origin_id, destination_id, compiled).route, expected.route)
+        # Every station is expanded at most once
+        city = generate_city(2000, seed=1)
+        for search_function in (depth_first_search, breadth_first_search):
+            stats = SearchStats()
+            path = search_function(1, 2000, city, stats=stats)
+            self.assertEqual((path.head, path.last), (1, 2000))
+            self.assertLessEqual(stats.expanded, len(city.stations))
+
+    def test_memory_bounded_search(self):
+        for type_preference in range(4):
+            for origin_id in self.map.stations:
+                for destination_id in self.map.stations:
+                    expected = Astar(origin_id, destination_id, self.map, type_preference)
+                    self.assertAlmostEqual(ida_star(origin_id, destination_id, self.map, type_preference).g,
+                                           expected.g)
+                    for max_nodes in (1000, 12):
+                        stats = SearchStats()
+                        path = sma_star(origin_id, destination_id, self.map, type_preference, max_nodes, stats)
+                        self.assertEqual((path.head, path.last), (origin_id, destination_id))
+                        self.assertAlmostEqual(path.g, expected.g)
+                        self.assertLessEqual(stats.peak_frontier, max_nodes)
+        with self.assertRaises(ValueError):
+            sma_star(1, 2, self.map, 0, 1)
+
+    def test_incremental_planner(self):
+        for type_preference in range(4):
+            subway_map = copy.deepcopy(self.map)
+            planner = IncrementalPlanner(subway_map, 1, 12, type_preference)
+            self.assertAlmostEqual(planner.plan().g, heap_search(1, 12, subway_map, type_preference).g)
+            # Delay of the connections of the route, it is repaired as a new search on the modified map
+            route = planner.plan().route
+            changed = []
+            for station_id, next_id in zip(route, route[1:]):
+                subway_map.connections[station_id][next_id] *= 3
+                subway_map.connections[next_id][station_id] *= 3
+                changed += [(station_id, next_id), (next_id, station_id)]
+            subway_map.version += 1
+            planner.update_connections(changed)
+            path = planner.plan()
+            self.assertEqual((path.head, path.last), (1, 12))
+            self.assertAlmostEqual(path.g, heap_search(1, 12, subway_map, type_preference).g)
+            self.assertAlmostEqual(get_cost(path, subway_map, type_preference).g, path.g)
+            # Closed station: the same as a map without its connections
+            planner.close_station(path.route[2])
+            closed_map = copy.deepcopy(subway_map)
+            for next_id in closed_map.connections[path.route[2]]:
+                del closed_map.connections[next_id][path.route[2]]
+            closed_map.connections[path.route[2]] = {}
+            new_path = planner.plan()
+            expected = heap_search(1, 12, closed_map, type_preference)
+            self.assertEqual(bool(new_path), bool(expected))
+            if expected:
+                self.assertNotIn(path.route[2], new_path.route)
+                self.assertAlmostEqual(new_path.g, expected.g)
+            planner.reopen_station(path.route[2])
+            self.assertAlmostEqual(planner.plan().g, path.g)
+            planner.close_station(12)
+            self.assertEqual(planner.plan(), [])
+
+    def test_map_updates(self):
+        subway_map = copy.deepcopy(self.map)
+        connections = copy.deepcopy(subway_map.connections)
+        version, layout_version = subway_map.version, subway_map.layout_version
+        planner = IncrementalPlanner(subway_map, 1, 12, 1)
+        planner.plan()
+        with MapUpdate(subway_map) as update:
+            update.scale_cost(1, 2, 2)
+            update.close_station(10)
+        self.assertEqual(subway_map.version, version + 1)
+        self.assertEqual(subway_map.layout_version, layout_version)
+        self.assertEqual(subway_map.connections[1][2], connections[1][2] * 2)
+        self.assertEqual(subway_map.connections[2][1], connections[2][1] * 2)
+        self.assertEqual(subway_map.connections[10], {})
+        self.assertTrue(all(10 not in next_stations for next_stations in subway_map.connections.values()))
+        changes = changes_since(subway_map, version)
+        self.assertEqual(changes[:2], [('connection', 1, 2, connections[1][2], connections[1][2] * 2),
+                                       ('connection', 2, 1, connections[2][1], connections[2][1] * 2)])
+        self.assertIn(('close_station', 10), changes)
+        self.assertIsNone(changes_since(subway_map, version - 1))
+        planner.sync()
+        self.assertAlmostEqual(planner.plan().g, heap_search(1, 12, subway_map, 1, use_heuristics=False).g)
+        self.assertNotIn(10, planner.plan().route)
+
+        # A change that is not valid undoes the whole update
+        with self.assertRaises(ValueError):
+            with MapUpdate(subway_map) as update:
+                update.set_cost(5, 6, 1)
+                update.close_line(1)
+                update.scale_cost(1, 14, 2)
+        self.assertEqual(subway_map.version, version + 1)
+        self.assertEqual(subway_map.connections[5][6], connections[5][6])
+        self.assertEqual(subway_map.closed_lines, set())
+
+        with MapUpdate(subway_map) as update:
+            update.close_line(1)
+            update.set_velocity(2, 100)
+            update.reopen_station(10)
+        self.assertEqual(subway_map.layout_version, subway_map.version)
+        # The connection with station 2 (line 1) is added again when line 1 is reopened
+        self.assertEqual(subway_map.connections[10], {next_id: time for next_id, time in connections[10].items()
+                                                      if next_id != 2})
+        self.assertTrue(all(subway_map.connections[station_id] == {} for station_id in (1, 2, 3)))
+        self.assertTrue(all(station['velocity'] == 100 for station in subway_map.stations.values()
+                            if station['line'] == 2))
+        with MapUpdate(subway_map) as update:
+            update.reopen_line(1)
+            update.set_cost(2, 1, connections[2][1])
+            update.set_cost(1, 2, connections[1][2])
+        self.assertEqual(subway_map.connections, connections)
+        self.assertEqual(subway_map.closed_connections, {})
+        planner.sync()
+        self.assertAlmostEqual(planner.plan().g, heap_search(1, 12, subway_map, 1, use_heuristics=False).g)
+
+    def test_map_updates_patch_structures(self):
+        city = generate_city(300, seed=4)
+        station_ids = sorted(city.stations)
+        compiled = CompiledMap(city)
+        graph, index = line_graph(city), spatial_index(city)
+        for step in range(12):
+            with MapUpdate(city) as update:
+                station_id = station_ids[17 * step % len(station_ids)]
+                if step % 4 == 0:
+                    update.close_station(station_id)
+                elif step % 4 == 1:
+                    update.reopen_station(sorted(city.closed_stations)[0])
+                elif step % 4 == 2:
+                    update.set_cost(station_id, station_ids[-1 - step], 7.5, both_ways=False)
+                else:
+                    update.set_velocity(city.stations[station_id]['line'], 12)
+                    next_id = next(iter(city.connections[station_id]))
+                    update.scale_cost(station_id, next_id, 1.5)
+            # The structures are patched, and they are the same as the ones built again from the map
+            compiled = compiled.updated(city)
+            expected = CompiledMap(city)
+            self.assertEqual(compiled.version, city.version)
+            for type_preference in range(4):
+                offsets, neighbours, costs = compiled.csr_lists(type_preference)
+                expected_offsets, expected_neighbours, expected_costs = expected.csr_lists(type_preference)
+                self.assertEqual(offsets, expected_offsets)
+                for ix in range(len(compiled)):
+                    row = slice(offsets[ix], offsets[ix + 1])
+                    self.assertEqual(dict(zip(neighbours[row], costs[row])),
+                                     dict(zip(expected_neighbours[row], expected_costs[row])))
+            self.assertTrue(np.array_equal(compiled.line_velocity, expected.line_velocity))
+            self.assertIs(line_graph(city), graph)
+            self.assertEqual(graph.transfers, LineGraph(city).transfers)
+            self.assertIs(spatial_index(city), index)
+
+        # Cached routes are only removed if a change can make them not optimal
+        subway_map = copy.deepcopy(self.map)
+        cache = RouteCache()
+        cache.search(Astar, 9, 3, subway_map, 1)
+        cache.search(depth_first_search, 2, 7, subway_map)
+        with MapUpdate(subway_map) as update:
+            update.scale_cost(1, 2, 2)
+        self.assertEqual(cache.search(Astar, 9, 3, subway_map, 1), Path([9, 8, 12, 11, 10, 2, 3]))
+        cache.search(depth_first_search, 2, 7, subway_map)
+        self.assertEqual((cache.hits, cache.invalidations), (1, 1))
+        # A delay of the route, and a connection that is faster
+        for station_id, next_id, factor in ((12, 11, 3), (7, 6, 0.5)):
+            with MapUpdate(subway_map) as update:
+                update.scale_cost(station_id, next_id, factor)
+            route = cache.search(Astar, 9, 3, subway_map, 1)
+            self.assertEqual(route, uniform_cost_search(9, 3, subway_map, 1))
+            self.assertAlmostEqual(route.g, uniform_cost_search(9, 3, subway_map, 1).g)
+        self.assertEqual((cache.hits, cache.invalidations), (1, 3))
+
+    def test_timetable(self):
+        schedule = read_timetable(self.ROOT_FOLDER + 'Timetable.txt')
+        self.assertEqual(len(schedule[(1, 0)]), 171)
+        self.assertEqual(schedule[(1, 0)][:2], [360, 366])
+        self.assertEqual(line_order(self.map, 2), [4, 5, 6, 7, 8, 9])
+        timetable = load_timetable(self.map, self.ROOT_FOLDER)
+        self.assertEqual(len(timetable), sum(len(departures) * (len(line_order(self.map, line)) - 1)
+                                             for (line, _), departures in schedule.items()))
+        self.assertIsNone(load_timetable(self.map, '../CityInformation/Lyon_bigCity/'))
+
+        # The train of line 1 leaves station 1 at 366
+        arrival, path = timetable.earliest_arrival(1, 2, 361)
+        self.assertAlmostEqual(arrival, 366 + self.map.connections[1][2])
+        self.assertEqual(path.route, [1, 2])
+        self.assertAlmostEqual(path.g, arrival - 361)
+        arrival, path = timetable.earliest_arrival(1, 12, 480)
+        self.assertEqual((path.head, path.last), (1, 12))
+        self.assertGreaterEqual(arrival, 480 + heap_search(1, 12, self.map, 1).g)
+        self.assertTrue(all(next_id in self.map.connections[station_id]
+                            for station_id, next_id in zip(path.route, path.route[1:])))
+        self.assertEqual(timetable.earliest_arrival(1, 12, 2000), (math.inf, []))
+
+        journeys = timetable.profile(1, 12, 480, 540)
+        self.assertTrue(journeys)
+        for departure, arrival in journeys:
+            self.assertTrue(480 <= departure <= 540)
+            self.assertAlmostEqual(timetable.earliest_arrival(1, 12, departure)[0], arrival)
+        self.assertEqual(journeys, sorted(journeys))
+        self.assertEqual([arrival for _, arrival in journeys], sorted({arrival for _, arrival in journeys}))
+        # Journeys that leave just after the window and arrive earlier hide the worse ones in it (2 to 1 at 703.9)
+        for destination_id in self.map.stations:
+            if destination_id != 2:
+                for departure, arrival in timetable.profile(2, destination_id, 350, 704):
+                    self.assertAlmostEqual(timetable.earliest_arrival(2, destination_id, departure)[0], arrival)
+
+    def test_k_shortest_paths(self):
+        for type_preference in range(4):
+            paths = k_shortest_paths(1, 12, self.map, 6, type_preference)
+            self.assertEqual(len(paths), 6)
+            self.assertAlmostEqual(paths[0].g, heap_search(1, 12, self.map, type_preference).g)
+            self.assertEqual([path.g for path in paths], sorted(path.g for path in paths))
+            self.assertEqual(len({tuple(path.route) for path in paths}), 6)
+            for path in paths:
+                self.assertEqual((path.head, path.last), (1, 12))
+                self.assertEqual(len(set(path.route)), len(path.route))
+                self.assertAlmostEqual(path.g, sum(edge_cost(self.map, station_id, next_id, type_preference)
+                                                   for station_id, next_id in zip(path.route, path.route[1:])))
+
+        paths = k_shortest_paths(1, 12, self.map, 6, 1)
+        bounded = k_shortest_paths(1, 12, self.map, 6, 1, max_cost_ratio=1.2)
+        self.assertEqual([path.route for path in bounded],
+                         [path.route for path in paths if path.g <= paths[0].g * 1.2])
+        self.assertEqual([path.route for path in k_shortest_paths(1, 12, self.map, 1, 1)], [paths[0].route])
+        self.assertEqual(k_shortest_paths(1, 12, self.map, 0, 1), [])
+        self.assertEqual([path.route for path in k_shortest_paths(5, 5, self.map, 3)], [[5]])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,281 @@
+# This file contains a timetable engine based on the Connection Scan Algorithm. The departures of
+# every line are read from the optional Timetable.txt of a city (see read_timetable in utils.py)
+# and every trip is split in its elementary connections (departure station, arrival station,
+# departure time, arrival time), kept in arrays sorted by departure time. A query is one scan
+# of those arrays, so waiting times and headways are part of the result, unlike the static
+# times of Time.txt used by Astar.
+#     timetable = load_timetable(subway_map, '../CityInformation/Lyon_smallCity/')
+#     arrival, path = timetable.earliest_arrival(1, 12, 480)
+#     timetable.profile(1, 12, 480, 540)    # [(departure, arrival), ...]
+# _________________________________________________________________________________________
+
+from SubwayMap import Path
+from utils import read_timetable
+import numpy as np
+import bisect
+import heapq
+import math
+import os
+
+
+def line_order(map, line):
+    """
+     Stations of a line in the order of the line, starting at the end with the lowest station id.
+     Format of the parameter is:
+        Args:
+            map (object of Map class): All the map information
+            line (int): Line of the stations
+        Returns:
+            stations (list): Station ids of the line
+        Raises:
+            ValueError: The connections of the line are not a single route without branches
+    """
+    stations = [station_id for station_id, station in map.stations.items() if station['line'] == line]
+    neighbours = {station_id: [next_id for next_id in map.connections.get(station_id, ())
+                               if map.stations[next_id]['line'] == line] for station_id in stations}
+    ends = sorted(station_id for station_id in stations if len(neighbours[station_id]) <= 1)
+    if not ends or any(len(next_stations) > 2 for next_stations in neighbours.values()):
+        raise ValueError("line {} is not a single route".format(line))
+    order = [ends[0]]
+    while len(order) < len(stations):
+        next_stations = [next_id for next_id in neighbours[order[-1]] if len(order) < 2 or next_id != order[-2]]
+        if not next_stations:
+            raise ValueError("line {} is not a single route".format(line))
+        order.append(next_stations[0])
+    return order
+
+
+def transfer_times(map):
+    """
+     Shortest time of every station to the stations it can walk to with transfers (connections between
+     stations of different lines, and several transfers one after another).
+     Format of the parameter is:
+        Args:
+            map (object of Map class): All the map information
+        Returns:
+            transfers (dict): {station_id: [(other_id, time), ...]}
+    """
+    edges = {station_id: [(next_id, time) for next_id, time in connections.items()
+                          if map.stations[next_id]['line'] != map.stations[station_id]['line']]
+             for station_id, connections in map.connections.items()}
+    transfers = {}
+    for station_id, station_edges in edges.items():
+        if not station_edges:
+            continue
+        best = {station_id: 0}
+        heap = [(0, station_id)]
+        while heap:
+            time, current = heapq.heappop(heap)
+            if time > best[current]:
+                continue
+            for next_id, cost in edges.get(current, ()):
+                if time + cost < best.get(next_id, math.inf):
+                    best[next_id] = time + cost
+                    heapq.heappush(heap, (time + cost, next_id))
+        del best[station_id]
+        transfers[station_id] = sorted(best.items())
+    return transfers
+
+
+class Timetable:
+    """
+    Connections of all the trips of a map, sorted by departure time.
+
+    self.trips: list of the stations of every trip (in the order they are visited)
+    self.departure_station, self.arrival_station, self.departure_time, self.arrival_time, self.trip,
+    self.position: parallel numpy arrays with one connection of a trip each. position is the index in
+                   the stations of its trip of the departure station
+    self.transfers: {station_id: [(other_id, time), ...]} (see transfer_times)
+    """
+
+    def __init__(self, map, schedule):
+        """
+         Format of the parameter is:
+            Args:
+                map (object of Map class): All the map information
+                schedule (dict): {(line, direction): list of departures from the first station}. Direction 0
+                                 follows line_order and direction 1 goes the other way
+        """
+        self.map = map
+        self.trips = []
+        rows = []
+        orders = {}
+        for (line, direction), departures in sorted(schedule.items()):
+            if line not in orders:
+                orders[line] = line_order(map, line)
+            stations = orders[line] if direction == 0 else orders[line][::-1]
+            times = [map.connections[station_id][next_id] for station_id, next_id in zip(stations, stations[1:])]
+            for departure in departures:
+                trip = len(self.trips)
+                self.trips.append(stations)
+                time = departure
+                for position, travel_time in enumerate(times):
+                    rows.append((stations[position], stations[position + 1], time, time + travel_time, trip,
+                                 position))
+                    time += travel_time
+
+        table = np.array(rows, dtype=np.float64).reshape(-1, 6)
+        # By departure time, the connections of a trip with the same departure time keep their order
+        order = np.lexsort((table[:, 5], table[:, 3], table[:, 2]))
+        table = table[order]
+        self.departure_station = table[:, 0].astype(np.int64)
+        self.arrival_station = table[:, 1].astype(np.int64)
+        self.departure_time = table[:, 2].copy()
+        self.arrival_time = table[:, 3].copy()
+        self.trip = table[:, 4].astype(np.int64)
+        self.position = table[:, 5].astype(np.int64)
+        self.transfers = transfer_times(map)
+        # Python lists of the arrays, the scans read them one element at a time
+        self._columns = (self.departure_station.tolist(), self.arrival_station.tolist(),
+                         self.departure_time.tolist(), self.arrival_time.tolist(), self.trip.tolist())
+
+    def __len__(self):
+        return len(self.departure_time)
+
+    def earliest_arrival(self, origin_id, destination_id, departure_time):
+        """
+         Journey that arrives first to destination_id leaving origin_id at departure_time or later.
+         Format of the parameter is:
+            Args:
+                origin_id (int): Starting station id
+                destination_id (int): Final station id
+                departure_time (float): Time at origin_id
+            Returns:
+                arrival_time (float): Arrival time at destination_id (inf if it can not be reached)
+                path (Path Class): Stations of the journey, with g the time from departure_time to the arrival
+                                   ([] if it can not be reached)
+        """
+        departure_stations, arrival_stations, departure_times, arrival_times, trips = self._columns
+        arrival = {origin_id: departure_time}
+        # {station: connection index or station of the transfer it was reached with}
+        reached_by = {}
+        boarded = {}
+        for other_id, time in self.transfers.get(origin_id, ()):
+            arrival[other_id] = departure_time + time
+            reached_by[other_id] = ('transfer', origin_id)
+
+        for ix in range(bisect.bisect_left(departure_times, departure_time), len(departure_times)):
+            if departure_times[ix] >= arrival.get(destination_id, math.inf):
+                break
+            trip = trips[ix]
+            if trip not in boarded:
+                if arrival.get(departure_stations[ix], math.inf) > departure_times[ix]:
+                    continue
+                boarded[trip] = ix
+            station_id, time = arrival_stations[ix], arrival_times[ix]
+            if time < arrival.get(station_id, math.inf):
+                arrival[station_id] = time
+                reached_by[station_id] = ('connection', ix)
+                for other_id, transfer_time in self.transfers.get(station_id, ()):
+                    if time + transfer_time < arrival.get(other_id, math.inf):
+                        arrival[other_id] = time + transfer_time
+                        reached_by[other_id] = ('transfer', station_id)
+
+        arrival_time = arrival.get(destination_id, math.inf)
+        if math.isinf(arrival_time):
+            return arrival_time, []
+        path = Path(self.journey_route(origin_id, destination_id, reached_by, boarded))
+        path.g = arrival_time - departure_time
+        return arrival_time, path
+
+    def journey_route(self, origin_id, destination_id, reached_by, boarded):
+        # Stations of the journey, following back the connections and transfers it was reached with
+        route = [destination_id]
+        station_id = destination_id
+        while station_id != origin_id:
+            kind, value = reached_by[station_id]
+            if kind == 'transfer':
+                station_id = value
+                route.append(station_id)
+            else:
+                trip = self.trip[value]
+                start = self.position[boarded[trip]]
+                stations = self.trips[trip][start:self.position[value] + 2]
+                route.extend(reversed(stations[:-1]))
+                station_id = stations[0]
+        route.reverse()
+        return route
+
+    def profile(self, origin_id, destination_id, start_time, end_time):
+        """
+         Best journeys leaving origin_id between start_time and end_time: every journey arrives earlier than
+         all the journeys that leave later, and than going on foot if origin_id and destination_id are connected
+         by transfers (going on foot is not listed, it can start at any time).
+         Format of the parameter is:
+            Args:
+                origin_id (int): Starting station id
+                destination_id (int): Final station id
+                start_time, end_time (float): Window of the departure time
+            Returns:
+                journeys (list of tuple): (departure time, arrival time) of every journey, by departure time
+        """
+        departure_stations, arrival_stations, departure_times, arrival_times, trips = self._columns
+        walk = {destination_id: 0}
+        for other_id, time in self.transfers.get(destination_id, ()):
+            walk[other_id] = time
+        # {station: ([-departure, ...], [arrival, ...])} journeys from every station to destination_id, added by
+        # decreasing departure time (so by increasing -departure) with decreasing arrival time
+        profiles = {}
+        trip_arrival = {}
+
+        def evaluate(station_id, time):
+            # First arrival leaving station_id at time or later
+            journeys = profiles.get(station_id)
+            if journeys is None:
+                return math.inf
+            ix = bisect.bisect_right(journeys[0], -time)
+            return journeys[1][ix - 1] if ix else math.inf
+
+        first = bisect.bisect_left(departure_times, start_time)
+        for ix in range(len(departure_times) - 1, first - 1, -1):
+            station_id, time = arrival_stations[ix], arrival_times[ix]
+            best = min(time + walk.get(station_id, math.inf), trip_arrival.get(trips[ix], math.inf),
+                       evaluate(station_id, time))
+            for other_id, transfer_time in self.transfers.get(station_id, ()):
+                best = min(best, evaluate(other_id, time + transfer_time))
+            if math.isinf(best):
+                continue
+            trip_arrival[trips[ix]] = best
+            departure_station, departure = departure_stations[ix], departure_times[ix]
+            if best < evaluate(departure_station, departure):
+                journeys = profiles.setdefault(departure_station, ([], []))
+                if journeys[0] and journeys[0][-1] == -departure:
+                    journeys[0].pop()
+                    journeys[1].pop()
+                journeys[0].append(-departure)
+                journeys[1].append(best)
+
+        # Journeys from the origin, directly or after a transfer
+        candidates = []
+        for station_id, time in [(origin_id, 0)] + list(self.transfers.get(origin_id, ())):
+            minus_departures, arrivals = profiles.get(station_id, ([], []))
+            candidates += [(-minus_departure - time, arrival) for minus_departure, arrival in
+                           zip(minus_departures, arrivals)]
+        # A journey is kept if it arrives earlier than all the ones that leave later, also the ones that leave
+        # after end_time, so the window is only applied at the end
+        on_foot = walk.get(origin_id, math.inf)
+        journeys = []
+        first_arrival = math.inf
+        for departure, arrival in sorted(candidates, key=lambda journey: (-journey[0], journey[1])):
+            if arrival < first_arrival:
+                first_arrival = arrival
+                if start_time <= departure <= end_time and arrival < departure + on_foot:
+                    journeys.append((departure, arrival))
+        journeys.reverse()
+        return journeys
+
+
+def load_timetable(map, root_folder):
+    """
+     Timetable of a city from its Timetable.txt.
+     Format of the parameter is:
+        Args:
+            map (object of Map class): The map of the city
+            root_folder (str): Folder of the city
+        Returns:
+            timetable (Timetable): The timetable, None if the city has no Timetable.txt
+    """
+    filename = os.path.join(root_folder, 'Timetable.txt')
+    if not os.path.exists(filename):
+        return None
+    return Timetable(map, read_timetable(filename))
@@ -1,6 +1,8 @@
 from SubwayMap import Map
 import numpy as np
+import hashlib
 import math
+import os
 
 # Infinite cost represented by INF
 INF = 9999
@@ -34,16 +36,134 @@ def read_information(filename):
 def read_cost_table(filename):
     adj_matrix = np.loadtxt(filename)
     row, col = adj_matrix.nonzero()
+    return connections_from_edges(row + 1, col + 1, adj_matrix[row, col])
+
+
+def connections_from_edges(sources, destinations, costs):
+    # connections_from_edges: Builds the connections dictionary from parallel arrays of edges.
     connections = {}
-    for r, c in zip(row, col):
-        if r + 1 not in connections:
-            connections[r + 1] = {c + 1: adj_matrix[r][c]}
+    for r, c, cost in zip(np.asarray(sources).tolist(), np.asarray(destinations).tolist(), np.asarray(costs).tolist()):
+        if r not in connections:
+            connections[r] = {c: cost}
         else:
-            connections[r + 1].update({c + 1: adj_matrix[r][c]})
-
+            connections[r][c] = cost
     return connections
 
 
+def read_edge_list(filename):
+    # read_edge_list: Reads a sparse cost table, with one "station_id <tab> next_id <tab> cost" line per connection.
+    edges = np.loadtxt(filename, ndmin=2)
+    return connections_from_edges(edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64), edges[:, 2])
+
+
+def write_edge_list(connections, filename):
+    # write_edge_list: Writes the connections dictionary in the format of read_edge_list.
+    with open(filename, 'w', encoding='utf-8') as fp:
+        for station_id, next_stations in connections.items():
+            for next_id, cost in next_stations.items():
+                fp.write('{}\t{}\t{}\n'.format(station_id, next_id, repr(float(cost))))
+
+
+def read_timetable(filename):
+    # read_timetable: Reads the departures of every line and direction, with one "line <tab> direction <tab>
+    # departures" row per line and direction. The departures are times separated by spaces, or ranges
+    # "first-last/headway". Lines starting with # are comments.
+    schedule = {}
+    with open(filename, 'r', encoding='utf-8') as fp:
+        for row in fp:
+            row = row.split('#')[0].strip()
+            if not row:
+                continue
+            line, direction, departures = row.split(None, 2)
+            times = schedule.setdefault((int(line), int(direction)), [])
+            for token in departures.split():
+                if '/' in token:
+                    interval, headway = token.split('/')
+                    first, last = (float(value) for value in interval.split('-'))
+                    count = int(math.floor((last - first) / float(headway) + 1e-9)) + 1
+                    times.extend(first + k * float(headway) for k in range(count))
+                else:
+                    times.append(float(token))
+    return {key: sorted(times) for key, times in schedule.items()}
+
+
+def city_files(root_folder):
+    # city_files: Stations, cost table (Connections.txt edge list if it exists, Time.txt otherwise) and velocities.
+    cost_file = 'Connections.txt' if os.path.exists(os.path.join(root_folder, 'Connections.txt')) else 'Time.txt'
+    return [os.path.join(root_folder, filename) for filename in ('Stations.txt', cost_file, 'InfoVelocity.txt')]
+
+
+def city_hash(root_folder):
+    # city_hash: sha256 of the content of the files of a city, it changes when any of them changes.
+    digest = hashlib.sha256()
+    for filename in city_files(root_folder):
+        with open(filename, 'rb') as fp:
+            digest.update(hashlib.sha256(fp.read()).digest())
+    return digest.hexdigest()
+
+
+def read_city(root_folder):
+    # read_city: Reads the text files of a city folder.
+    stations_file, cost_file, velocity_file = city_files(root_folder)
+    subway_map = read_station_information(stations_file)
+    if cost_file.endswith('Connections.txt'):
+        subway_map.add_connection(read_edge_list(cost_file))
+    else:
+        subway_map.add_connection(read_cost_table(cost_file))
+    subway_map.add_velocity(read_information(velocity_file))
+    return subway_map
+
+
+def save_city_cache(subway_map, filename):
+    # save_city_cache: Stores stations, connections and velocities of a map in a numpy .npz file.
+    station_ids = list(subway_map.stations)
+    stations = [subway_map.stations[station_id] for station_id in station_ids]
+    edges = [(station_id, next_id, cost) for station_id, next_stations in subway_map.connections.items()
+             for next_id, cost in next_stations.items()]
+    with open(filename + '.tmp', 'wb') as fp:
+        np.savez(fp,
+                 station_ids=np.array(station_ids, dtype=np.int64),
+                 names=np.array([station['name'] for station in stations], dtype=str),
+                 lines=np.array([station['line'] for station in stations], dtype=np.int64),
+                 x=np.array([station['x'] for station in stations], dtype=np.int64),
+                 y=np.array([station['y'] for station in stations], dtype=np.int64),
+                 sources=np.array([edge[0] for edge in edges], dtype=np.int64),
+                 destinations=np.array([edge[1] for edge in edges], dtype=np.int64),
+                 costs=np.array([edge[2] for edge in edges], dtype=np.float64),
+                 velocity=np.array(list(subway_map.velocity.values()), dtype=np.int64))
+    os.replace(filename + '.tmp', filename)
+
+
+def load_city_cache(filename):
+    # load_city_cache: Reads a map stored with save_city_cache.
+    subway_map = Map()
+    with np.load(filename) as data:
+        for station_id, name, line, x, y in zip(data['station_ids'].tolist(), data['names'].tolist(),
+                                                data['lines'].tolist(), data['x'].tolist(), data['y'].tolist()):
+            subway_map.add_station(station_id, name, line, x, y)
+        subway_map.add_connection(connections_from_edges(data['sources'], data['destinations'], data['costs']))
+        subway_map.add_velocity(data['velocity'].tolist())
+    return subway_map
+
+
+def load_city(root_folder, use_cache=True):
+    # load_city: Map of a city folder. With use_cache, it is read from root_folder/.cache/map_<city_hash>.npz,
+    # which is written from the text files the first time and again whenever they change.
+    if not use_cache:
+        return read_city(root_folder)
+    filename = os.path.join(root_folder, '.cache', 'map_{}.npz'.format(city_hash(root_folder)))
+    if os.path.exists(filename):
+        return load_city_cache(filename)
+    subway_map = read_city(root_folder)
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        save_city_cache(subway_map, filename)
+    except OSError:
+        # A read only city folder is still loaded, only without cache
+        pass
+    return subway_map
+
+
 def print_list_of_path(path_list):
     for p in path_list:
         print("Route: {}".format(p.route))